@@ -0,0 +1,220 @@
+"""
+Punto de entrada por línea de comandos, sin interfaz gráfica.
+
+Permite lanzar los trabajos largos sobre la biblioteca (escaneo, análisis de
+audio, reconstrucción de índices) en un servidor sin pantalla, usando la
+misma base de datos config/library.db que la aplicación.
+
+Ejemplos:
+    python cli.py scan ~/Music            # escanea y registra la carpeta
+    python cli.py scan                    # vuelve a escanear las carpetas registradas
+    python cli.py scan --full             # sin omitir las carpetas sin cambios
+    python cli.py analyze --workers 8     # forma de onda, BPM, tonalidad y timbre
+    python cli.py similar ~/Music/a.mp3   # pistas que suenan parecido
+    python cli.py reindex --vacuum
+    python cli.py serve --port 8765       # API JSON local de solo lectura
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import time
+
+from core.database import init_db, get_library_roots, rebuild_summary_tables, optimize_database, iter_tracks
+
+
+def _format_duration(seconds):
+    """Formatea segundos como H:MM:SS."""
+    hours, remainder = divmod(int(seconds), 3600)
+    minutes, sec = divmod(remainder, 60)
+    return f"{hours}:{minutes:02d}:{sec:02d}"
+
+
+class ProgressPrinter:
+    """
+    Imprime el avance y el ritmo de un trabajo como mucho cada 'interval' segundos.
+    Si el total aún no se conoce (None), solo se imprimen los hechos y el ritmo.
+    """
+
+    def __init__(self, label, interval=5.0, unit="pistas"):
+        self.label = label
+        self.interval = interval
+        self.unit = unit
+        self.start_time = time.monotonic()
+        self._last_print = 0.0
+
+    def __call__(self, done, total, file_path=None):
+        now = time.monotonic()
+        if (total is None or done < total) and now - self._last_print < self.interval:
+            return
+        self._last_print = now
+        elapsed = now - self.start_time
+        rate = done / elapsed if elapsed > 0 else 0.0
+        if total is None:
+            print(f"[{self.label}] {done} {self.unit} - {rate:.1f} {self.unit}/s", flush=True)
+            return
+        remaining = (total - done) / rate if rate > 0 else 0.0
+        print(f"[{self.label}] {done}/{total} ({done * 100 // max(total, 1)}%) - "
+              f"{rate:.1f} {self.unit}/s - restante {_format_duration(remaining)}", flush=True)
+
+
+def cmd_scan(args):
+    """Escanea las carpetas indicadas o, si no se indica ninguna, las ya registradas."""
+    from core.library_scanner import scan_directory
+
+    roots = [os.path.abspath(os.path.expanduser(path)) for path in args.paths] or get_library_roots()
+    if not roots:
+        print("No hay carpetas registradas. Indica al menos una ruta.")
+        return 1
+
+    start_time = time.monotonic()
+    processed = 0  # scan_directory solo cuenta los archivos nuevos o modificados
+    for root in roots:
+        if not os.path.isdir(root):
+            print(f"El directorio no existe: {root}")
+            continue
+        progress = ProgressPrinter(f"escaneo {os.path.basename(root) or root}", args.interval, unit="archivos")
+        processed += scan_directory(root, full_rescan=args.full, progress=progress) or 0
+
+    elapsed = time.monotonic() - start_time
+    rate = processed / elapsed if elapsed > 0 else 0.0
+    print(f"Procesados {processed} archivos nuevos o modificados en {_format_duration(elapsed)} "
+          f"({rate:.1f} archivos/s).")
+    return 0
+
+
+def cmd_analyze(args):
+    """Analiza las pistas pendientes (forma de onda, BPM y tonalidad) en varios procesos."""
+    from core.audio_analysis import analyze_library
+
+    workers = args.workers or os.cpu_count() or 1
+    print(f"Analizando la biblioteca con {workers} procesos...")
+    start_time = time.monotonic()
+    stats = analyze_library(
+        workers=workers,
+        force=args.force,
+        overwrite_tags=args.overwrite_tags,
+        limit=args.limit,
+        progress=ProgressPrinter("análisis", args.interval),
+    )
+
+    if stats["analyzed"]:
+        from core.similarity_index import build_index
+        build_index()
+
+    elapsed = time.monotonic() - start_time
+    done = stats["analyzed"] + stats["failed"]
+    rate = done / elapsed if elapsed > 0 else 0.0
+    print(f"Análisis completado: {stats['analyzed']} pistas analizadas, {stats['failed']} con errores, "
+          f"en {_format_duration(elapsed)} ({rate:.1f} pistas/s).")
+    return 0 if stats["failed"] == 0 else 2
+
+
+def cmd_reindex(args):
+    """Reconstruye la tabla resumen, los índices de SQLite y limpia la caché de carátulas."""
+    from core.artwork_cache import remove_orphan_thumbnails
+
+    start_time = time.monotonic()
+    print("Reconstruyendo el resumen de la biblioteca...")
+    rebuild_summary_tables()
+
+    print("Reconstruyendo índices" + (" y compactando la base de datos..." if args.vacuum else "..."))
+    if not optimize_database(vacuum=args.vacuum):
+        return 1
+
+    used_hashes = (artwork_hash for (artwork_hash,) in iter_tracks(["artwork_hash"], where="artwork_hash IS NOT NULL"))
+    try:
+        removed = remove_orphan_thumbnails(used_hashes)
+    except sqlite3.Error as e:
+        # Sin la lista completa de carátulas en uso no se puede borrar ninguna
+        print(f"Error al leer las carátulas en uso: {e}")
+        return 1
+    print(f"Eliminadas {removed} carátulas sin uso.")
+
+    from core.similarity_index import build_index
+    build_index(approximate=args.approximate)
+
+    print(f"Reindexado completado en {_format_duration(time.monotonic() - start_time)}.")
+    return 0
+
+
+def cmd_similar(args):
+    """Muestra las pistas que suenan más parecido a la indicada."""
+    from core.similarity_index import SimilarityIndex
+
+    file_path = os.path.abspath(os.path.expanduser(args.file))
+    track = next(iter_tracks(["id"], where="file_path = ?", params=(file_path,)), None)
+    if track is None:
+        print(f"La pista no está en la biblioteca: {file_path}")
+        return 1
+    track_id = track[0]
+
+    index = SimilarityIndex.open()
+    results = index.similar(track_id, args.count) if index else []
+    if not results:
+        print("La pista aún no tiene vector de timbre. Ejecuta antes 'analyze'.")
+        return 1
+
+    paths = dict(iter_tracks(["id", "file_path"], where=f"id IN ({','.join('?' * len(results))})",
+                             params=[result_id for result_id, _ in results]))
+    for result_id, score in results:
+        print(f"{score:6.3f}  {paths.get(result_id, result_id)}")
+    return 0
+
+
+def cmd_serve(args):
+    """Arranca la API JSON local hasta que se interrumpe con Ctrl+C."""
+    from core.api_server import run_server
+
+    run_server(args.host, args.port, db_workers=args.workers)
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Biblioteca de Audio Inteligente (modo sin interfaz).")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    scan_parser = subparsers.add_parser("scan", help="Escanear carpetas de música.")
+    scan_parser.add_argument("paths", nargs="*", help="Carpetas a escanear (por defecto, las registradas).")
+    scan_parser.add_argument("--full", action="store_true",
+                             help="Listar todas las carpetas, aunque no hayan cambiado desde el último escaneo.")
+    scan_parser.add_argument("--interval", type=float, default=5.0, help="Segundos entre mensajes de progreso.")
+    scan_parser.set_defaults(func=cmd_scan)
+
+    analyze_parser = subparsers.add_parser("analyze", help="Analizar forma de onda, BPM y tonalidad.")
+    analyze_parser.add_argument("-j", "--workers", type=int, default=None, help="Procesos de análisis (por defecto, uno por CPU).")
+    analyze_parser.add_argument("--force", action="store_true", help="Volver a analizar las pistas ya analizadas.")
+    analyze_parser.add_argument("--overwrite-tags", action="store_true", help="Sustituir el BPM y la tonalidad existentes.")
+    analyze_parser.add_argument("--limit", type=int, default=None, help="Número máximo de pistas a analizar.")
+    analyze_parser.add_argument("--interval", type=float, default=5.0, help="Segundos entre mensajes de progreso.")
+    analyze_parser.set_defaults(func=cmd_analyze)
+
+    reindex_parser = subparsers.add_parser("reindex", help="Reconstruir índices y resúmenes.")
+    reindex_parser.add_argument("--vacuum", action="store_true", help="Compactar además la base de datos.")
+    reindex_parser.add_argument("--approximate", action="store_true", default=None,
+                                help="Construir el índice de similitud aproximado aunque la biblioteca sea pequeña.")
+    reindex_parser.set_defaults(func=cmd_reindex)
+
+    similar_parser = subparsers.add_parser("similar", help="Buscar pistas que suenan parecido a otra.")
+    similar_parser.add_argument("file", help="Archivo de la pista de referencia.")
+    similar_parser.add_argument("-n", "--count", type=int, default=50, help="Número de resultados.")
+    similar_parser.set_defaults(func=cmd_similar)
+
+    serve_parser = subparsers.add_parser("serve", help="Servir la biblioteca como API JSON local.")
+    serve_parser.add_argument("--host", default="127.0.0.1", help="Dirección en la que escuchar.")
+    serve_parser.add_argument("--port", type=int, default=8765, help="Puerto en el que escuchar.")
+    serve_parser.add_argument("-j", "--workers", type=int, default=4, help="Hilos para las consultas a SQLite.")
+    serve_parser.set_defaults(func=cmd_serve)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    init_db()
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
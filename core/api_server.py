@@ -0,0 +1,444 @@
+"""
+API JSON local (HTTP/1.1 sobre asyncio) para consultar la biblioteca desde
+otras herramientas sin abrir la aplicación.
+
+Rutas:
+    GET /api/tracks?limit=100&after=<id>&q=&genre=&key=&bpm_min=&bpm_max=&fields=
+        Pistas ordenadas por id, paginadas por clave ('after' = último id de la
+        página anterior; la respuesta incluye 'next_after'). limit=0 devuelve
+        todas las pistas que cumplen el filtro, enviadas por partes.
+    GET /api/search?q=...
+        Igual que /api/tracks, pero exige el texto de búsqueda.
+    GET /api/tracks/<id>
+    GET /api/tracks/<id>/waveform?points=400
+
+Las consultas a SQLite son bloqueantes, así que se ejecutan en un pool de
+hilos pequeño, cada hilo con su propia conexión de solo lectura. Con la base
+de datos en modo WAL, los lectores no bloquean a un escaneo que esté
+escribiendo ni al revés. Las respuestas llevan un ETag basado en el contador
+library_version, de modo que los clientes pueden revalidar con
+If-None-Match y recibir un 304 sin volver a transferir los datos.
+"""
+
+import asyncio
+import json
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate
+from urllib.parse import urlsplit, parse_qs
+
+import numpy as np
+
+from core.database import get_db_path, TRACK_COLUMNS
+from core.audio_analysis import WAVEFORM_POINTS
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+STREAM_BATCH_SIZE = 500
+MAX_WAVEFORM_POINTS = 4000
+
+DEFAULT_FIELDS = ["id", "file_path", "title", "artist", "album", "genre", "year", "track_number",
+                  "duration", "bpm", "key", "file_type", "date_added"]
+
+# Tiempo máximo de espera de una petición en una conexión keep-alive
+IDLE_TIMEOUT = 30.0
+MAX_HEADER_SIZE = 16 * 1024
+
+HTTP_REASONS = {200: "OK", 304: "Not Modified", 400: "Bad Request", 404: "Not Found",
+                405: "Method Not Allowed", 500: "Internal Server Error"}
+
+_local = threading.local()
+
+
+class ApiError(Exception):
+    """Error que se devuelve al cliente como respuesta JSON con su código HTTP."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def _get_connection():
+    """Conexión de solo lectura reutilizada por cada hilo del pool."""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(get_db_path(), timeout=10)
+        conn.execute("PRAGMA query_only = ON")
+        _local.conn = conn
+    return conn
+
+
+def _library_version():
+    row = _get_connection().execute("SELECT version FROM library_version WHERE id = 0").fetchone()
+    return row[0] if row else 0
+
+
+def _strip_weak(tag):
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def etag_matches(if_none_match, etag):
+    """
+    Indica si la cabecera If-None-Match cubre el ETag de la respuesta. Admite
+    listas separadas por comas, '*' y ETags débiles (W/"..."): If-None-Match
+    usa la comparación débil, así que el prefijo W/ no se tiene en cuenta.
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return _strip_weak(etag) in {_strip_weak(tag.strip()) for tag in if_none_match.split(",")}
+
+
+def _parse_int(params, name, default=None, minimum=None, maximum=None):
+    value = params.get(name, [None])[-1]
+    if value in (None, ""):
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        raise ApiError(400, f"El parámetro '{name}' debe ser un entero.")
+    if minimum is not None and number < minimum:
+        raise ApiError(400, f"El parámetro '{name}' debe ser >= {minimum}.")
+    if maximum is not None and number > maximum:
+        raise ApiError(400, f"El parámetro '{name}' debe ser <= {maximum}.")
+    return number
+
+
+def _parse_float(params, name):
+    value = params.get(name, [None])[-1]
+    if value in (None, ""):
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        raise ApiError(400, f"El parámetro '{name}' debe ser un número.")
+
+
+def build_track_query(params):
+    """
+    Traduce los parámetros de la URL a (columnas, condición SQL, parámetros).
+    Las columnas se validan contra TRACK_COLUMNS; los valores van siempre como parámetros.
+    """
+    fields = DEFAULT_FIELDS
+    if params.get("fields"):
+        fields = [field.strip() for field in params["fields"][-1].split(",") if field.strip()]
+        invalid = [field for field in fields if field not in TRACK_COLUMNS]
+        if invalid:
+            raise ApiError(400, f"Campos desconocidos: {', '.join(invalid)}")
+        if "id" not in fields:
+            fields = ["id"] + fields
+
+    conditions = []
+    values = []
+    query = params.get("q", [""])[-1].strip()
+    if query:
+        pattern = "%" + query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        conditions.append("(" + " OR ".join(f"{column} LIKE ? ESCAPE '\\'"
+                                            for column in ("title", "artist", "album", "genre")) + ")")
+        values.extend([pattern] * 4)
+    for column in ("genre", "key"):
+        value = params.get(column, [""])[-1].strip()
+        if value:
+            conditions.append(f"{column} = ? COLLATE NOCASE")
+            values.append(value)
+    bpm_min, bpm_max = _parse_float(params, "bpm_min"), _parse_float(params, "bpm_max")
+    if bpm_min is not None or bpm_max is not None:
+        conditions.append("typeof(bpm) IN ('integer', 'real')")
+    if bpm_min is not None:
+        conditions.append("bpm >= ?")
+        values.append(bpm_min)
+    if bpm_max is not None:
+        conditions.append("bpm <= ?")
+        values.append(bpm_max)
+
+    return fields, conditions, values
+
+
+def fetch_tracks_batch(fields, conditions, values, after, limit):
+    """Lee una página de pistas con id > after (se ejecuta en el pool de hilos)."""
+    where = " AND ".join(conditions + ["id > ?"])
+    sql = f"SELECT {', '.join(fields)} FROM tracks WHERE {where} ORDER BY id LIMIT ?"
+    rows = _get_connection().execute(sql, values + [after, limit]).fetchall()
+    return [dict(zip(fields, row)) for row in rows]
+
+
+def fetch_track(track_id):
+    row = _get_connection().execute(
+        f"SELECT {', '.join(TRACK_COLUMNS)} FROM tracks WHERE id = ?", (track_id,)
+    ).fetchone()
+    return dict(zip(TRACK_COLUMNS, row)) if row else None
+
+
+def fetch_waveform_source(track_id):
+    """Devuelve (ruta, mtime, forma de onda analizada o None) de una pista."""
+    return _get_connection().execute("""
+        SELECT t.file_path, t.last_modified_date,
+               CASE WHEN a.source_mtime IS t.last_modified_date THEN a.waveform END
+        FROM tracks t LEFT JOIN track_analysis a ON a.track_id = t.id
+        WHERE t.id = ?
+    """, (track_id,)).fetchone()
+
+
+class LibraryApiServer:
+    """Servidor HTTP/JSON de solo lectura sobre la base de datos de la biblioteca."""
+
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, db_workers=4, waveform_workers=1):
+        self.host = host
+        self.port = port
+        # Pools separados: generar una forma de onda tarda segundos y no debe
+        # retrasar las consultas a la base de datos.
+        self.db_executor = ThreadPoolExecutor(max_workers=db_workers, thread_name_prefix="api-db")
+        self.waveform_executor = ThreadPoolExecutor(max_workers=waveform_workers, thread_name_prefix="api-waveform")
+        self._server = None
+
+    async def _run_db(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.db_executor, function, *args)
+
+    # --- Ciclo de vida -------------------------------------------------------
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle_client, self.host, self.port,
+                                                  limit=MAX_HEADER_SIZE)
+        sockets = self._server.sockets or []
+        if sockets:
+            self.port = sockets[0].getsockname()[1]
+        print(f"API de la biblioteca escuchando en http://{self.host}:{self.port}/api/tracks")
+
+    async def serve_forever(self):
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        self.db_executor.shutdown(wait=False)
+        self.waveform_executor.shutdown(wait=False)
+
+    # --- HTTP ----------------------------------------------------------------
+
+    async def _handle_client(self, reader, writer):
+        """Atiende las peticiones de una conexión (keep-alive) hasta que el cliente la cierra."""
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), IDLE_TIMEOUT)
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError, asyncio.LimitOverrunError):
+                    break
+
+                lines = head.decode("latin-1").split("\r\n")
+                try:
+                    method, target, version = lines[0].split(" ", 2)
+                except ValueError:
+                    await self._send_json(writer, 400, {"error": "Petición mal formada."}, keep_alive=False)
+                    break
+                headers = {}
+                for line in lines[1:]:
+                    if ":" in line:
+                        name, value = line.split(":", 1)
+                        headers[name.strip().lower()] = value.strip()
+
+                connection = headers.get("connection", "").lower()
+                keep_alive = connection == "keep-alive" if version == "HTTP/1.0" else connection != "close"
+
+                try:
+                    if method != "GET":
+                        raise ApiError(405, "Solo se admite GET.")
+                    # HTTP/1.0 no admite chunked: los listados se envían tal cual y se cierra
+                    keep_alive = await self._route(writer, target, headers, keep_alive,
+                                                   chunked=version != "HTTP/1.0")
+                except ApiError as e:
+                    await self._send_json(writer, e.status, {"error": e.message}, keep_alive=keep_alive)
+                except sqlite3.Error as e:
+                    print(f"Error de base de datos en la API: {e}")
+                    await self._send_json(writer, 500, {"error": "Error de base de datos."}, keep_alive=keep_alive)
+
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    def _write_head(self, writer, status, headers, keep_alive):
+        lines = [f"HTTP/1.1 {status} {HTTP_REASONS.get(status, '')}",
+                 f"Date: {formatdate(usegmt=True)}",
+                 "Server: DjAlfin",
+                 f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+        lines.extend(f"{name}: {value}" for name, value in headers.items())
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+
+    async def _send_json(self, writer, status, payload, keep_alive=True, headers=None):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        response_headers = {"Content-Type": "application/json; charset=utf-8",
+                            "Content-Length": str(len(body))}
+        response_headers.update(headers or {})
+        self._write_head(writer, status, response_headers, keep_alive)
+        writer.write(body)
+        await writer.drain()
+
+    async def _send_not_modified(self, writer, etag, cache_control, keep_alive):
+        self._write_head(writer, 304, {"ETag": etag, "Cache-Control": cache_control}, keep_alive)
+        await writer.drain()
+
+    async def _write_chunk(self, writer, data, chunked=True):
+        """Escribe una parte del cuerpo; sin 'chunked', los datos van sin marco."""
+        if data:
+            writer.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n" if chunked else data)
+            await writer.drain()  # Respeta el ritmo de lectura del cliente
+
+    # --- Rutas ---------------------------------------------------------------
+
+    async def _route(self, writer, target, headers, keep_alive, chunked=True):
+        """
+        Atiende una petición.
+
+        Returns:
+            bool: Si la conexión puede seguir abierta después de la respuesta.
+        """
+        url = urlsplit(target)
+        params = parse_qs(url.query)
+        parts = [part for part in url.path.split("/") if part]
+
+        if parts == ["api", "tracks"] or parts == ["api", "search"]:
+            if parts[1] == "search" and not params.get("q", [""])[-1].strip():
+                raise ApiError(400, "Falta el parámetro 'q'.")
+            return await self._tracks(writer, params, headers, keep_alive, chunked)
+        elif len(parts) in (3, 4) and parts[:2] == ["api", "tracks"] and parts[2].isdigit():
+            track_id = int(parts[2])
+            if len(parts) == 3:
+                await self._track(writer, track_id, headers, keep_alive)
+            elif parts[3] == "waveform":
+                await self._waveform(writer, track_id, params, headers, keep_alive)
+            else:
+                raise ApiError(404, "Ruta no encontrada.")
+        else:
+            raise ApiError(404, "Ruta no encontrada.")
+        return keep_alive
+
+    async def _tracks(self, writer, params, headers, keep_alive, chunked=True):
+        """
+        Lista de pistas, escrita por partes (chunked) según se lee de SQLite. Sin
+        chunked (clientes HTTP/1.0) el final del cuerpo lo marca el cierre de la
+        conexión.
+
+        Returns:
+            bool: Si la conexión puede seguir abierta.
+        """
+        fields, conditions, values = build_track_query(params)
+        limit = _parse_int(params, "limit", DEFAULT_PAGE_SIZE, minimum=0, maximum=MAX_PAGE_SIZE)
+        after = _parse_int(params, "after", 0)
+
+        version = await self._run_db(_library_version)
+        etag = f'"lib-{version}"'
+        cache_control = "no-cache"
+        if etag_matches(headers.get("if-none-match"), etag):
+            await self._send_not_modified(writer, etag, cache_control, keep_alive)
+            return keep_alive
+
+        response_headers = {"Content-Type": "application/json; charset=utf-8",
+                            "ETag": etag,
+                            "Cache-Control": cache_control}
+        if chunked:
+            response_headers["Transfer-Encoding"] = "chunked"
+        else:
+            keep_alive = False
+        self._write_head(writer, 200, response_headers, keep_alive)
+        await self._write_chunk(writer, f'{{"version": {version}, "tracks": ['.encode("utf-8"), chunked)
+
+        remaining = limit or None  # None: sin límite
+        last_id = after
+        first = True
+        exhausted = False
+        while remaining is None or remaining > 0:
+            batch_size = STREAM_BATCH_SIZE if remaining is None else min(STREAM_BATCH_SIZE, remaining)
+            try:
+                rows = await self._run_db(fetch_tracks_batch, fields, conditions, values, last_id, batch_size)
+            except sqlite3.Error as e:
+                # La cabecera ya se envió: solo queda cortar la conexión para que el
+                # cliente vea la respuesta incompleta.
+                print(f"Error de base de datos en la API: {e}")
+                raise ConnectionError("Respuesta interrumpida") from e
+            if rows:
+                encoded = json.dumps(rows, ensure_ascii=False)[1:-1]  # Sin los corchetes de la lista
+                await self._write_chunk(writer, (encoded if first else "," + encoded).encode("utf-8"), chunked)
+                first = False
+                last_id = rows[-1]["id"]
+                if remaining is not None:
+                    remaining -= len(rows)
+            if len(rows) < batch_size:
+                exhausted = True
+                break
+
+        next_after = None if exhausted or limit == 0 else last_id
+        await self._write_chunk(writer, f'], "next_after": {json.dumps(next_after)}}}'.encode("utf-8"), chunked)
+        if chunked:
+            writer.write(b"0\r\n\r\n")
+            await writer.drain()
+        return keep_alive
+
+    async def _track(self, writer, track_id, headers, keep_alive):
+        version = await self._run_db(_library_version)
+        etag = f'"lib-{version}"'
+        # Primero la pista: 'If-None-Match: *' solo vale si existe
+        track = await self._run_db(fetch_track, track_id)
+        if track is None:
+            raise ApiError(404, f"No existe la pista {track_id}.")
+        if etag_matches(headers.get("if-none-match"), etag):
+            await self._send_not_modified(writer, etag, "no-cache", keep_alive)
+            return
+        await self._send_json(writer, 200, track, keep_alive,
+                              headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+    async def _waveform(self, writer, track_id, params, headers, keep_alive):
+        """Forma de onda analizada o, si no existe o se pide otra resolución, generada al vuelo."""
+        points = _parse_int(params, "points", WAVEFORM_POINTS, minimum=1, maximum=MAX_WAVEFORM_POINTS)
+        source = await self._run_db(fetch_waveform_source, track_id)
+        if source is None:
+            raise ApiError(404, f"No existe la pista {track_id}.")
+        file_path, mtime, analyzed = source
+
+        # Depende solo del archivo: mientras no cambie, el cliente puede reutilizarla
+        etag = f'"wf-{track_id}-{mtime}-{points}"'
+        cache_control = "max-age=3600"
+        if etag_matches(headers.get("if-none-match"), etag):
+            await self._send_not_modified(writer, etag, cache_control, keep_alive)
+            return
+
+        if analyzed and points == WAVEFORM_POINTS:
+            data = np.frombuffer(analyzed, dtype=np.float32).tolist()
+        else:
+            from core.waveform_generator import generate_waveform_data
+            data = await asyncio.get_running_loop().run_in_executor(
+                self.waveform_executor, generate_waveform_data, file_path, points
+            )
+            if not data:
+                raise ApiError(500, "No se pudo generar la forma de onda.")
+
+        await self._send_json(writer, 200, {"id": track_id, "points": len(data),
+                                            "waveform": [round(value, 4) for value in data]},
+                              keep_alive, headers={"ETag": etag, "Cache-Control": cache_control})
+
+
+def run_server(host=DEFAULT_HOST, port=DEFAULT_PORT, db_workers=4):
+    """Arranca la API y la mantiene en marcha hasta Ctrl+C."""
+    server = LibraryApiServer(host, port, db_workers=db_workers)
+
+    async def main():
+        try:
+            await server.serve_forever()
+        finally:
+            await server.close()
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        print("API detenida.")
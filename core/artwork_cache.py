@@ -0,0 +1,149 @@
+"""
+Caché de carátulas en miniatura.
+
+El escáner extrae la carátula incrustada (APIC/PICTURE/covr) una sola vez y la
+identifica por el hash de su contenido: los discos comparten portada, así que
+cada imagen distinta se procesa y se guarda una única vez. Las miniaturas
+(JPEG de tamaño fijo) viven en una base SQLite aparte, en una tabla indexada
+por hash, de modo que consultarlas no exige tenerlas en memoria.
+"""
+
+import hashlib
+import io
+import os
+import sqlite3
+import threading
+
+from PIL import Image, ImageOps
+
+from core.database import get_db_path
+
+ARTWORK_DB_FILE = "artwork.db"
+THUMBNAIL_SIZE = (128, 128)
+THUMBNAIL_QUALITY = 85
+
+_local = threading.local()
+
+
+def get_artwork_db_path():
+    """Ruta de la base de datos de miniaturas (junto a library.db)."""
+    return os.path.join(os.path.dirname(get_db_path()), ARTWORK_DB_FILE)
+
+
+def _get_connection():
+    """Conexión reutilizada por hilo: las consultas de miniaturas son muy frecuentes."""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(get_artwork_db_path())
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS thumbnails (
+                hash TEXT PRIMARY KEY,
+                image BLOB NOT NULL
+            ) WITHOUT ROWID
+        """)
+        conn.commit()
+        _local.conn = conn
+    return conn
+
+
+def extract_artwork(audio):
+    """
+    Devuelve los bytes de la carátula incrustada en un archivo ya abierto con
+    mutagen (preferentemente la portada), o None si no tiene.
+    """
+    tags = getattr(audio, "tags", None)
+
+    # FLAC: bloques PICTURE
+    pictures = getattr(audio, "pictures", None)
+    if pictures:
+        front = [picture for picture in pictures if picture.type == 3]
+        return (front or pictures)[0].data
+
+    if tags is None:
+        return None
+
+    # MP3 y WAV: frames ID3 APIC
+    if hasattr(tags, "getall"):
+        frames = tags.getall("APIC")
+        if frames:
+            front = [frame for frame in frames if frame.type == 3]
+            return (front or frames)[0].data
+        return None
+
+    # M4A: átomo covr
+    covers = tags.get("covr") if hasattr(tags, "get") else None
+    if covers:
+        return bytes(covers[0])
+    return None
+
+
+def make_thumbnail(image_data):
+    """Genera la miniatura JPEG de tamaño fijo a partir de la imagen original."""
+    with Image.open(io.BytesIO(image_data)) as image:
+        image = image.convert("RGB")
+        thumbnail = ImageOps.fit(image, THUMBNAIL_SIZE, Image.LANCZOS)
+    output = io.BytesIO()
+    thumbnail.save(output, format="JPEG", quality=THUMBNAIL_QUALITY, optimize=True)
+    return output.getvalue()
+
+
+def store_artwork(image_data):
+    """
+    Guarda la miniatura de una carátula si aún no existe y devuelve su hash.
+    Las carátulas repetidas (mismo disco) no se vuelven a procesar.
+
+    Returns:
+        str: Hash de la carátula, o None si la imagen no se pudo procesar.
+    """
+    if not image_data:
+        return None
+    artwork_hash = hashlib.sha1(image_data).hexdigest()
+    conn = _get_connection()
+    try:
+        if conn.execute("SELECT 1 FROM thumbnails WHERE hash = ?", (artwork_hash,)).fetchone():
+            return artwork_hash
+        thumbnail = make_thumbnail(image_data)
+        conn.execute("INSERT OR IGNORE INTO thumbnails(hash, image) VALUES(?, ?)", (artwork_hash, thumbnail))
+        conn.commit()
+        return artwork_hash
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        print(f"No se pudo procesar la carátula: {e}")
+        return None
+    except sqlite3.Error as e:
+        print(f"Error al guardar la carátula: {e}")
+        return None
+
+
+def attach_artwork(metadata):
+    """
+    Sustituye los bytes de 'artwork' del diccionario de metadatos por
+    'artwork_hash', guardando la miniatura en la caché.
+    """
+    image_data = metadata.pop("artwork", None)
+    if image_data:
+        metadata["artwork_hash"] = store_artwork(image_data)
+    return metadata
+
+
+def get_thumbnail(artwork_hash):
+    """Devuelve los bytes JPEG de la miniatura, o None si no está en la caché."""
+    if not artwork_hash:
+        return None
+    try:
+        row = _get_connection().execute(
+            "SELECT image FROM thumbnails WHERE hash = ?", (artwork_hash,)
+        ).fetchone()
+    except sqlite3.Error as e:
+        print(f"Error al leer la carátula: {e}")
+        return None
+    return row[0] if row else None
+
+
+def remove_orphan_thumbnails(used_hashes):
+    """Borra las miniaturas que ya no usa ninguna pista. Devuelve cuántas se borraron."""
+    conn = _get_connection()
+    used = set(used_hashes)
+    orphans = [(artwork_hash,) for (artwork_hash,) in conn.execute("SELECT hash FROM thumbnails") if artwork_hash not in used]
+    conn.executemany("DELETE FROM thumbnails WHERE hash = ?", orphans)
+    conn.commit()
+    return len(orphans)
@@ -0,0 +1,431 @@
+"""
+Análisis de audio de la biblioteca: forma de onda, BPM, tonalidad y vector de
+timbre (para buscar pistas que suenan parecido, ver similarity_index).
+
+Cada archivo se decodifica una sola vez y de esa señal salen todos los
+resultados. El análisis es intensivo en CPU, así que analyze_library reparte
+los archivos entre varios procesos y escribe los resultados por lotes desde
+el proceso principal (SQLite admite un único escritor). Las pistas ya
+analizadas cuyo archivo no ha cambiado se omiten.
+"""
+
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from pydub import AudioSegment
+
+from core.database import create_connection
+from core.library_stats import MISSING_BPM_SQL, MISSING_KEY_SQL
+from core.playlist_logic import format_camelot, pitch_class_to_camelot
+
+ANALYSIS_SAMPLE_RATE = 22050
+WAVEFORM_POINTS = 400
+
+# Parámetros de la detección de tempo (envolvente de onsets)
+ONSET_FFT_SIZE = 1024
+ONSET_HOP = 256
+MIN_BPM = 70.0
+MAX_BPM = 180.0
+
+# Parámetros del cromagrama para la tonalidad
+CHROMA_FFT_SIZE = 8192
+CHROMA_HOP = 4096
+CHROMA_MIN_FREQ = 65.0
+CHROMA_MAX_FREQ = 2100.0
+
+# Perfiles de tonalidad de Krumhansl-Kessler (tónica en la posición 0)
+MAJOR_PROFILE = np.array([6.35, 2.23, 3.48, 2.33, 4.38, 4.09, 2.52, 5.19, 2.39, 3.66, 2.29, 2.88])
+MINOR_PROFILE = np.array([6.33, 2.68, 3.52, 5.38, 2.60, 3.53, 2.54, 4.75, 3.98, 2.69, 3.34, 3.17])
+
+# Parámetros del vector de timbre: media y desviación de los MFCC y del
+# contraste espectral por bandas de octava
+FEATURE_FFT_SIZE = 2048
+FEATURE_HOP = 2048
+MEL_BANDS = 40
+MFCC_COEFFICIENTS = 20
+CONTRAST_BAND_EDGES = (0.0, 200.0, 400.0, 800.0, 1600.0, 3200.0, 6400.0, None)
+CONTRAST_QUANTILE = 0.02
+FEATURE_SIZE = 2 * (MFCC_COEFFICIENTS + len(CONTRAST_BAND_EDGES) - 1)
+
+# Muestras (frames x tamaño de FFT) que se transforman a la vez, para acotar la
+# memoria en pistas largas
+_BLOCK_SAMPLES = 1 << 21
+
+
+def load_audio(file_path):
+    """
+    Decodifica un archivo a mono en float32 (-1.0 a 1.0), reduciendo la
+    frecuencia de muestreo a ANALYSIS_SAMPLE_RATE aproximadamente.
+
+    Returns:
+        tuple: (muestras, frecuencia de muestreo)
+    """
+    audio = AudioSegment.from_file(file_path).set_channels(1)
+    samples = np.array(audio.get_array_of_samples(), dtype=np.float32)
+    samples /= float(1 << (8 * audio.sample_width - 1))
+
+    # Diezmado por un factor entero (promediando, que hace de filtro paso bajo)
+    sample_rate = audio.frame_rate
+    factor = max(1, sample_rate // ANALYSIS_SAMPLE_RATE)
+    if factor > 1:
+        usable = len(samples) - len(samples) % factor
+        samples = samples[:usable].reshape(-1, factor).mean(axis=1)
+        sample_rate //= factor
+    return samples, sample_rate
+
+
+def compute_waveform(samples, num_points=WAVEFORM_POINTS):
+    """Valores RMS normalizados (0.0 a 1.0) de num_points tramos de la señal."""
+    usable = len(samples) - len(samples) % num_points
+    if usable == 0:
+        return np.zeros(0, dtype=np.float32)
+    rms = np.sqrt(np.mean(np.square(samples[:usable].reshape(num_points, -1)), axis=1))
+    peak = rms.max()
+    return (rms / peak if peak > 0 else rms).astype(np.float32)
+
+
+def _stft_magnitudes(samples, fft_size, hop):
+    """Genera bloques de magnitudes de la STFT (frames x bins) sin crear la matriz completa."""
+    if len(samples) < fft_size:
+        return
+    window = np.hanning(fft_size).astype(np.float32)
+    frames = sliding_window_view(samples, fft_size)[::hop]
+    block_frames = max(1, _BLOCK_SAMPLES // fft_size)
+    for start in range(0, len(frames), block_frames):
+        yield np.abs(np.fft.rfft(frames[start:start + block_frames] * window, axis=1))
+
+
+def onset_envelope(samples):
+    """Flujo espectral (aumentos de energía por frame) en escala logarítmica."""
+    parts = []
+    previous = None
+    for magnitudes in _stft_magnitudes(samples, ONSET_FFT_SIZE, ONSET_HOP):
+        log_magnitudes = np.log1p(10.0 * magnitudes)
+        if previous is None:
+            previous = log_magnitudes[:1]
+        stacked = np.vstack((previous, log_magnitudes))
+        parts.append(np.maximum(np.diff(stacked, axis=0), 0.0).sum(axis=1))
+        previous = log_magnitudes[-1:]
+    return np.concatenate(parts) if parts else np.zeros(0)
+
+
+def _refine_peak(values, index):
+    """Posición del máximo con precisión por debajo del frame (interpolación parabólica)."""
+    if index <= 0 or index >= len(values) - 1:
+        return float(index)
+    left, center, right = values[index - 1], values[index], values[index + 1]
+    denominator = left - 2 * center + right
+    if denominator == 0:
+        return float(index)
+    return index + 0.5 * (left - right) / denominator
+
+
+def estimate_bpm(samples, sample_rate, min_bpm=MIN_BPM, max_bpm=MAX_BPM):
+    """
+    Estima el tempo por autocorrelación de la envolvente de onsets.
+
+    Returns:
+        float: BPM dentro de [min_bpm, max_bpm], o None si no hay pulso detectable.
+    """
+    envelope = onset_envelope(samples)
+    frames_per_second = sample_rate / ONSET_HOP
+    min_lag = int(frames_per_second * 60.0 / max_bpm)
+    max_lag = int(np.ceil(frames_per_second * 60.0 / min_bpm))
+    if len(envelope) < 4 * max_lag:
+        return None
+
+    envelope = envelope - envelope.mean()
+    size = 1 << int(np.ceil(np.log2(2 * len(envelope))))
+    spectrum = np.fft.rfft(envelope, size)
+    autocorrelation = np.fft.irfft(spectrum * np.conj(spectrum), size)[:4 * max_lag + 2]
+    if autocorrelation[0] <= 0:
+        return None
+    autocorrelation /= autocorrelation[0]
+
+    # El pulso real también se repite al doble de periodo; se premia esa coherencia
+    # y se favorecen ligeramente los tempos cercanos a 120 BPM.
+    lags = np.arange(min_lag, max_lag + 1)
+    scores = autocorrelation[lags] + 0.5 * autocorrelation[2 * lags]
+    bpms = frames_per_second * 60.0 / lags
+    scores *= np.exp(-0.5 * np.square(np.log2(bpms / 120.0)))
+    best_lag = int(lags[np.argmax(scores)])
+    if autocorrelation[best_lag] <= 0:
+        return None
+
+    # Afinar el periodo con los picos de sus múltiplos (más frames, más precisión)
+    estimates = []
+    for multiple in range(1, 5):
+        center = best_lag * multiple
+        low, high = max(1, center - 2), min(len(autocorrelation) - 1, center + 3)
+        peak = low + int(np.argmax(autocorrelation[low:high]))
+        estimates.append(_refine_peak(autocorrelation, peak) / multiple)
+    period = float(np.median(estimates))
+
+    bpm = frames_per_second * 60.0 / period
+    while bpm < min_bpm:
+        bpm *= 2
+    while bpm >= max_bpm:
+        bpm /= 2
+    return round(bpm, 2)
+
+
+def chroma_vector(samples, sample_rate):
+    """Energía acumulada por clase de altura (0 = Do) a lo largo de toda la pista."""
+    frequencies = np.fft.rfftfreq(CHROMA_FFT_SIZE, 1.0 / sample_rate)
+    in_range = (frequencies >= CHROMA_MIN_FREQ) & (frequencies <= CHROMA_MAX_FREQ)
+    pitch_classes = np.round(12 * np.log2(frequencies[in_range] / 261.6256)).astype(int) % 12
+
+    chroma = np.zeros(12)
+    for magnitudes in _stft_magnitudes(samples, CHROMA_FFT_SIZE, CHROMA_HOP):
+        energy = np.sqrt(magnitudes[:, in_range]).sum(axis=0)
+        chroma += np.bincount(pitch_classes, weights=energy, minlength=12)
+    return chroma
+
+
+def estimate_key(samples, sample_rate):
+    """
+    Estima la tonalidad comparando el cromagrama con los perfiles de
+    Krumhansl-Kessler en las 24 tonalidades.
+
+    Returns:
+        str: Tonalidad en notación Camelot (p. ej. '8A'), o None si no se detecta.
+    """
+    chroma = chroma_vector(samples, sample_rate)
+    if not chroma.any():
+        return None
+
+    best = None
+    for is_minor, profile in ((False, MAJOR_PROFILE), (True, MINOR_PROFILE)):
+        for tonic in range(12):
+            score = np.corrcoef(chroma, np.roll(profile, tonic))[0, 1]
+            if best is None or score > best[0]:
+                best = (score, tonic, is_minor)
+    return format_camelot(pitch_class_to_camelot(best[1], best[2]))
+
+
+def _mel_filterbank(sample_rate, fft_size, bands):
+    """Filtros triangulares en escala mel (bandas x bins de la FFT)."""
+    def to_mel(hz):
+        return 2595.0 * np.log10(1.0 + hz / 700.0)
+
+    edges = 700.0 * (10 ** (np.linspace(to_mel(0.0), to_mel(sample_rate / 2), bands + 2) / 2595.0) - 1.0)
+    frequencies = np.fft.rfftfreq(fft_size, 1.0 / sample_rate)
+    lower, center, upper = edges[:-2, None], edges[1:-1, None], edges[2:, None]
+    rising = (frequencies - lower) / (center - lower)
+    falling = (upper - frequencies) / (upper - center)
+    return np.maximum(0.0, np.minimum(rising, falling)).astype(np.float32)
+
+
+def _dct_matrix(inputs, outputs):
+    """Matriz de la DCT-II ortonormal (outputs x inputs)."""
+    n = np.arange(inputs)
+    matrix = np.cos(np.pi / inputs * (n + 0.5) * np.arange(outputs)[:, None]) * np.sqrt(2.0 / inputs)
+    matrix[0] /= np.sqrt(2.0)
+    return matrix.astype(np.float32)
+
+
+def timbre_features(samples, sample_rate):
+    """
+    Vector de timbre de una pista: media y desviación típica de los MFCC y del
+    contraste espectral (diferencia entre picos y valles de cada banda) a lo
+    largo de toda la pista.
+
+    Returns:
+        np.ndarray: FEATURE_SIZE valores float32, o None si la pista es demasiado corta.
+    """
+    mel_filters = _mel_filterbank(sample_rate, FEATURE_FFT_SIZE, MEL_BANDS)
+    dct = _dct_matrix(MEL_BANDS, MFCC_COEFFICIENTS)
+    frequencies = np.fft.rfftfreq(FEATURE_FFT_SIZE, 1.0 / sample_rate)
+    band_bins = []
+    for low, high in zip(CONTRAST_BAND_EDGES, CONTRAST_BAND_EDGES[1:]):
+        in_band = (frequencies >= low) & (frequencies < (high or np.inf))
+        band_bins.append(np.flatnonzero(in_band))
+
+    count = 0
+    totals = np.zeros(FEATURE_SIZE // 2)
+    squares = np.zeros(FEATURE_SIZE // 2)
+    for magnitudes in _stft_magnitudes(samples, FEATURE_FFT_SIZE, FEATURE_HOP):
+        power = np.square(magnitudes)
+        mfcc = np.log(power @ mel_filters.T + 1e-10) @ dct.T
+
+        contrast = []
+        for bins in band_bins:
+            band = np.sort(np.log(power[:, bins] + 1e-10), axis=1)
+            edge = max(1, int(round(CONTRAST_QUANTILE * len(bins))))
+            contrast.append(band[:, -edge:].mean(axis=1) - band[:, :edge].mean(axis=1))
+
+        frames = np.hstack((mfcc, np.column_stack(contrast)))
+        count += len(frames)
+        totals += frames.sum(axis=0)
+        squares += np.square(frames).sum(axis=0)
+
+    if count == 0:
+        return None
+    mean = totals / count
+    std = np.sqrt(np.maximum(squares / count - np.square(mean), 0.0))
+    return np.concatenate((mean, std)).astype(np.float32)
+
+
+def analyze_file(file_path):
+    """
+    Analiza un archivo. Se ejecuta en los procesos del pool, así que devuelve
+    solo datos serializables y baratos de transferir.
+
+    Returns:
+        dict: 'waveform' y 'features' (bytes float32), 'bpm' y 'key', o None si hubo un error.
+              'features' queda vacío (b"") si la pista es demasiado corta: así consta
+              como analizada y no se vuelve a intentar.
+    """
+    try:
+        samples, sample_rate = load_audio(file_path)
+        features = timbre_features(samples, sample_rate)
+        return {
+            "waveform": compute_waveform(samples).tobytes(),
+            "bpm": estimate_bpm(samples, sample_rate),
+            "key": estimate_key(samples, sample_rate),
+            "features": features.tobytes() if features is not None else b"",
+        }
+    except Exception as e:
+        print(f"Error al analizar {file_path}: {e}")
+        return None
+
+
+def _pending_tracks(conn, force=False, limit=None):
+    """
+    Pistas sin analizar, cuyo archivo ha cambiado desde el último análisis o
+    analizadas antes de que existiera el vector de timbre. Estas últimas son las
+    que tienen forma de onda pero features NULL: los análisis actuales guardan
+    siempre features, vacío si no se pudo calcular. Los análisis fallidos no se
+    guardan, así que siguen pendientes.
+    """
+    sql = """
+        SELECT t.id, t.file_path, t.last_modified_date FROM tracks t
+        LEFT JOIN track_analysis a ON a.track_id = t.id
+    """
+    if not force:
+        sql += """ WHERE a.track_id IS NULL OR a.source_mtime IS NOT t.last_modified_date
+                   OR (a.features IS NULL AND a.waveform IS NOT NULL)"""
+    sql += " ORDER BY t.id"
+    params = ()
+    if limit:
+        sql += " LIMIT ?"
+        params = (limit,)
+    return conn.execute(sql, params).fetchall()
+
+
+def _save_results(conn, results, overwrite_tags):
+    """Guarda un lote de resultados y completa el BPM y la tonalidad de las pistas."""
+    now = time.time()
+    conn.executemany(
+        """INSERT OR REPLACE INTO track_analysis(track_id, waveform, bpm, key, source_mtime, analyzed_date, features)
+           VALUES(?,?,?,?,?,?,?)""",
+        [(track_id, result.get("waveform"), result.get("bpm"), result.get("key"), mtime, now, result.get("features"))
+         for track_id, mtime, result in results]
+    )
+    bpm_condition = "" if overwrite_tags else f" AND {MISSING_BPM_SQL}"
+    key_condition = "" if overwrite_tags else f" AND {MISSING_KEY_SQL}"
+    conn.executemany(f"UPDATE tracks SET bpm = ? WHERE id = ?{bpm_condition}",
+                     [(result["bpm"], track_id) for track_id, _, result in results if result.get("bpm")])
+    conn.executemany(f"UPDATE tracks SET key = ? WHERE id = ?{key_condition}",
+                     [(result["key"], track_id) for track_id, _, result in results if result.get("key")])
+    conn.commit()
+
+
+def analyze_library(workers=None, force=False, overwrite_tags=False, limit=None, progress=None, batch_size=50):
+    """
+    Analiza las pistas pendientes de la biblioteca en varios procesos.
+
+    Args:
+        workers (int): Número de procesos. Por defecto, uno por CPU.
+        force (bool): Volver a analizar también las pistas ya analizadas.
+        overwrite_tags (bool): Sustituir el BPM y la tonalidad de los tags. Si es False,
+                               solo se completan las pistas que no los tienen.
+        limit (int): Número máximo de pistas a analizar.
+        progress (callable): Se llama con (hechas, total, ruta) tras cada pista.
+        batch_size (int): Resultados que se acumulan antes de escribir en la base de datos.
+
+    Returns:
+        dict: Contadores 'analyzed', 'failed' y 'total'.
+    """
+    stats = {"analyzed": 0, "failed": 0, "total": 0}
+    conn = create_connection()
+    if not conn:
+        return stats
+
+    try:
+        pending = _pending_tracks(conn, force, limit)
+        stats["total"] = len(pending)
+        if not pending:
+            return stats
+
+        workers = workers or os.cpu_count() or 1
+        results = []
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # Ventana acotada de trabajos en curso: no se encolan todos los archivos a la vez
+            queued = iter(pending)
+            in_flight = {}
+            for track in queued:
+                in_flight[executor.submit(analyze_file, track[1])] = track
+                if len(in_flight) >= workers * 2:
+                    break
+
+            done_count = 0
+            while in_flight:
+                finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    track_id, file_path, mtime = in_flight.pop(future)
+                    result = future.result()
+                    if result is None:
+                        # No se guarda: la pista sigue pendiente y se reintenta en el
+                        # próximo análisis (p. ej. tras instalar ffmpeg)
+                        stats["failed"] += 1
+                    else:
+                        stats["analyzed"] += 1
+                        results.append((track_id, mtime, result))
+                    done_count += 1
+                    if progress:
+                        progress(done_count, stats["total"], file_path)
+
+                    next_track = next(queued, None)
+                    if next_track is not None:
+                        in_flight[executor.submit(analyze_file, next_track[1])] = next_track
+
+                if len(results) >= batch_size:
+                    _save_results(conn, results, overwrite_tags)
+                    results = []
+
+        _save_results(conn, results, overwrite_tags)
+    except sqlite3.Error as e:
+        print(f"Error al guardar el análisis: {e}")
+    finally:
+        conn.close()
+    return stats
+
+
+def get_cached_waveform(file_path):
+    """
+    Devuelve la forma de onda ya analizada de una pista, o None si no existe
+    o el archivo ha cambiado desde el análisis.
+    """
+    conn = create_connection()
+    if not conn:
+        return None
+
+    try:
+        row = conn.execute("""
+            SELECT a.waveform FROM tracks t JOIN track_analysis a ON a.track_id = t.id
+            WHERE t.file_path = ? AND a.source_mtime IS t.last_modified_date
+        """, (file_path,)).fetchone()
+    except sqlite3.Error as e:
+        print(f"Error al leer la forma de onda de {file_path}: {e}")
+        return None
+    finally:
+        conn.close()
+
+    if not row or not row[0]:
+        return None
+    return np.frombuffer(row[0], dtype=np.float32).tolist()
@@ -0,0 +1,326 @@
+"""
+Exportación de la biblioteca a Rekordbox XML y playlists M3U8 (preparación de
+USBs para CDJs).
+
+Las filas se leen de cursores por lotes y el documento se escribe según se
+recorren, sin construir el árbol XML ni la lista de pistas en memoria.
+"""
+
+import os
+import re
+import sqlite3
+from urllib.parse import quote
+from xml.sax.saxutils import escape
+
+from core.database import create_connection, iter_tracks
+from core.playlist_logic import camelot_to_key_name, parse_bpm, parse_camelot
+
+# Tipos de cue de la base de datos -> Type de POSITION_MARK en Rekordbox
+REKORDBOX_CUE_TYPES = {"cue": "0", "fade_in": "1", "fade_out": "2", "load": "3", "loop": "4"}
+
+REKORDBOX_KINDS = {"MP3": "MP3 File", "FLAC": "FLAC File", "WAV": "WAV File", "M4A": "M4A File", "AIFF": "AIFF File"}
+
+_EXPORT_COLUMNS = ["id", "file_path", "title", "artist", "album", "genre", "year", "track_number",
+                   "duration", "bpm", "key", "comment", "date_added", "file_type", "file_size"]
+
+# Caracteres de control no permitidos en XML 1.0
+_INVALID_XML_CHARS = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+
+def _attr(value):
+    """Escapa un valor para usarlo como atributo XML entre comillas dobles."""
+    text = _INVALID_XML_CHARS.sub("", str(value))
+    return escape(text, {'"': "&quot;", "\n": "&#10;", "\r": "&#13;", "\t": "&#9;"})
+
+
+def _has_value(value):
+    return value not in (None, "", "N/A", "N/A (WAV)")
+
+
+def _tonality(key):
+    """Tonalidad en notación musical (Am, F#...), que es la que espera Rekordbox."""
+    camelot = parse_camelot(key) if _has_value(key) else None
+    return camelot_to_key_name(camelot) if camelot else key
+
+
+def path_to_location(file_path):
+    """Convierte una ruta local en la URL 'file://localhost/...' que usa Rekordbox."""
+    path = file_path.replace("\\", "/")
+    if not path.startswith("/"):
+        path = "/" + path  # Unidad de Windows: /C:/Music/...
+    return "file://localhost" + quote(path, safe="/:")
+
+
+def _playlist_filter(playlist_ids):
+    """Condición SQL para limitar las pistas a las de ciertas playlists."""
+    if not playlist_ids:
+        return None, ()
+    placeholders = ",".join("?" * len(playlist_ids))
+    return (f"id IN (SELECT track_id FROM playlist_tracks WHERE playlist_id IN ({placeholders}))",
+            tuple(playlist_ids))
+
+
+def _iter_cues(conn, where, params):
+    """Recorre los puntos cue ordenados por pista, para combinarlos con el cursor de pistas."""
+    sql = "SELECT track_id, name, type, start, end, hotcue FROM cue_points"
+    if where:
+        sql += f" WHERE track_id IN (SELECT id FROM tracks WHERE {where})"
+    sql += " ORDER BY track_id, start"
+    cursor = conn.cursor()
+    cursor.execute(sql, params)
+    while True:
+        rows = cursor.fetchmany(1000)
+        if not rows:
+            break
+        yield from rows
+
+
+def _track_element(track, cues):
+    """Devuelve el elemento <TRACK> de la colección como texto."""
+    attributes = [("TrackID", track["id"])]
+    optional = [
+        ("Name", track["title"]),
+        ("Artist", track["artist"]),
+        ("Album", track["album"]),
+        ("Genre", track["genre"]),
+        ("Kind", REKORDBOX_KINDS.get((track["file_type"] or "").upper())),
+        ("Size", track["file_size"]),
+        ("TotalTime", int(track["duration"]) if isinstance(track["duration"], (int, float)) else None),
+        ("TrackNumber", track["track_number"]),
+        ("Year", track["year"]),
+        ("AverageBpm", f"{parse_bpm(track['bpm']):.2f}" if parse_bpm(track["bpm"]) else None),
+        ("DateAdded", (track["date_added"] or "")[:10] or None),
+        ("Comments", track["comment"]),
+        ("Tonality", _tonality(track["key"])),
+    ]
+    attributes.extend((name, value) for name, value in optional if _has_value(value))
+    attributes.append(("Location", path_to_location(track["file_path"])))
+    text = "    <TRACK " + " ".join(f'{name}="{_attr(value)}"' for name, value in attributes)
+
+    if not cues:
+        return text + "/>\n"
+
+    parts = [text + ">\n"]
+    for _, name, cue_type, start, end, hotcue in cues:
+        mark = f'      <POSITION_MARK Name="{_attr(name or "")}" Type="{REKORDBOX_CUE_TYPES.get(cue_type, "0")}" Start="{start:.3f}"'
+        if end is not None:
+            mark += f' End="{end:.3f}"'
+        mark += f' Num="{hotcue if hotcue is not None else -1}"/>\n'
+        parts.append(mark)
+    parts.append("    </TRACK>\n")
+    return "".join(parts)
+
+
+def export_rekordbox_xml(output_path, playlist_ids=None):
+    """
+    Exporta la colección (o solo las pistas de ciertas playlists) a un XML
+    compatible con Rekordbox, con puntos cue y playlists.
+
+    Args:
+        output_path (str): Ruta del XML a escribir.
+        playlist_ids (list): Ids de playlist a exportar. Si es None, se exporta todo.
+
+    Returns:
+        int: Número de pistas exportadas.
+
+    Raises:
+        sqlite3.Error: Si falla la lectura de la base de datos. No se captura: un
+                       XML incompleto parecería una exportación válida.
+    """
+    where, params = _playlist_filter(playlist_ids)
+    conn = create_connection()
+    if not conn:
+        raise sqlite3.OperationalError("No se pudo abrir la base de datos")
+
+    # Se escribe a un temporal: si la lectura falla, el XML anterior queda intacto
+    temp_path = output_path + ".tmp"
+    try:
+        cursor = conn.cursor()
+        # Una sola transacción de lectura: el recuento, las pistas, los cues y las
+        # playlists ven la misma versión de la biblioteca aunque un escaneo escriba.
+        cursor.execute("BEGIN")
+        cursor.execute("SELECT COUNT(*) FROM tracks" + (f" WHERE {where}" if where else ""), params)
+        total = cursor.fetchone()[0]
+
+        with open(temp_path, "w", encoding="utf-8", buffering=WRITE_BUFFER_SIZE) as f:
+            f.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+            f.write('<DJ_PLAYLISTS Version="1.0.0">\n')
+            f.write('  <PRODUCT Name="DjAlfin" Version="1.0" Company=""/>\n')
+            f.write(f'  <COLLECTION Entries="{total}">\n')
+
+            # Pistas y cues van ambos ordenados por id: se combinan en una sola pasada.
+            cues = _iter_cues(conn, where, params)
+            pending_cue = next(cues, None)
+            count = 0
+            for row in iter_tracks(_EXPORT_COLUMNS, where=where, params=params, order_by="id", conn=conn):
+                track = dict(zip(_EXPORT_COLUMNS, row))
+                while pending_cue is not None and pending_cue[0] < track["id"]:
+                    pending_cue = next(cues, None)
+                track_cues = []
+                while pending_cue is not None and pending_cue[0] == track["id"]:
+                    track_cues.append(pending_cue)
+                    pending_cue = next(cues, None)
+                f.write(_track_element(track, track_cues))
+                count += 1
+            f.write("  </COLLECTION>\n")
+
+            _write_rekordbox_playlists(f, conn, playlist_ids)
+            f.write("</DJ_PLAYLISTS>\n")
+        os.replace(temp_path, output_path)
+    except (OSError, sqlite3.Error):
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+    finally:
+        conn.close()
+
+    print(f"Exportadas {count} pistas a {output_path}")
+    return count
+
+
+def _write_rekordbox_playlists(f, conn, playlist_ids):
+    """Escribe el bloque <PLAYLISTS> leyendo las entradas de un cursor."""
+    cursor = conn.cursor()
+    sql = """
+        SELECT p.id, p.name, COUNT(pt.track_id) FROM playlists p
+        LEFT JOIN playlist_tracks pt ON pt.playlist_id = p.id
+    """
+    params = ()
+    if playlist_ids:
+        sql += f" WHERE p.id IN ({','.join('?' * len(playlist_ids))})"
+        params = tuple(playlist_ids)
+    sql += " GROUP BY p.id ORDER BY p.name"
+    cursor.execute(sql, params)
+    playlists = cursor.fetchall()
+
+    f.write("  <PLAYLISTS>\n")
+    f.write(f'    <NODE Type="0" Name="ROOT" Count="{len(playlists)}">\n')
+    entries = conn.cursor()
+    for playlist_id, name, entry_count in playlists:
+        f.write(f'      <NODE Name="{_attr(name)}" Type="1" KeyType="0" Entries="{entry_count}">\n')
+        entries.execute("SELECT track_id FROM playlist_tracks WHERE playlist_id = ? ORDER BY position", (playlist_id,))
+        while True:
+            rows = entries.fetchmany(1000)
+            if not rows:
+                break
+            f.write("".join(f'        <TRACK Key="{track_id}"/>\n' for (track_id,) in rows))
+        f.write("      </NODE>\n")
+    f.write("    </NODE>\n")
+    f.write("  </PLAYLISTS>\n")
+
+
+def _iter_playlist_tracks(playlist_id):
+    """Recorre las pistas de una playlist en orden, o toda la biblioteca si playlist_id es None."""
+    columns = ["file_path", "title", "artist", "duration"]
+    if playlist_id is None:
+        yield from iter_tracks(columns, order_by="id")
+        return
+
+    conn = create_connection()
+    if not conn:
+        raise sqlite3.OperationalError("No se pudo abrir la base de datos")
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT t.file_path, t.title, t.artist, t.duration FROM playlist_tracks pt
+            JOIN tracks t ON t.id = pt.track_id
+            WHERE pt.playlist_id = ? ORDER BY pt.position
+        """, (playlist_id,))
+        while True:
+            rows = cursor.fetchmany(1000)
+            if not rows:
+                break
+            yield from rows
+    finally:
+        conn.close()
+
+
+def export_m3u8(output_path, playlist_id=None, path_mapper=None, relative=False):
+    """
+    Exporta una playlist (o toda la biblioteca) a M3U8 de forma incremental.
+
+    Args:
+        output_path (str): Ruta del archivo .m3u8.
+        playlist_id (int): Playlist a exportar. Si es None, se exporta toda la biblioteca.
+        path_mapper (callable): Convierte la ruta original en la que debe aparecer en la
+                                playlist (p. ej. su copia en un USB). Si devuelve None,
+                                la pista se omite.
+        relative (bool): Escribir las rutas relativas a la carpeta de la playlist.
+
+    Returns:
+        int: Número de pistas escritas.
+
+    Raises:
+        sqlite3.Error: Si falla la lectura de la playlist.
+    """
+    base_dir = os.path.dirname(os.path.abspath(output_path))
+    # Se escribe a un temporal: si la lectura falla, la playlist anterior queda intacta
+    temp_path = output_path + ".tmp"
+    count = 0
+    try:
+        with open(temp_path, "w", encoding="utf-8", buffering=WRITE_BUFFER_SIZE) as f:
+            f.write("#EXTM3U\n")
+            for file_path, title, artist, duration in _iter_playlist_tracks(playlist_id):
+                target_path = path_mapper(file_path) if path_mapper else file_path
+                if target_path is None:
+                    continue
+                if relative:
+                    target_path = os.path.relpath(target_path, base_dir)
+                seconds = int(duration) if isinstance(duration, (int, float)) else -1
+                label = f"{artist} - {title}" if _has_value(artist) else (title if _has_value(title) else os.path.basename(file_path))
+                f.write(f"#EXTINF:{seconds},{label}\n{target_path}\n")
+                count += 1
+        os.replace(temp_path, output_path)
+    except (OSError, sqlite3.Error):
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+    return count
+
+
+def safe_file_name(name):
+    """Convierte un nombre de playlist en un nombre de archivo válido en FAT32/exFAT."""
+    cleaned = re.sub(r'[<>:"/\\|?*\x00-\x1f]', "_", name).strip(" .")
+    return cleaned or "playlist"
+
+
+def export_all_playlists_m3u8(output_dir, playlist_ids=None, path_mapper=None, relative=False):
+    """
+    Exporta cada playlist a su propio archivo .m3u8 dentro de output_dir.
+
+    Returns:
+        list: Rutas de los archivos escritos.
+
+    Raises:
+        sqlite3.Error: Si falla la lectura de la base de datos.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    conn = create_connection()
+    if not conn:
+        raise sqlite3.OperationalError("No se pudo abrir la base de datos")
+    try:
+        cursor = conn.cursor()
+        sql = "SELECT id, name FROM playlists"
+        params = ()
+        if playlist_ids:
+            sql += f" WHERE id IN ({','.join('?' * len(playlist_ids))})"
+            params = tuple(playlist_ids)
+        cursor.execute(sql + " ORDER BY name", params)
+        playlists = cursor.fetchall()
+    finally:
+        conn.close()
+
+    written = []
+    for playlist_id, name in playlists:
+        output_path = os.path.join(output_dir, safe_file_name(name) + ".m3u8")
+        if output_path in written:
+            output_path = os.path.join(output_dir, f"{safe_file_name(name)} ({playlist_id}).m3u8")
+        export_m3u8(output_path, playlist_id, path_mapper, relative)
+        written.append(output_path)
+    return written
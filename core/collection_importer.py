@@ -0,0 +1,544 @@
+"""
+Importación de colecciones de otras aplicaciones: Rekordbox XML, Traktor NML
+y playlists M3U/M3U8.
+
+Los XML se recorren con iterparse y cada pista se descarta en cuanto se ha
+procesado, de modo que una exportación de cientos de MB se importa sin cargar
+el árbol completo en memoria. Las pistas se escriben por lotes y solo se leen
+los tags de los archivos nuevos o cuyo mtime/tamaño ha cambiado.
+"""
+
+import os
+import sqlite3
+import time
+import xml.etree.ElementTree as ET
+from urllib.parse import unquote, urlparse
+
+from core.artwork_cache import attach_artwork
+from core.database import create_connection, track_upsert_values, UPSERT_TRACK_SQL
+from core.library_scanner import is_supported_file
+from core.metadata_reader import read_metadata
+from core.playlist_logic import format_camelot, pitch_class_to_camelot
+
+# Campos de la colección que se aplican también a las pistas cuyo archivo no ha
+# cambiado: la colección es la fuente de verdad de lo que el DJ editó en su programa.
+COLLECTION_FIELDS = ["title", "artist", "album", "genre", "year", "track_number", "duration", "bpm", "key", "comment"]
+
+_COLLECTION_UPDATE_SQL = "UPDATE tracks SET {} WHERE id = ?".format(
+    ", ".join(f"{field} = COALESCE(?, {field})" for field in COLLECTION_FIELDS)
+)
+
+# Tipos de POSITION_MARK de Rekordbox y de CUE_V2 de Traktor
+REKORDBOX_CUE_TYPES = {"0": "cue", "1": "fade_in", "2": "fade_out", "3": "load", "4": "loop"}
+TRAKTOR_CUE_TYPES = {"0": "cue", "1": "fade_in", "2": "fade_out", "3": "load", "4": "grid", "5": "loop"}
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class _CollectionWriter:
+    """
+    Acumula pistas, puntos cue y entradas de playlist y los escribe por lotes
+    en una única conexión. Toda la importación es una sola transacción: si el
+    archivo está dañado a mitad, abort() la deshace en lugar de dejarla a medias.
+    """
+
+    def __init__(self, source, batch_size=500):
+        self.source = source
+        self.batch_size = batch_size
+        self.conn = create_connection()
+        if not self.conn:
+            raise sqlite3.Error("No se pudo abrir la base de datos.")
+        self.cursor = self.conn.cursor()
+        self._pending_tracks = []  # (clave en la colección, datos, cues)
+        self._pending_entries = []
+        self._key_to_id = {}       # clave en la colección -> id en 'tracks'
+        self.stats = {"tracks": 0, "tags_read": 0, "unchanged": 0, "missing": 0, "unsupported": 0,
+                      "cues": 0, "playlists": 0, "entries": 0}
+
+    def add_track(self, collection_key, entry, cues=()):
+        """Añade una pista de la colección (entry debe incluir 'file_path')."""
+        self._pending_tracks.append((collection_key, entry, list(cues)))
+        if len(self._pending_tracks) >= self.batch_size:
+            self.flush_tracks()
+
+    def flush_tracks(self):
+        """Escribe el lote de pistas pendiente."""
+        if not self._pending_tracks:
+            return
+        batch, self._pending_tracks = self._pending_tracks, []
+
+        existing = self._lookup_paths([entry["file_path"] for _, entry, _ in batch],
+                                      "id, file_path, last_modified_date, file_size")
+
+        upserts = []
+        collection_updates = []
+        imported = []
+        now = time.time()
+        for collection_key, entry, cues in batch:
+            file_path = entry["file_path"]
+            # Solo se importan archivos que existen y que la biblioteca sabe leer
+            if not is_supported_file(file_path):
+                self.stats["unsupported"] += 1
+                continue
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                self.stats["missing"] += 1
+                continue
+            imported.append((collection_key, entry, cues))
+
+            known = existing.get(file_path)
+            if known and known[2] == stat.st_mtime and known[3] == stat.st_size:
+                # El archivo no ha cambiado: no se vuelven a leer sus tags, pero se
+                # aplican los datos de la colección igual que en una pista nueva.
+                collection_updates.append(
+                    [entry.get(field) if entry.get(field) != "" else None for field in COLLECTION_FIELDS] + [known[0]]
+                )
+                self.stats["unchanged"] += 1
+                continue
+
+            track_data = attach_artwork(read_metadata(file_path, include_artwork=True) or {})
+            self.stats["tags_read"] += 1
+            for field, value in entry.items():
+                if field != "fallback" and value not in (None, ""):
+                    track_data[field] = value
+            for field, value in entry.get("fallback", {}).items():
+                # Datos de respaldo (#EXTINF): solo si el archivo no trae ese tag
+                if track_data.get(field) in (None, "", "N/A", 0):
+                    track_data[field] = value
+            _, extension = os.path.splitext(file_path)
+            track_data["file_type"] = extension.replace(".", "").upper()
+            track_data["last_modified_date"] = stat.st_mtime
+            track_data["file_size"] = stat.st_size
+            track_data["last_scanned_date"] = now
+            upserts.append(track_upsert_values(track_data))
+
+        self.cursor.executemany(UPSERT_TRACK_SQL, upserts)
+        self.cursor.executemany(_COLLECTION_UPDATE_SQL, collection_updates)
+
+        imported_paths = [entry["file_path"] for _, entry, _ in imported]
+        ids = {path: row[0] for path, row in self._lookup_paths(imported_paths, "id, file_path").items()}
+        cue_rows = []
+        for collection_key, entry, cues in imported:
+            track_id = ids.get(entry["file_path"])
+            if track_id is None:
+                continue
+            self._key_to_id[collection_key] = track_id
+            for cue in cues:
+                cue_rows.append((track_id, cue.get("name"), cue.get("type", "cue"), cue["start"],
+                                 cue.get("end"), cue.get("hotcue"), self.source))
+
+        cue_track_ids = {row[0] for row in cue_rows}
+        self.cursor.executemany("DELETE FROM cue_points WHERE track_id = ? AND source = ?",
+                                [(track_id, self.source) for track_id in cue_track_ids])
+        self.cursor.executemany(
+            "INSERT INTO cue_points(track_id, name, type, start, end, hotcue, source) VALUES(?,?,?,?,?,?,?)",
+            cue_rows
+        )
+
+        self.stats["tracks"] += len(imported)
+        self.stats["cues"] += len(cue_rows)
+        print(f"Importadas {self.stats['tracks']} pistas...")
+
+    def _lookup_paths(self, paths, columns):
+        """Devuelve {ruta: fila} para las rutas que ya existen en 'tracks'."""
+        found = {}
+        for start in range(0, len(paths), 500):
+            chunk = paths[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            self.cursor.execute(f"SELECT {columns} FROM tracks WHERE file_path IN ({placeholders})", chunk)
+            for row in self.cursor.fetchall():
+                found[row[1]] = row
+        return found
+
+    def resolve(self, collection_key):
+        """Devuelve el id de la pista importada con esa clave, o None."""
+        return self._key_to_id.get(collection_key)
+
+    def start_playlist(self, name):
+        """Crea (o vacía, si ya existía) una playlist y devuelve su id."""
+        self.flush_tracks()
+        self.flush_entries()
+        self.cursor.execute(
+            "INSERT OR IGNORE INTO playlists(name, source, date_added) VALUES(?, ?, datetime('now'))",
+            (name, self.source)
+        )
+        self.cursor.execute("SELECT id FROM playlists WHERE name = ? AND source = ?", (name, self.source))
+        playlist_id = self.cursor.fetchone()[0]
+        self.cursor.execute("DELETE FROM playlist_tracks WHERE playlist_id = ?", (playlist_id,))
+        self.stats["playlists"] += 1
+        return playlist_id
+
+    def add_playlist_entry(self, playlist_id, position, track_id):
+        self._pending_entries.append((playlist_id, position, track_id))
+        if len(self._pending_entries) >= self.batch_size:
+            self.flush_entries()
+
+    def flush_entries(self):
+        if not self._pending_entries:
+            return
+        self.cursor.executemany(
+            "INSERT OR REPLACE INTO playlist_tracks(playlist_id, position, track_id) VALUES(?,?,?)",
+            self._pending_entries
+        )
+        self.stats["entries"] += len(self._pending_entries)
+        self._pending_entries = []
+
+    def close(self):
+        """Escribe lo pendiente y confirma la importación completa."""
+        try:
+            self.flush_tracks()
+            self.flush_entries()
+            self.conn.commit()
+        finally:
+            self.conn.close()
+
+    def abort(self):
+        """Deshace todo lo escrito: una importación fallida no deja datos a medias."""
+        try:
+            self.conn.rollback()
+        finally:
+            self.conn.close()
+
+
+def _rekordbox_location_to_path(location):
+    """Convierte 'file://localhost/Users/x/a.mp3' en una ruta local."""
+    if not location:
+        return None
+    path = unquote(urlparse(location).path)
+    # Rutas de Windows: '/C:/Music/a.mp3'
+    if len(path) > 2 and path[0] == "/" and path[2] == ":":
+        path = path[1:]
+    return os.path.normpath(path)
+
+
+def _traktor_location_to_path(volume, directory, file_name):
+    """Convierte una LOCATION de Traktor (DIR con separador '/:') en una ruta local."""
+    directory = (directory or "").replace("/:", "/")
+    path = directory + (file_name or "")
+    if volume and volume.endswith(":"):
+        # Unidad de Windows ('C:')
+        return os.path.normpath(volume + path)
+    if volume and os.path.isdir(os.path.join("/Volumes", volume)) and not os.path.exists(path):
+        # Disco externo en macOS
+        return os.path.normpath(os.path.join("/Volumes", volume) + path)
+    return os.path.normpath(path)
+
+
+def import_rekordbox_xml(xml_path, batch_size=500):
+    """
+    Importa una colección exportada desde Rekordbox (File > Export Collection in xml format).
+
+    Returns:
+        dict: Resumen con el número de pistas, cues, playlists y entradas importadas.
+    """
+    writer = _CollectionWriter("rekordbox", batch_size)
+    stack = []             # Etiquetas abiertas
+    elements = []          # Elementos abiertos (paralelo a 'stack')
+    node_names = []        # Nombres de las carpetas/playlists abiertas
+    playlist = None        # (id, tipo de clave) de la playlist abierta
+    position = 0
+
+    try:
+        for event, elem in ET.iterparse(xml_path, events=("start", "end")):
+            tag = elem.tag
+            if event == "start":
+                stack.append(tag)
+                elements.append(elem)
+                if tag == "NODE" and "PLAYLISTS" in stack:
+                    name = elem.get("Name", "")
+                    node_names.append(name)
+                    if elem.get("Type") == "1":
+                        # El nodo raíz (ROOT) no forma parte del nombre
+                        playlist = (writer.start_playlist("/".join(node_names[1:]) or name), elem.get("KeyType", "0"))
+                        position = 0
+                continue
+
+            stack.pop()
+            elements.pop()
+            parent = elements[-1] if elements else None
+
+            if tag == "TRACK" and stack and stack[-1] == "COLLECTION":
+                cues = []
+                for mark in elem.iter("POSITION_MARK"):
+                    start = _to_float(mark.get("Start"))
+                    if start is None:
+                        continue
+                    hotcue = _to_int(mark.get("Num"))
+                    cues.append({
+                        "name": mark.get("Name") or None,
+                        "type": REKORDBOX_CUE_TYPES.get(mark.get("Type"), "cue"),
+                        "start": start,
+                        "end": _to_float(mark.get("End")),
+                        "hotcue": hotcue if hotcue is not None and hotcue >= 0 else None,
+                    })
+                file_path = _rekordbox_location_to_path(elem.get("Location"))
+                if file_path:
+                    writer.add_track(elem.get("TrackID"), {
+                        "file_path": file_path,
+                        "title": elem.get("Name"),
+                        "artist": elem.get("Artist"),
+                        "album": elem.get("Album"),
+                        "genre": elem.get("Genre"),
+                        "year": _to_int(elem.get("Year")) or None,
+                        "track_number": elem.get("TrackNumber") if elem.get("TrackNumber") not in (None, "0") else None,
+                        "duration": _to_float(elem.get("TotalTime")),
+                        "bpm": _to_float(elem.get("AverageBpm")) or None,
+                        "key": elem.get("Tonality") or None,
+                        "comment": elem.get("Comments"),
+                    }, cues)
+                elem.clear()
+                parent.clear()
+            elif tag == "TRACK" and playlist:
+                key = elem.get("Key")
+                if playlist[1] == "1":
+                    track_id = _lookup_track_id(writer, _rekordbox_location_to_path(key))
+                else:
+                    track_id = writer.resolve(key)
+                if track_id is not None:
+                    writer.add_playlist_entry(playlist[0], position, track_id)
+                    position += 1
+                parent.clear()
+            elif tag == "NODE" and node_names:
+                node_names.pop()
+                playlist = None
+                if parent is not None:
+                    parent.clear()
+    except BaseException:
+        writer.abort()
+        raise
+    writer.close()
+
+    print(f"Importación de Rekordbox completada: {writer.stats}")
+    return writer.stats
+
+
+def import_traktor_nml(nml_path, batch_size=500):
+    """
+    Importa una colección de Traktor (collection.nml o una playlist exportada en NML).
+
+    Returns:
+        dict: Resumen con el número de pistas, cues, playlists y entradas importadas.
+    """
+    writer = _CollectionWriter("traktor", batch_size)
+    stack = []
+    elements = []
+    node_names = []
+    playlist_id = None
+    position = 0
+
+    try:
+        for event, elem in ET.iterparse(nml_path, events=("start", "end")):
+            tag = elem.tag
+            if event == "start":
+                stack.append(tag)
+                elements.append(elem)
+                if tag == "NODE":
+                    node_names.append(elem.get("NAME", ""))
+                    if elem.get("TYPE") == "PLAYLIST":
+                        # El nodo raíz ($ROOT) no forma parte del nombre
+                        playlist_id = writer.start_playlist("/".join(node_names[1:]) or node_names[-1])
+                        position = 0
+                continue
+
+            stack.pop()
+            elements.pop()
+            parent = elements[-1] if elements else None
+
+            if tag == "ENTRY" and stack and stack[-1] == "COLLECTION":
+                location = elem.find("LOCATION")
+                if location is not None:
+                    file_path = _traktor_location_to_path(location.get("VOLUME"), location.get("DIR"), location.get("FILE"))
+                    collection_key = (location.get("VOLUME") or "") + (location.get("DIR") or "") + (location.get("FILE") or "")
+                    album = elem.find("ALBUM")
+                    info = elem.find("INFO")
+                    tempo = elem.find("TEMPO")
+                    musical_key = elem.find("MUSICAL_KEY")
+
+                    key = None
+                    key_value = _to_int(musical_key.get("VALUE")) if musical_key is not None else None
+                    if key_value is not None and 0 <= key_value <= 23:
+                        key = format_camelot(pitch_class_to_camelot(key_value % 12, key_value >= 12))
+                    elif info is not None:
+                        key = info.get("KEY") or None
+
+                    cues = []
+                    for cue in elem.iter("CUE_V2"):
+                        start = _to_float(cue.get("START"))
+                        if start is None:
+                            continue
+                        cue_type = TRAKTOR_CUE_TYPES.get(cue.get("TYPE"), "cue")
+                        if cue_type == "grid":
+                            continue
+                        length = _to_float(cue.get("LEN")) or 0
+                        hotcue = _to_int(cue.get("HOTCUE"))
+                        cues.append({
+                            "name": cue.get("NAME") if cue.get("NAME") not in (None, "n.n.") else None,
+                            "type": cue_type,
+                            "start": start / 1000.0,  # Traktor usa milisegundos
+                            "end": (start + length) / 1000.0 if length else None,
+                            "hotcue": hotcue if hotcue is not None and hotcue >= 0 else None,
+                        })
+
+                    writer.add_track(collection_key, {
+                        "file_path": file_path,
+                        "title": elem.get("TITLE"),
+                        "artist": elem.get("ARTIST"),
+                        "album": album.get("TITLE") if album is not None else None,
+                        "track_number": album.get("TRACK") if album is not None else None,
+                        "genre": info.get("GENRE") if info is not None else None,
+                        "comment": info.get("COMMENT") if info is not None else None,
+                        "duration": _to_float(info.get("PLAYTIME_FLOAT") or info.get("PLAYTIME")) if info is not None else None,
+                        "bpm": _to_float(tempo.get("BPM")) if tempo is not None else None,
+                        "key": key,
+                    }, cues)
+                elem.clear()
+                parent.clear()
+            elif tag == "PRIMARYKEY" and playlist_id is not None and elem.get("TYPE") == "TRACK":
+                collection_key = elem.get("KEY")
+                track_id = writer.resolve(collection_key)
+                if track_id is None and collection_key:
+                    # Playlist exportada sin colección: la clave contiene volumen y ruta
+                    volume, _, rest = collection_key.partition("/:")
+                    track_id = _lookup_track_id(writer, _traktor_location_to_path(volume, "/:" + rest, ""))
+                if track_id is not None:
+                    writer.add_playlist_entry(playlist_id, position, track_id)
+                    position += 1
+            elif tag == "ENTRY" and stack and stack[-1] == "PLAYLIST":
+                elem.clear()
+                parent.clear()
+            elif tag == "NODE" and node_names:
+                node_names.pop()
+                playlist_id = None
+                if parent is not None:
+                    parent.clear()
+    except BaseException:
+        writer.abort()
+        raise
+    writer.close()
+
+    print(f"Importación de Traktor completada: {writer.stats}")
+    return writer.stats
+
+
+def _lookup_track_id(writer, file_path):
+    """Busca una pista por ruta (pendientes incluidas) y devuelve su id, o None."""
+    if not file_path:
+        return None
+    writer.flush_tracks()
+    writer.cursor.execute("SELECT id FROM tracks WHERE file_path = ?", (file_path,))
+    row = writer.cursor.fetchone()
+    return row[0] if row else None
+
+
+def import_m3u(playlist_path, batch_size=500):
+    """
+    Importa una playlist M3U/M3U8. Los archivos que no estén en la biblioteca
+    se añaden leyendo sus tags; los datos de #EXTINF se usan para los tags que
+    falten. Los archivos que no existen se omiten y se cuentan en 'missing'.
+
+    Returns:
+        dict: Resumen con el número de pistas y entradas importadas.
+    """
+    base_dir = os.path.dirname(os.path.abspath(playlist_path))
+    name = os.path.splitext(os.path.basename(playlist_path))[0]
+    encodings = ["utf-8-sig"] if playlist_path.lower().endswith(".m3u8") else ["utf-8-sig", "latin-1"]
+
+    # Se decodifica el archivo completo antes de encolar nada: si una codificación
+    # falla a mitad, las pistas ya leídas no deben encolarse dos veces.
+    for encoding in encodings:
+        try:
+            with open(playlist_path, "r", encoding=encoding) as f:
+                text = f.read()
+            break
+        except UnicodeDecodeError:
+            continue
+    else:
+        print(f"No se pudo decodificar {playlist_path}")
+        return {"tracks": 0, "tags_read": 0, "unchanged": 0, "missing": 0, "unsupported": 0,
+                "cues": 0, "playlists": 0, "entries": 0}
+
+    writer = _CollectionWriter("m3u", batch_size)
+    try:
+        # Primero se añaden las pistas (por lotes); después se crea la playlist.
+        file_paths = []
+        for entry in _parse_m3u_entries(text, base_dir):
+            writer.add_track(entry["file_path"], entry)
+            file_paths.append(entry["file_path"])
+
+        writer.flush_tracks()
+        playlist_id = writer.start_playlist(name)
+        position = 0
+        for file_path in file_paths:
+            track_id = writer.resolve(file_path)
+            if track_id is not None:
+                writer.add_playlist_entry(playlist_id, position, track_id)
+                position += 1
+    except BaseException:
+        writer.abort()
+        raise
+    writer.close()
+
+    print(f"Importación de {os.path.basename(playlist_path)} completada: {writer.stats}")
+    return writer.stats
+
+
+def _parse_m3u_entries(text, base_dir):
+    """Genera una entrada de pista ({'file_path', ...}) por cada línea de archivo de la playlist."""
+    extinf = None
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith("#EXTINF:"):
+            extinf = line[len("#EXTINF:"):]
+            continue
+        if line.startswith("#"):
+            continue
+
+        if line.startswith("file://"):
+            file_path = _rekordbox_location_to_path(line)
+        else:
+            file_path = os.path.normpath(os.path.join(base_dir, line))
+
+        entry = {"file_path": file_path}
+        if extinf:
+            # Los tags del archivo tienen prioridad sobre #EXTINF
+            fallback = {}
+            duration, _, label = extinf.partition(",")
+            artist, separator, title = label.partition(" - ")
+            duration = _to_float(duration)
+            if duration and duration > 0:
+                fallback["duration"] = duration
+            if separator:
+                fallback["artist"], fallback["title"] = artist.strip(), title.strip()
+            else:
+                fallback["title"] = label.strip()
+            entry["fallback"] = fallback
+        extinf = None
+        yield entry
+
+
+def import_collection(path, batch_size=500):
+    """Importa un archivo de colección o playlist según su extensión."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".xml":
+        return import_rekordbox_xml(path, batch_size)
+    if extension == ".nml":
+        return import_traktor_nml(path, batch_size)
+    if extension in (".m3u", ".m3u8"):
+        return import_m3u(path, batch_size)
+    print(f"Formato de colección no soportado: {extension}")
+    return None
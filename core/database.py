@@ -4,6 +4,53 @@ import os
 DB_FILE = "library.db"
 CONFIG_DIR = "config"
 
+# Columnas de la tabla 'tracks', en orden, para consultas y exportaciones.
+TRACK_COLUMNS = [
+    "id", "file_path", "title", "artist", "album", "genre", "year", "track_number",
+    "duration", "bpm", "key", "comment", "date_added", "last_modified_date",
+    "last_scanned_date", "file_type", "file_size", "artwork_hash",
+]
+
+# Dimensiones de la tabla resumen 'library_summary'. Cada expresión recibe el
+# alias de la fila ({row}: NEW/OLD en los triggers, 'tracks' al reconstruir).
+# Los valores sin dato se agrupan bajo 'N/A', igual que hace metadata_reader.
+SUMMARY_DIMENSIONS = {
+    "all": "''",
+    "genre": "COALESCE(NULLIF(TRIM({row}.genre), ''), 'N/A')",
+    "key": "COALESCE(NULLIF(TRIM({row}.key), ''), 'N/A')",
+    "bpm": ("CASE WHEN typeof({row}.bpm) IN ('integer', 'real') AND {row}.bpm > 0 "
+            "THEN CAST(CAST({row}.bpm / 5 AS INTEGER) * 5 AS TEXT) ELSE 'N/A' END"),
+    "file_type": "COALESCE(NULLIF(UPPER({row}.file_type), ''), 'N/A')",
+}
+
+_UPSERT_COLUMNS = [
+    "file_path", "title", "artist", "album", "genre", "year", "track_number", "duration",
+    "bpm", "key", "comment", "last_modified_date", "last_scanned_date", "file_type", "file_size",
+    "artwork_hash",
+]
+
+# Inserta una pista o, si la ruta ya existe, actualiza sus metadatos conservando id y fecha de alta.
+UPSERT_TRACK_SQL = ''' INSERT INTO tracks(file_path, title, artist, album, genre, year, track_number, duration, bpm, key, comment, last_modified_date, last_scanned_date, file_type, file_size, artwork_hash, date_added)
+              VALUES(?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,datetime('now'))
+              ON CONFLICT(file_path) DO UPDATE SET
+                  title = excluded.title,
+                  artist = excluded.artist,
+                  album = excluded.album,
+                  genre = excluded.genre,
+                  year = excluded.year,
+                  track_number = excluded.track_number,
+                  duration = excluded.duration,
+                  bpm = excluded.bpm,
+                  key = excluded.key,
+                  comment = excluded.comment,
+                  last_modified_date = excluded.last_modified_date,
+                  last_scanned_date = excluded.last_scanned_date,
+                  file_type = excluded.file_type,
+                  file_size = excluded.file_size,
+                  artwork_hash = excluded.artwork_hash '''
+
+_SUMMARY_DURATION = "CASE WHEN typeof({row}.duration) IN ('integer', 'real') THEN {row}.duration ELSE 0 END"
+
 def get_db_path():
     """Devuelve la ruta completa a la base de datos, asegurando que el directorio de configuración exista."""
     # Obtener la ruta del directorio raíz del proyecto
@@ -32,6 +79,9 @@ def init_db():
     if conn is not None:
         try:
             cursor = conn.cursor()
+            # WAL permite que los lectores (UI, API local) consulten mientras un
+            # escaneo escribe. El modo queda guardado en el propio archivo.
+            cursor.execute("PRAGMA journal_mode=WAL")
             cursor.execute("""
                 CREATE TABLE IF NOT EXISTS tracks (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -49,13 +99,119 @@ def init_db():
                     date_added TEXT NOT NULL,
                     last_modified_date REAL,
                     last_scanned_date REAL,
-                    file_type TEXT
+                    file_type TEXT,
+                    file_size INTEGER,
+                    artwork_hash TEXT
                 );
             """)
             cursor.execute("PRAGMA table_info(tracks)")
             columns = [info[1] for info in cursor.fetchall()]
             if 'file_type' not in columns:
                 cursor.execute("ALTER TABLE tracks ADD COLUMN file_type TEXT")
+            if 'file_size' not in columns:
+                cursor.execute("ALTER TABLE tracks ADD COLUMN file_size INTEGER")
+            if 'artwork_hash' not in columns:
+                cursor.execute("ALTER TABLE tracks ADD COLUMN artwork_hash TEXT")
+
+            # Carpetas raíz de la biblioteca, vigiladas por el watcher
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS library_roots (
+                    path TEXT PRIMARY KEY,
+                    date_added TEXT NOT NULL
+                );
+            """)
+
+            # Playlists (importadas de otras aplicaciones o creadas aquí) y puntos cue
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS playlists (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    name TEXT NOT NULL,
+                    source TEXT NOT NULL DEFAULT 'local',
+                    date_added TEXT NOT NULL,
+                    UNIQUE (name, source)
+                );
+            """)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS playlist_tracks (
+                    playlist_id INTEGER NOT NULL,
+                    position INTEGER NOT NULL,
+                    track_id INTEGER NOT NULL,
+                    PRIMARY KEY (playlist_id, position)
+                );
+            """)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS cue_points (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    track_id INTEGER NOT NULL,
+                    name TEXT,
+                    type TEXT NOT NULL DEFAULT 'cue',
+                    start REAL NOT NULL,
+                    end REAL,
+                    hotcue INTEGER,
+                    source TEXT
+                );
+            """)
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_cue_points_track ON cue_points(track_id)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_playlist_tracks_track ON playlist_tracks(track_id)")
+            cursor.execute("""
+                CREATE TRIGGER IF NOT EXISTS tracks_delete_children AFTER DELETE ON tracks
+                BEGIN
+                    DELETE FROM cue_points WHERE track_id = OLD.id;
+                    DELETE FROM playlist_tracks WHERE track_id = OLD.id;
+                END;
+            """)
+
+            # Resultados del análisis de audio (forma de onda, BPM, tonalidad y vector de
+            # timbre para la búsqueda de similares). source_mtime permite saber si el
+            # archivo ha cambiado desde el análisis.
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS track_analysis (
+                    track_id INTEGER PRIMARY KEY,
+                    waveform BLOB,
+                    bpm REAL,
+                    key TEXT,
+                    source_mtime REAL,
+                    analyzed_date REAL NOT NULL,
+                    features BLOB
+                );
+            """)
+            cursor.execute("PRAGMA table_info(track_analysis)")
+            if 'features' not in [info[1] for info in cursor.fetchall()]:
+                cursor.execute("ALTER TABLE track_analysis ADD COLUMN features BLOB")
+            cursor.execute("""
+                CREATE TRIGGER IF NOT EXISTS tracks_delete_analysis AFTER DELETE ON tracks
+                BEGIN
+                    DELETE FROM track_analysis WHERE track_id = OLD.id;
+                END;
+            """)
+
+            # Caché de carpetas del escáner: mtime y subcarpetas de cada carpeta ya
+            # listada, para no volver a listar las que no han cambiado.
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS directory_cache (
+                    path TEXT PRIMARY KEY,
+                    mtime REAL NOT NULL,
+                    subdirs TEXT NOT NULL
+                ) WITHOUT ROWID;
+            """)
+
+            # Contador que cambia con cada modificación de 'tracks' (ETags de la API local)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS library_version (
+                    id INTEGER PRIMARY KEY CHECK (id = 0),
+                    version INTEGER NOT NULL
+                );
+            """)
+            cursor.execute("INSERT OR IGNORE INTO library_version(id, version) VALUES(0, 0)")
+            for event in ("INSERT", "UPDATE", "DELETE"):
+                cursor.execute(f"""
+                    CREATE TRIGGER IF NOT EXISTS tracks_version_{event.lower()} AFTER {event} ON tracks
+                    BEGIN
+                        UPDATE library_version SET version = version + 1 WHERE id = 0;
+                    END;
+                """)
+
+            _create_summary_tables(cursor)
 
             conn.commit()
             print("Tabla 'tracks' creada o ya existente.")
@@ -66,21 +222,105 @@ def init_db():
     else:
         print("Error: No se pudo crear la conexión a la base de datos.")
 
-def add_track(track_data):
+def _create_summary_tables(cursor):
+    """
+    Crea la tabla 'library_summary' y los triggers que la mantienen al día de
+    forma incremental con cada INSERT, UPDATE o DELETE sobre 'tracks'. Así las
+    estadísticas no necesitan recorrer toda la biblioteca.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS library_summary (
+            dimension TEXT NOT NULL,
+            value TEXT NOT NULL,
+            track_count INTEGER NOT NULL DEFAULT 0,
+            total_duration REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (dimension, value)
+        );
+    """)
+
+    add_rows = []
+    remove_rows = []
+    for dimension, expression in SUMMARY_DIMENSIONS.items():
+        add_rows.append(f"""
+            INSERT INTO library_summary(dimension, value, track_count, total_duration)
+            VALUES ('{dimension}', {expression.format(row="NEW")}, 1, {_SUMMARY_DURATION.format(row="NEW")})
+            ON CONFLICT(dimension, value) DO UPDATE SET
+                track_count = track_count + 1,
+                total_duration = total_duration + excluded.total_duration;""")
+        remove_rows.append(f"""
+            UPDATE library_summary SET
+                track_count = track_count - 1,
+                total_duration = total_duration - {_SUMMARY_DURATION.format(row="OLD")}
+            WHERE dimension = '{dimension}' AND value = {expression.format(row="OLD")};""")
+    cleanup = "DELETE FROM library_summary WHERE track_count <= 0;"
+
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS tracks_summary_insert AFTER INSERT ON tracks
+        BEGIN {''.join(add_rows)}
+        END;
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS tracks_summary_delete AFTER DELETE ON tracks
+        BEGIN {''.join(remove_rows)} {cleanup}
+        END;
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS tracks_summary_update
+        AFTER UPDATE OF genre, key, bpm, file_type, duration ON tracks
+        BEGIN {''.join(remove_rows)} {''.join(add_rows)} {cleanup}
+        END;
+    """)
+
+    # Primera vez (o base de datos anterior a esta tabla): rellenar desde 'tracks'
+    cursor.execute("SELECT COUNT(*) FROM library_summary")
+    if cursor.fetchone()[0] == 0:
+        _fill_summary_tables(cursor)
+
+def _fill_summary_tables(cursor):
+    """Recalcula 'library_summary' completa con una agregación por dimensión."""
+    cursor.execute("DELETE FROM library_summary")
+    for dimension, expression in SUMMARY_DIMENSIONS.items():
+        cursor.execute(f"""
+            INSERT INTO library_summary(dimension, value, track_count, total_duration)
+            SELECT '{dimension}', {expression.format(row="tracks")}, COUNT(*),
+                   TOTAL({_SUMMARY_DURATION.format(row="tracks")})
+            FROM tracks GROUP BY 2
+        """)
+
+def rebuild_summary_tables():
+    """Reconstruye desde cero la tabla resumen de estadísticas."""
+    conn = create_connection()
+    if not conn:
+        return
+
+    try:
+        cursor = conn.cursor()
+        _fill_summary_tables(cursor)
+        conn.commit()
+    except sqlite3.Error as e:
+        print(f"Error al reconstruir el resumen de la biblioteca: {e}")
+    finally:
+        conn.close()
+
+def add_track(track_data, conn=None):
     """Añade una nueva pista a la base de datos.
     
     Args:
         track_data (dict): Un diccionario con los metadatos de la pista.
                            Debe contener al menos 'file_path'.
+        conn (sqlite3.Connection): Conexión a reutilizar. Si no se indica, se
+                                   abre una y se confirma la inserción.
     """
-    conn = create_connection()
-    if not conn:
-        return
+    own_connection = conn is None
+    if own_connection:
+        conn = create_connection()
+        if not conn:
+            return
 
     # Mapeo de claves del diccionario a columnas de la base de datos
     # Se asegura de que todas las columnas existan en el diccionario, asignando None si no están.
-    sql = ''' INSERT OR IGNORE INTO tracks(file_path, title, artist, album, genre, year, duration, bpm, key, comment, date_added, last_modified_date, last_scanned_date, file_type)
-              VALUES(?,?,?,?,?,?,?,?,?,?,datetime('now'),?,?,?) '''
+    sql = ''' INSERT OR IGNORE INTO tracks(file_path, title, artist, album, genre, year, duration, bpm, key, comment, date_added, last_modified_date, last_scanned_date, file_type, file_size, artwork_hash)
+              VALUES(?,?,?,?,?,?,?,?,?,?,datetime('now'),?,?,?,?,?) '''
     
     track_values = (
         track_data.get('file_path'),
@@ -95,17 +335,21 @@ def add_track(track_data):
         track_data.get('comment'),
         track_data.get('last_modified_date'),
         track_data.get('last_scanned_date'),
-        track_data.get('file_type')
+        track_data.get('file_type'),
+        track_data.get('file_size'),
+        track_data.get('artwork_hash')
     )
 
     try:
         cursor = conn.cursor()
         cursor.execute(sql, track_values)
-        conn.commit()
+        if own_connection:
+            conn.commit()
     except sqlite3.Error as e:
         print(f"Error al añadir la pista {track_data.get('file_path')}: {e}")
     finally:
-        conn.close()
+        if own_connection:
+            conn.close()
 
 def get_all_tracks():
     """Recupera todas las pistas de la base de datos."""
@@ -125,6 +369,57 @@ def get_all_tracks():
     finally:
         conn.close()
 
+def iter_tracks(columns=None, where=None, params=(), order_by=None, batch_size=1000, conn=None):
+    """
+    Recorre las pistas directamente desde un cursor, por lotes, sin construir
+    la lista completa en memoria. Pensado para exportaciones grandes.
+
+    Args:
+        columns (list): Columnas a devolver (por defecto, todas las de TRACK_COLUMNS).
+        where (str): Condición SQL opcional (sin la palabra WHERE), con '?' para los parámetros.
+        params (tuple): Parámetros de la condición.
+        order_by (str): Columna de ordenación opcional.
+        batch_size (int): Número de filas que se leen de SQLite en cada lote.
+        conn (sqlite3.Connection): Conexión a reutilizar (p. ej. para leer dentro de
+                                   una transacción ya abierta). Si es None, se abre una.
+
+    Yields:
+        tuple: Una fila por pista, con los valores en el orden de 'columns'.
+
+    Raises:
+        ValueError: Si alguna columna no existe.
+        sqlite3.Error: Si falla la consulta. El error no se captura aquí: quien
+                       exporta necesita saber que el recorrido quedó incompleto.
+    """
+    columns = list(columns or TRACK_COLUMNS)
+    invalid = [col for col in columns + ([order_by] if order_by else []) if col not in TRACK_COLUMNS]
+    if invalid:
+        raise ValueError(f"Columnas desconocidas: {', '.join(invalid)}")
+
+    sql = f"SELECT {', '.join(columns)} FROM tracks"
+    if where:
+        sql += f" WHERE {where}"
+    if order_by:
+        sql += f" ORDER BY {order_by}"
+
+    own_connection = conn is None
+    if own_connection:
+        conn = create_connection()
+        if not conn:
+            raise sqlite3.OperationalError("No se pudo abrir la base de datos")
+
+    try:
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield from rows
+    finally:
+        if own_connection:
+            conn.close()
+
 def update_track_field(file_path, field, value):
     """
     Actualiza un campo específico para una pista en la base de datos.
@@ -156,6 +451,292 @@ def update_track_field(file_path, field, value):
     finally:
         conn.close()
 
+def track_upsert_values(track_data):
+    """Devuelve la tupla de valores para UPSERT_TRACK_SQL a partir del diccionario de la pista."""
+    return tuple(track_data.get(column) for column in _UPSERT_COLUMNS)
+
+def upsert_tracks(track_list, conn=None):
+    """
+    Inserta o actualiza varias pistas en una sola transacción.
+
+    Args:
+        track_list (list): Diccionarios con los metadatos de cada pista.
+        conn (sqlite3.Connection): Conexión a reutilizar. Si no se indica, se
+                                   abre una y se confirma la transacción al final.
+    """
+    if not track_list:
+        return
+
+    own_connection = conn is None
+    if own_connection:
+        conn = create_connection()
+        if not conn:
+            return
+
+    try:
+        cursor = conn.cursor()
+        cursor.executemany(UPSERT_TRACK_SQL, [track_upsert_values(track) for track in track_list])
+        if own_connection:
+            conn.commit()
+    except sqlite3.Error as e:
+        print(f"Error al guardar {len(track_list)} pistas: {e}")
+    finally:
+        if own_connection:
+            conn.close()
+
+def upsert_track(track_data):
+    """
+    Inserta una pista o, si ya existe una con la misma 'file_path', actualiza
+    sus metadatos conservando su id y su fecha de alta.
+
+    Args:
+        track_data (dict): Un diccionario con los metadatos de la pista.
+    """
+    upsert_tracks([track_data])
+
+def delete_tracks(file_paths):
+    """
+    Elimina de la base de datos las pistas indicadas.
+
+    Args:
+        file_paths (list): Rutas de los archivos eliminados del disco.
+    """
+    if not file_paths:
+        return
+
+    conn = create_connection()
+    if not conn:
+        return
+
+    try:
+        cursor = conn.cursor()
+        cursor.executemany("DELETE FROM tracks WHERE file_path = ?", [(path,) for path in file_paths])
+        conn.commit()
+    except sqlite3.Error as e:
+        print(f"Error al eliminar pistas: {e}")
+    finally:
+        conn.close()
+
+def move_tracks(moves):
+    """
+    Actualiza 'file_path' en el sitio para archivos renombrados o movidos,
+    de modo que la pista conserva su id y no queda una fila huérfana.
+
+    Cada movimiento se aplica en su propio SAVEPOINT: si uno falla, se deshace
+    solo ese y el resto del lote se guarda igualmente.
+
+    Args:
+        moves (list): Tuplas (ruta_antigua, ruta_nueva, es_directorio). Si es un
+                      directorio, se actualizan todas las pistas que contiene.
+    """
+    if not moves:
+        return
+
+    conn = create_connection()
+    if not conn:
+        return
+
+    try:
+        cursor = conn.cursor()
+        cursor.execute("BEGIN")
+        for old_path, new_path, is_dir in moves:
+            cursor.execute("SAVEPOINT move_track")
+            try:
+                if is_dir:
+                    # Reescribir el prefijo de sus pistas. Las filas que ya ocupaban
+                    # las rutas nuevas (archivos sobrescritos al fusionar carpetas)
+                    # se descartan para no violar la restricción UNIQUE.
+                    old_prefix = old_path.rstrip(os.sep) + os.sep
+                    new_prefix = new_path.rstrip(os.sep) + os.sep
+                    params = (new_prefix, len(old_prefix) + 1, len(old_prefix), old_prefix)
+                    cursor.execute(
+                        "DELETE FROM tracks WHERE file_path IN "
+                        "(SELECT ? || substr(file_path, ?) FROM tracks WHERE substr(file_path, 1, ?) = ?)",
+                        params
+                    )
+                    cursor.execute(
+                        "UPDATE tracks SET file_path = ? || substr(file_path, ?) WHERE substr(file_path, 1, ?) = ?",
+                        params
+                    )
+                else:
+                    cursor.execute("DELETE FROM tracks WHERE file_path = ?", (new_path,))
+                    cursor.execute("UPDATE tracks SET file_path = ? WHERE file_path = ?", (new_path, old_path))
+            except sqlite3.Error as e:
+                print(f"Error al mover {old_path} a {new_path}: {e}")
+                cursor.execute("ROLLBACK TO move_track")
+            cursor.execute("RELEASE move_track")
+        conn.commit()
+    except sqlite3.Error as e:
+        print(f"Error al actualizar rutas movidas: {e}")
+    finally:
+        conn.close()
+
+def delete_tracks_under(directory_path):
+    """Elimina todas las pistas que se encuentran dentro de un directorio borrado."""
+    prefix = directory_path.rstrip(os.sep) + os.sep
+    conn = create_connection()
+    if not conn:
+        return
+
+    try:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM tracks WHERE substr(file_path, 1, ?) = ?", (len(prefix), prefix))
+        conn.commit()
+    except sqlite3.Error as e:
+        print(f"Error al eliminar las pistas de {directory_path}: {e}")
+    finally:
+        conn.close()
+
+def get_track_paths_under(directory_path):
+    """
+    Devuelve las rutas de las pistas que se encuentran dentro de un directorio,
+    o None si no se pudieron leer (para no confundir un error con una carpeta vacía).
+    """
+    prefix = directory_path.rstrip(os.sep) + os.sep
+    conn = create_connection()
+    if not conn:
+        return None
+
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT file_path FROM tracks WHERE substr(file_path, 1, ?) = ?", (len(prefix), prefix))
+        return [row[0] for row in cursor.fetchall()]
+    except sqlite3.Error as e:
+        print(f"Error al obtener las pistas de {directory_path}: {e}")
+        return None
+    finally:
+        conn.close()
+
+def add_library_root(directory_path):
+    """Registra una carpeta raíz de la biblioteca (se ignora si ya existe)."""
+    conn = create_connection()
+    if not conn:
+        return
+
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            "INSERT OR IGNORE INTO library_roots(path, date_added) VALUES(?, datetime('now'))",
+            (os.path.abspath(directory_path),)
+        )
+        conn.commit()
+    except sqlite3.Error as e:
+        print(f"Error al registrar la carpeta {directory_path}: {e}")
+    finally:
+        conn.close()
+
+def get_known_files(file_paths, conn=None):
+    """
+    Devuelve {ruta: (mtime, tamaño)} de las rutas que ya están en la biblioteca.
+    Permite al escáner saltarse los archivos que no han cambiado.
+
+    Args:
+        file_paths (iterable): Rutas a consultar.
+        conn (sqlite3.Connection): Conexión a reutilizar (opcional).
+    """
+    file_paths = list(file_paths)
+    known = {}
+    if not file_paths:
+        return known
+    own_connection = conn is None
+    if own_connection:
+        conn = create_connection()
+        if not conn:
+            return known
+
+    try:
+        cursor = conn.cursor()
+        for start in range(0, len(file_paths), 500):
+            chunk = file_paths[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            cursor.execute(
+                f"SELECT file_path, last_modified_date, file_size FROM tracks WHERE file_path IN ({placeholders})",
+                chunk
+            )
+            for file_path, mtime, size in cursor.fetchall():
+                known[file_path] = (mtime, size)
+    except sqlite3.Error as e:
+        print(f"Error al consultar las pistas existentes: {e}")
+    finally:
+        if own_connection:
+            conn.close()
+    return known
+
+def get_library_roots():
+    """Devuelve la lista de carpetas raíz registradas en la biblioteca."""
+    conn = create_connection()
+    if not conn:
+        return []
+
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT path FROM library_roots ORDER BY path")
+        return [row[0] for row in cursor.fetchall()]
+    except sqlite3.Error as e:
+        print(f"Error al obtener las carpetas de la biblioteca: {e}")
+        return []
+    finally:
+        conn.close()
+
+def optimize_database(vacuum=False):
+    """
+    Reconstruye los índices y las estadísticas del planificador de consultas.
+    Con vacuum=True también compacta el archivo (lento en bibliotecas grandes).
+    """
+    conn = create_connection()
+    if not conn:
+        return False
+
+    try:
+        conn.execute("REINDEX")
+        conn.execute("ANALYZE")
+        conn.commit()
+        if vacuum:
+            conn.execute("VACUUM")
+        return True
+    except sqlite3.Error as e:
+        print(f"Error al optimizar la base de datos: {e}")
+        return False
+    finally:
+        conn.close()
+
+def get_track_artwork_hash(file_path):
+    """Devuelve el hash de la carátula de una pista, o None si no tiene."""
+    conn = create_connection()
+    if not conn:
+        return None
+
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT artwork_hash FROM tracks WHERE file_path = ?", (file_path,))
+        row = cursor.fetchone()
+        return row[0] if row else None
+    except sqlite3.Error as e:
+        print(f"Error al obtener la carátula de {file_path}: {e}")
+        return None
+    finally:
+        conn.close()
+
+def get_playlists():
+    """Devuelve las playlists como tuplas (id, nombre, origen, número de pistas)."""
+    conn = create_connection()
+    if not conn:
+        return []
+
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT p.id, p.name, p.source, COUNT(pt.track_id) FROM playlists p
+            LEFT JOIN playlist_tracks pt ON pt.playlist_id = p.id
+            GROUP BY p.id ORDER BY p.name
+        """)
+        return cursor.fetchall()
+    except sqlite3.Error as e:
+        print(f"Error al obtener las playlists: {e}")
+        return []
+    finally:
+        conn.close()
+
 # Para probar la inicialización directamente
 if __name__ == '__main__':
     init_db() 
\ No newline at end of file
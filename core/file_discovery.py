@@ -0,0 +1,216 @@
+"""
+Descubrimiento de archivos para el escáner de la biblioteca.
+
+Las carpetas se listan con os.scandir desde varios hilos a la vez (en
+unidades de red el coste está en la latencia de cada listado, no en la CPU) y
+los archivos encontrados se entregan por partes, según se descubren, para que
+el procesado empiece sin esperar a recorrer todo el árbol.
+
+Cada carpeta listada se guarda en la tabla directory_cache con su mtime y sus
+subcarpetas. El mtime de una carpeta cambia cuando se crea, borra o renombra
+algo dentro de ella, así que en los reescaneos las carpetas cuyo mtime
+coincide no se vuelven a listar: se baja directamente a sus subcarpetas.
+"""
+
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from core.database import create_connection
+
+DISCOVERY_WORKERS = 8
+
+# Una carpeta modificada hace menos de estos segundos no se guarda en la caché:
+# con la resolución de mtime de algunos sistemas (FAT, SMB) un cambio inmediatamente
+# posterior al listado podría no alterar el mtime.
+_RECENT_CHANGE_WINDOW = 2.0
+
+_SUBDIR_SEPARATOR = "\n"
+
+
+class DirectoryCache:
+    """
+    mtime y subcarpetas de las carpetas de una raíz. Los cambios se acumulan en
+    memoria y solo se guardan con save(), al terminar el escaneo: si este se
+    interrumpe, las carpetas se vuelven a listar la próxima vez. Tampoco se
+    guardan las carpetas con algún archivo que no se pudo procesar
+    (mark_failed), para reintentarlo en el siguiente escaneo.
+    """
+
+    def __init__(self, root, entries=None, reuse=True):
+        self.root = root
+        self.reuse = reuse  # Con False se listan todas las carpetas, pero la caché se actualiza
+        self._entries = entries or {}  # carpeta -> (mtime, [nombres de subcarpetas])
+        self._updates = {}
+        self._failed = set()
+        self._visited = set()
+        self._lock = threading.Lock()
+        self.unchanged = 0
+
+    @classmethod
+    def load(cls, root, reuse=True):
+        """Carga la caché de las carpetas que cuelgan de root."""
+        root = os.path.abspath(root)
+        entries = {}
+        conn = create_connection()
+        if not conn:
+            return cls(root, reuse=reuse)
+
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT path, mtime, subdirs FROM directory_cache WHERE path = ? OR substr(path, 1, ?) = ?",
+                (root, len(root) + 1, os.path.join(root, ""))
+            )
+            for path, mtime, subdirs in cursor:
+                entries[path] = (mtime, subdirs.split(_SUBDIR_SEPARATOR) if subdirs else [])
+        except sqlite3.Error as e:
+            print(f"Error al leer la caché de carpetas: {e}")
+        finally:
+            conn.close()
+        return cls(root, entries, reuse)
+
+    def lookup(self, path, mtime):
+        """Devuelve las subcarpetas si la carpeta no ha cambiado desde el último listado, o None."""
+        entry = self._entries.get(path)
+        with self._lock:
+            self._visited.add(path)
+            if self.reuse and entry is not None and entry[0] == mtime:
+                self.unchanged += 1
+                return entry[1]
+        return None
+
+    def update(self, path, mtime, subdirs):
+        with self._lock:
+            if time.time() - mtime >= _RECENT_CHANGE_WINDOW:
+                self._updates[path] = (mtime, subdirs)
+
+    def mark_failed(self, path):
+        """Excluye de la caché una carpeta con archivos que no se pudieron procesar."""
+        with self._lock:
+            self._failed.add(path)
+
+    def save(self):
+        """Guarda las carpetas listadas y borra las que ya no existen bajo la raíz."""
+        stale = [(path,) for path in self._entries if path not in self._visited or path in self._failed]
+        conn = create_connection()
+        if not conn:
+            return
+
+        try:
+            cursor = conn.cursor()
+            cursor.executemany(
+                "INSERT OR REPLACE INTO directory_cache(path, mtime, subdirs) VALUES(?, ?, ?)",
+                [(path, mtime, _SUBDIR_SEPARATOR.join(subdirs)) for path, (mtime, subdirs) in self._updates.items()
+                 if path not in self._failed]
+            )
+            cursor.executemany("DELETE FROM directory_cache WHERE path = ?", stale)
+            conn.commit()
+        except sqlite3.Error as e:
+            print(f"Error al guardar la caché de carpetas: {e}")
+        finally:
+            conn.close()
+
+
+def _list_directory(path, extensions, cache):
+    """
+    Lista una carpeta. Devuelve (archivos, subcarpetas), donde cada archivo es
+    (ruta, stat) reutilizando el stat de la entrada del directorio.
+    """
+    try:
+        mtime = os.stat(path).st_mtime
+    except OSError as e:
+        print(f"No se pudo acceder a {path}: {e}")
+        return [], []
+
+    if cache is not None:
+        subdirs = cache.lookup(path, mtime)
+        if subdirs is not None:
+            return [], [os.path.join(path, name) for name in subdirs]
+
+    files = []
+    subdirs = []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.name)
+                        continue
+                    name = entry.name
+                    # Se ignoran los archivos ocultos de macOS ('._*')
+                    if name.startswith("._") or os.path.splitext(name)[1].lower() not in extensions:
+                        continue
+                    if entry.is_file():
+                        files.append((entry.path, entry.stat()))
+                except OSError:
+                    continue  # La entrada desapareció durante el listado
+    except OSError as e:
+        print(f"No se pudo listar {path}: {e}")
+        return [], []
+
+    if cache is not None:
+        cache.update(path, mtime, subdirs)
+    return files, [os.path.join(path, name) for name in subdirs]
+
+
+def discover_files(root, extensions, cache=None, workers=DISCOVERY_WORKERS, max_pending=64):
+    """
+    Recorre root en paralelo y genera (ruta, stat) de los archivos con alguna de
+    las extensiones indicadas, según se van encontrando.
+
+    Args:
+        root (str): Carpeta raíz.
+        extensions (set): Extensiones en minúsculas, con punto (p. ej. {'.mp3'}).
+        cache (DirectoryCache): Caché de carpetas. Si es None, se listan todas.
+        workers (int): Hilos que listan carpetas a la vez.
+        max_pending (int): Carpetas listadas que pueden esperar a ser consumidas
+                           antes de que los hilos se detengan.
+    """
+    results = queue.Queue(maxsize=max_pending)
+    stop = threading.Event()
+    done = object()
+
+    def put(item):
+        # Espera a que haya sitio, salvo que el consumidor haya abandonado
+        while not stop.is_set():
+            try:
+                results.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def coordinator():
+        try:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="discovery") as pool:
+                pending = {pool.submit(_list_directory, os.path.abspath(root), extensions, cache)}
+                while pending and not stop.is_set():
+                    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        files, subdirs = future.result()
+                        for subdir in subdirs:
+                            pending.add(pool.submit(_list_directory, subdir, extensions, cache))
+                        if files and not put(files):
+                            break
+                for future in pending:
+                    future.cancel()
+        except Exception as e:
+            print(f"Error al recorrer {root}: {e}")
+        finally:
+            put(done)
+
+    thread = threading.Thread(target=coordinator, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = results.get()
+            if item is done:
+                break
+            yield from item
+    finally:
+        stop.set()
+        thread.join()
@@ -0,0 +1,453 @@
+"""
+Sincronización de playlists con una carpeta de destino (p. ej. un USB para CDJs).
+
+Se mantiene un manifiesto en el destino con el tamaño, mtime y hash de cada
+copia, de modo que al volver a sincronizar solo se copian los archivos nuevos
+o modificados. Las copias se hacen en paralelo con buffers grandes y,
+opcionalmente, FLAC/WAV se convierten a AIFF o MP3 con ffmpeg.
+"""
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import sqlite3
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from core.collection_exporter import export_all_playlists_m3u8
+from core.database import create_connection
+
+MANIFEST_NAME = ".djalfin_sync.json"
+CONTENTS_DIR = "Contents"
+PLAYLISTS_DIR = "Playlists"
+
+COPY_BUFFER_SIZE = 4 * 1024 * 1024
+
+# Formatos que se pueden convertir y argumentos de ffmpeg para cada destino
+TRANSCODABLE_TYPES = {".flac", ".wav"}
+TRANSCODE_FORMATS = {
+    "aiff": (".aiff", ["-c:a", "pcm_s16be", "-write_id3v2", "1"]),
+    "mp3": (".mp3", ["-c:a", "libmp3lame", "-b:a", "320k", "-id3v2_version", "3"]),
+}
+
+
+def _safe_name(name, max_length=120):
+    """Limpia un nombre para que sea válido en FAT32/exFAT."""
+    cleaned = re.sub(r'[<>:"/\\|?*\x00-\x1f]', "_", name or "").strip(" .")
+    return cleaned[:max_length] or "Unknown"
+
+
+def load_manifest(target_dir):
+    """Lee el manifiesto de sincronización del destino (vacío si no existe o está dañado)."""
+    manifest_path = os.path.join(target_dir, MANIFEST_NAME)
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f).get("files", {})
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(target_dir, files):
+    """Guarda el manifiesto de forma atómica (escribe a un temporal y lo renombra)."""
+    manifest_path = os.path.join(target_dir, MANIFEST_NAME)
+    temp_path = manifest_path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump({"version": 1, "updated": time.time(), "files": files}, f, ensure_ascii=False)
+    os.replace(temp_path, manifest_path)
+
+
+def file_hash(file_path):
+    """SHA-1 del contenido de un archivo, leído por bloques."""
+    digest = hashlib.sha1()
+    with open(file_path, "rb") as f:
+        while True:
+            chunk = f.read(COPY_BUFFER_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _copy_file(source_path, dest_path):
+    """
+    Copia un archivo con un buffer grande calculando su hash al vuelo. Escribe
+    primero a un '.part' para que un corte no deje copias a medias.
+
+    Returns:
+        str: SHA-1 del contenido copiado.
+    """
+    os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+    temp_path = dest_path + ".part"
+    digest = hashlib.sha1()
+    buffer = bytearray(COPY_BUFFER_SIZE)
+    view = memoryview(buffer)
+    try:
+        with open(source_path, "rb") as src, open(temp_path, "wb") as dst:
+            while True:
+                read = src.readinto(buffer)
+                if not read:
+                    break
+                digest.update(view[:read])
+                dst.write(view[:read])
+        _copy_times(source_path, temp_path)
+        os.replace(temp_path, dest_path)
+    except OSError:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+    return digest.hexdigest()
+
+
+def _copy_times(source_path, dest_path):
+    """
+    Copia las fechas de acceso y modificación si el sistema de archivos lo permite.
+    No se usa shutil.copystat: los permisos fallan con PermissionError en FAT/exFAT.
+    """
+    try:
+        source_stat = os.stat(source_path)
+        os.utime(dest_path, ns=(source_stat.st_atime_ns, source_stat.st_mtime_ns))
+    except OSError:
+        pass
+
+
+def _remove_empty_parents(path, stop_dir):
+    """Borra las carpetas que quedan vacías desde la de 'path' hasta stop_dir (sin incluirla)."""
+    stop_dir = os.path.abspath(stop_dir)
+    directory = os.path.dirname(os.path.abspath(path))
+    while directory != stop_dir and directory.startswith(stop_dir + os.sep):
+        try:
+            os.rmdir(directory)
+        except OSError:
+            break  # No está vacía (o no se puede borrar)
+        directory = os.path.dirname(directory)
+
+
+def _transcode_file(ffmpeg_path, source_path, dest_path, target_format):
+    """Convierte un archivo con ffmpeg conservando los metadatos."""
+    os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+    extension, codec_args = TRANSCODE_FORMATS[target_format]
+    temp_path = dest_path + ".part" + extension  # ffmpeg deduce el formato de la extensión
+    command = [ffmpeg_path, "-nostdin", "-y", "-loglevel", "error", "-i", source_path,
+               "-map", "0:a", "-map_metadata", "0", *codec_args, temp_path]
+    result = subprocess.run(command, capture_output=True, text=True)
+    if result.returncode != 0:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise RuntimeError(result.stderr.strip() or f"ffmpeg terminó con código {result.returncode}")
+    os.replace(temp_path, dest_path)
+
+
+def _load_sync_tracks(playlist_ids=None, track_ids=None):
+    """
+    Devuelve (id, ruta, artista) de las pistas a sincronizar.
+
+    Raises:
+        sqlite3.Error: Si no se puede leer la base de datos. No se devuelve una
+                       lista vacía: la sincronización la tomaría como "no hay
+                       nada que copiar" y borraría todo el destino.
+    """
+    conn = create_connection()
+    if not conn:
+        raise sqlite3.OperationalError("No se pudo abrir la base de datos")
+
+    sql = "SELECT id, file_path, artist FROM tracks"
+    params = []
+    conditions = []
+    if playlist_ids:
+        conditions.append(f"id IN (SELECT track_id FROM playlist_tracks WHERE playlist_id IN ({','.join('?' * len(playlist_ids))}))")
+        params.extend(playlist_ids)
+    if track_ids:
+        conditions.append(f"id IN ({','.join('?' * len(track_ids))})")
+        params.extend(track_ids)
+    if conditions:
+        sql += " WHERE " + " OR ".join(conditions)
+
+    try:
+        cursor = conn.cursor()
+        cursor.execute(sql + " ORDER BY id", params)
+        return cursor.fetchall()
+    finally:
+        conn.close()
+
+
+def _playlist_memberships(playlist_ids):
+    """Devuelve {ruta de origen: ids de las playlists indicadas que la contienen}."""
+    conn = create_connection()
+    if not conn:
+        raise sqlite3.OperationalError("No se pudo abrir la base de datos")
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT t.file_path, pt.playlist_id FROM playlist_tracks pt JOIN tracks t ON t.id = pt.track_id"
+            f" WHERE pt.playlist_id IN ({','.join('?' * len(playlist_ids))})",
+            list(playlist_ids),
+        )
+        memberships = {}
+        for file_path, playlist_id in cursor:
+            memberships.setdefault(file_path, set()).add(playlist_id)
+        return memberships
+    finally:
+        conn.close()
+
+
+def _playlists_with_tracks(track_ids):
+    """Ids de las playlists que contienen alguna de las pistas indicadas."""
+    conn = create_connection()
+    if not conn:
+        raise sqlite3.OperationalError("No se pudo abrir la base de datos")
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            f"SELECT DISTINCT playlist_id FROM playlist_tracks WHERE track_id IN ({','.join('?' * len(track_ids))})"
+            " ORDER BY playlist_id",
+            list(track_ids),
+        )
+        return [playlist_id for (playlist_id,) in cursor.fetchall()]
+    finally:
+        conn.close()
+
+
+def plan_sync(tracks, transcode=None):
+    """
+    Asigna a cada pista su ruta relativa en el destino (Contents/Artista/archivo).
+
+    Returns:
+        dict: ruta relativa de destino -> (ruta de origen, formato de conversión o None).
+    """
+    plan = {}
+    used_paths = set()  # En minúsculas: FAT32/exFAT no distinguen mayúsculas
+    for track_id, file_path, artist in tracks:
+        base, extension = os.path.splitext(os.path.basename(file_path))
+        target_format = transcode if transcode and extension.lower() in TRANSCODABLE_TYPES else None
+        if target_format:
+            extension = TRANSCODE_FORMATS[target_format][0]
+        artist_dir = _safe_name(artist if artist and artist != "N/A" else "Unknown Artist")
+        relative_path = os.path.join(CONTENTS_DIR, artist_dir, _safe_name(base) + extension)
+        if relative_path.lower() in used_paths:
+            # Dos archivos distintos con el mismo nombre y artista
+            relative_path = os.path.join(CONTENTS_DIR, artist_dir, f"{_safe_name(base)} ({track_id}){extension}")
+        used_paths.add(relative_path.lower())
+        plan[relative_path] = (file_path, target_format)
+    return plan
+
+
+def _is_up_to_date(entry, source_stat, dest_path, target_format, verify_hash):
+    """Indica si la copia del manifiesto corresponde al archivo de origen actual."""
+    if not entry:
+        return False
+    if (entry.get("source_size") != source_stat.st_size or
+            entry.get("source_mtime_ns") != source_stat.st_mtime_ns or
+            entry.get("transcode") != target_format):
+        return False
+    try:
+        dest_stat = os.stat(dest_path)
+    except OSError:
+        return False
+    if dest_stat.st_size != entry.get("size"):
+        return False
+    if verify_hash and entry.get("hash"):
+        return file_hash(dest_path) == entry["hash"]
+    return True
+
+
+def _merge_playlists(entry, playlists):
+    """
+    Playlists por las que se sincronizó una copia, acumuladas entre sincronizaciones.
+    None significa que la copia forma parte de una sincronización de toda la biblioteca.
+    """
+    if playlists is None or not entry:
+        return playlists
+    previous = entry.get("playlists")
+    if previous is None:
+        return None  # Entradas de versiones anteriores o de la biblioteca completa
+    return sorted(set(previous) | set(playlists))
+
+
+def _is_stale(entry, full_sync, synced_sources, synced_playlists):
+    """
+    Indica si una copia que ya no está en el plan se puede borrar. Solo se borra lo
+    que pertenece al alcance de esta sincronización: sincronizar una playlist no
+    borra las copias de otras playlists sincronizadas antes.
+    """
+    if full_sync or entry.get("source") in synced_sources:
+        return True  # Fuera de la biblioteca, o la pista se copia ahora en otra ruta
+    playlists = entry.get("playlists")
+    return bool(playlists) and set(playlists) <= synced_playlists
+
+
+def _remove_orphan_playlists(playlists_dir, written):
+    """Borra los M3U8 del destino que no se acaban de escribir (playlists eliminadas)."""
+    keep = {os.path.abspath(path) for path in written}
+    try:
+        names = os.listdir(playlists_dir)
+    except OSError:
+        return
+    for name in names:
+        path = os.path.abspath(os.path.join(playlists_dir, name))
+        if name.lower().endswith(".m3u8") and path not in keep:
+            try:
+                os.remove(path)
+            except OSError as e:
+                print(f"No se pudo borrar la playlist {name}: {e}")
+
+
+def sync_to_target(target_dir, playlist_ids=None, track_ids=None, transcode=None, workers=4,
+                   verify_hash=False, delete_stale=True, write_playlists=True, progress=None):
+    """
+    Sincroniza playlists o pistas con una carpeta de destino.
+
+    Args:
+        target_dir (str): Carpeta de destino (p. ej. la raíz de un USB montado).
+        playlist_ids (list): Playlists a sincronizar. Si no se indican ni estas ni
+                             track_ids, se sincroniza toda la biblioteca.
+        track_ids (list): Pistas sueltas a sincronizar.
+        transcode (str): None, "aiff" o "mp3". Convierte FLAC/WAV con ffmpeg.
+        workers (int): Número de copias/conversiones simultáneas.
+        verify_hash (bool): Comprobar el hash de las copias existentes (más lento).
+        delete_stale (bool): Borrar del destino las copias que ya no se sincronizan.
+                             Con playlists o pistas concretas solo se borran las
+                             copias que vinieron de esas playlists o pistas.
+        write_playlists (bool): Escribir las playlists M3U8 apuntando a las copias.
+        progress (callable): Se llama con (hechos, total, ruta) tras cada archivo.
+
+    Returns:
+        dict: Resumen con 'copied', 'transcoded', 'skipped', 'deleted', 'errors' y 'bytes'.
+    """
+    summary = {"copied": 0, "transcoded": 0, "skipped": 0, "deleted": 0, "errors": 0, "bytes": 0}
+    os.makedirs(target_dir, exist_ok=True)
+
+    ffmpeg_path = shutil.which("ffmpeg") if transcode else None
+    if transcode and transcode not in TRANSCODE_FORMATS:
+        print(f"Formato de conversión no soportado: {transcode}")
+        return summary
+    if transcode and not ffmpeg_path:
+        print("ffmpeg no está instalado: se copiarán los archivos originales sin convertir.")
+        transcode = None
+
+    full_sync = not playlist_ids and not track_ids
+    try:
+        tracks = _load_sync_tracks(playlist_ids, track_ids)
+        memberships = _playlist_memberships(playlist_ids) if playlist_ids else {}
+    except sqlite3.Error as e:
+        # Sin la lista de pistas no se toca el destino: todo parecería obsoleto
+        print(f"Error al obtener las pistas a sincronizar: {e}")
+        summary["errors"] += 1
+        return summary
+
+    plan = plan_sync(tracks, transcode)
+    manifest = load_manifest(target_dir)
+    new_manifest = {}
+
+    # Detección de cambios: solo se encolan los archivos nuevos o modificados
+    jobs = []
+    for relative_path, (source_path, target_format) in plan.items():
+        dest_path = os.path.join(target_dir, relative_path)
+        try:
+            source_stat = os.stat(source_path)
+        except OSError:
+            print(f"No se encuentra el archivo de origen: {source_path}")
+            summary["errors"] += 1
+            continue
+        entry = manifest.get(relative_path)
+        if entry and entry.get("source") != source_path:
+            entry = None  # La ruta la ocupaba otra pista
+        playlists = None if full_sync else _merge_playlists(entry, sorted(memberships.get(source_path, ())))
+        if entry and _is_up_to_date(entry, source_stat, dest_path, target_format, verify_hash):
+            new_manifest[relative_path] = dict(entry, playlists=playlists)
+            summary["skipped"] += 1
+        else:
+            jobs.append((relative_path, source_path, dest_path, target_format, source_stat, playlists))
+
+    total = len(jobs)
+    print(f"Sincronización: {total} archivos por copiar, {summary['skipped']} sin cambios.")
+
+    def run_job(job):
+        _, source_path, dest_path, target_format, _, _ = job
+        if target_format:
+            # El hash solo se calcula al copiar; las conversiones se validan por tamaño.
+            _transcode_file(ffmpeg_path, source_path, dest_path, target_format)
+            return None
+        return _copy_file(source_path, dest_path)
+
+    try:
+        # Las copias y las conversiones pasan la mayor parte del tiempo en E/S o en el
+        # proceso de ffmpeg, así que un pool de hilos basta para tenerlas en paralelo.
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(run_job, job): job for job in jobs}
+            for done, future in enumerate(as_completed(futures), start=1):
+                relative_path, source_path, dest_path, target_format, source_stat, playlists = futures[future]
+                try:
+                    digest = future.result()
+                    dest_size = os.path.getsize(dest_path)
+                    new_manifest[relative_path] = {
+                        "source": source_path,
+                        "source_size": source_stat.st_size,
+                        "source_mtime_ns": source_stat.st_mtime_ns,
+                        "transcode": target_format,
+                        "size": dest_size,
+                        "hash": digest,
+                        "playlists": playlists,
+                    }
+                    summary["transcoded" if target_format else "copied"] += 1
+                    summary["bytes"] += dest_size
+                except (OSError, RuntimeError) as e:
+                    print(f"Error al sincronizar {source_path}: {e}")
+                    summary["errors"] += 1
+                if progress:
+                    progress(done, total, source_path)
+
+        if delete_stale:
+            synced_sources = {source_path for source_path, _ in plan.values()}
+            synced_playlists = set(playlist_ids or ())
+            for relative_path in manifest.keys() - new_manifest.keys():
+                if relative_path in plan:
+                    continue  # Falló la copia: se conserva la versión anterior
+                if not _is_stale(manifest[relative_path], full_sync, synced_sources, synced_playlists):
+                    new_manifest[relative_path] = manifest[relative_path]
+                    continue
+                stale_path = os.path.join(target_dir, relative_path)
+                try:
+                    os.remove(stale_path)
+                    summary["deleted"] += 1
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    print(f"No se pudo borrar {relative_path}: {e}")
+                    continue
+                _remove_empty_parents(stale_path, os.path.join(target_dir, CONTENTS_DIR))
+        else:
+            for relative_path in manifest.keys() - new_manifest.keys():
+                new_manifest.setdefault(relative_path, manifest[relative_path])
+    finally:
+        # Se guarda aunque se interrumpa, para no repetir lo ya copiado
+        for relative_path in manifest.keys() & plan.keys():
+            if relative_path not in new_manifest and os.path.exists(os.path.join(target_dir, relative_path)):
+                new_manifest[relative_path] = manifest[relative_path]
+        save_manifest(target_dir, new_manifest)
+
+    if write_playlists:
+        source_to_dest = {source: os.path.join(target_dir, relative_path)
+                          for relative_path, (source, _) in plan.items() if relative_path in new_manifest}
+        try:
+            export_playlist_ids = playlist_ids
+            if track_ids and not playlist_ids:
+                # Solo pistas sueltas: únicamente las playlists en las que aparecen
+                export_playlist_ids = _playlists_with_tracks(track_ids)
+            playlists_dir = os.path.join(target_dir, PLAYLISTS_DIR)
+            if export_playlist_ids is None or export_playlist_ids:
+                written = export_all_playlists_m3u8(
+                    playlists_dir, export_playlist_ids, path_mapper=source_to_dest.get, relative=True
+                )
+                if full_sync and delete_stale:
+                    _remove_orphan_playlists(playlists_dir, written)
+        except (OSError, sqlite3.Error) as e:
+            print(f"Error al escribir las playlists: {e}")
+            summary["errors"] += 1
+
+    print(f"Sincronización completada: {summary}")
+    return summary
@@ -1,50 +1,170 @@
 import os
+import time
 from core.metadata_reader import read_metadata
-from core.database import add_track
+from core.database import (add_track, upsert_tracks, add_library_root, get_known_files, get_track_paths_under,
+                           delete_tracks, create_connection)
+from core.artwork_cache import attach_artwork
+from core.file_discovery import DirectoryCache, discover_files, DISCOVERY_WORKERS
 
 SUPPORTED_EXTENSIONS = ['.mp3', '.flac', '.m4a', '.wav']
+_SUPPORTED_EXTENSION_SET = frozenset(SUPPORTED_EXTENSIONS)
 
-def scan_directory(directory_path, queue=None):
+# Archivos descubiertos que se comprueban juntos contra la base de datos
+_PROCESS_BATCH_SIZE = 200
+
+def is_supported_file(file_path):
+    """Indica si la ruta corresponde a un archivo de audio compatible."""
+    file_name = os.path.basename(file_path)
+    # Ignorar archivos ocultos de macOS
+    if file_name.startswith('._'):
+        return False
+    return os.path.splitext(file_name)[1].lower() in _SUPPORTED_EXTENSION_SET
+
+def process_file(file_path, update_existing=False, stat=None, conn=None):
+    """
+    Lee los metadatos de un único archivo y lo guarda en la base de datos.
+
+    Args:
+        file_path (str): Ruta del archivo de audio.
+        update_existing (bool): Si es True, actualiza la pista si ya existía
+                                (usado por el watcher cuando un archivo cambia).
+        stat (os.stat_result): Stat ya obtenido al descubrir el archivo, para no repetirlo.
+        conn (sqlite3.Connection): Conexión a reutilizar; quien la pasa confirma
+                                   la transacción.
+
+    Returns:
+        bool: True si el archivo se procesó correctamente.
+    """
+    metadata = read_metadata(file_path, include_artwork=True)
+    if not metadata:
+        print(f"  -> No se pudieron leer los metadatos. Omitiendo.")
+        return False
+
+    # Añadimos la ruta del archivo y el tipo de archivo al diccionario de metadatos.
+    metadata['file_path'] = file_path
+    _, extension = os.path.splitext(file_path)
+    metadata['file_type'] = extension.replace('.', '').upper()
+    try:
+        stat = stat or os.stat(file_path)
+        metadata['last_modified_date'] = stat.st_mtime
+        metadata['file_size'] = stat.st_size
+    except OSError:
+        metadata['last_modified_date'] = None
+    metadata['last_scanned_date'] = time.time()
+    attach_artwork(metadata)
+
+    if update_existing:
+        upsert_tracks([metadata], conn)
+    else:
+        add_track(metadata, conn)
+    return True
+
+def _process_batch(batch, processed_count, conn=None, progress=None, checked_count=0, cache=None):
+    """
+    Procesa un lote de archivos descubiertos. Los que ya están en la biblioteca
+    con el mismo mtime y tamaño se omiten; los que han cambiado se actualizan.
+    Las carpetas de los archivos que fallan se excluyen de la caché, para que
+    el siguiente escaneo las vuelva a listar y reintente esos archivos.
+
+    Returns:
+        tuple: (archivos procesados correctamente, archivos con errores) del lote.
+    """
+    known = get_known_files((file_path for file_path, _ in batch), conn)
+    processed = 0
+    failed = 0
+    for checked, (file_path, stat) in enumerate(batch, start=checked_count + 1):
+        existing = known.get(file_path)
+        if existing != (stat.st_mtime, stat.st_size):
+            if not progress:
+                print(f"Procesando [{processed_count + processed + failed + 1}]: {os.path.basename(file_path)}")
+            if process_file(file_path, update_existing=existing is not None, stat=stat, conn=conn):
+                processed += 1
+            else:
+                failed += 1
+                if cache is not None:
+                    cache.mark_failed(os.path.dirname(file_path))
+        if progress:
+            progress(checked, None, file_path)
+    if conn:
+        conn.commit()
+    return processed, failed
+
+def scan_directory(directory_path, queue=None, full_rescan=False, workers=DISCOVERY_WORKERS, progress=None):
     """
     Escanea un directorio recursivamente en busca de archivos de audio,
     lee sus metadatos y los añade a la base de datos.
     Si se proporciona una cola (queue), se notificará al finalizar.
+
+    Los archivos se procesan según se descubren. En los reescaneos no se
+    listan las carpetas que no han cambiado, salvo con full_rescan=True.
+    Todo el escaneo usa una única conexión y confirma cada lote.
+
+    Args:
+        progress (callable): Se llama con (comprobados, total, ruta) tras cada
+                             archivo, en lugar de imprimir cada uno. El total es
+                             None hasta que termina el descubrimiento.
+
+    Returns:
+        int: Número de archivos de audio nuevos o modificados que se procesaron
+             correctamente (sin contar los que fallaron al leer sus metadatos).
     """
+    conn = None
     try:
         print(f"Iniciando escaneo en: {directory_path}")
-        
-        found_files = []
-        for root, _, files in os.walk(directory_path):
-            for file in files:
-                # Ignorar archivos ocultos de macOS
-                if file.startswith('._'):
-                    continue
-                if any(file.lower().endswith(ext) for ext in SUPPORTED_EXTENSIONS):
-                    found_files.append(os.path.join(root, file))
-
-        total_files = len(found_files)
-        print(f"Se encontraron {total_files} archivos de audio compatibles.")
-
-        for index, file_path in enumerate(found_files):
-            print(f"Procesando [{index + 1}/{total_files}]: {os.path.basename(file_path)}")
-            
-            metadata = read_metadata(file_path)
-            
-            if metadata:
-                # Añadimos la ruta del archivo y el tipo de archivo al diccionario de metadatos.
-                metadata['file_path'] = file_path
-                _, extension = os.path.splitext(file_path)
-                metadata['file_type'] = extension.replace('.', '').upper()
-                
-                add_track(metadata)
-            else:
-                print(f"  -> No se pudieron leer los metadatos. Omitiendo.")
+        add_library_root(directory_path)
+        cache = DirectoryCache.load(directory_path, reuse=not full_rescan)
+        conn = create_connection()
+        if not conn:
+            return 0
+
+        found = 0
+        processed = 0
+        failed = 0
+        batch = []
+        for file_entry in discover_files(directory_path, _SUPPORTED_EXTENSION_SET, cache, workers):
+            found += 1
+            batch.append(file_entry)
+            if len(batch) >= _PROCESS_BATCH_SIZE:
+                batch_processed, batch_failed = _process_batch(batch, processed + failed, conn, progress,
+                                                               found - len(batch), cache)
+                processed += batch_processed
+                failed += batch_failed
+                batch = []
+        if batch:
+            batch_processed, batch_failed = _process_batch(batch, processed + failed, conn, progress,
+                                                           found - len(batch), cache)
+            processed += batch_processed
+            failed += batch_failed
+        if progress:
+            progress(found, found, None)
 
-        print("Escaneo completado.")
+        # Solo al terminar: si el escaneo se interrumpe, las carpetas se vuelven a listar
+        cache.save()
+        print(f"Escaneo completado: {found} archivos encontrados, {processed} procesados, "
+              f"{failed} con errores, {cache.unchanged} carpetas sin cambios.")
+        return processed
     finally:
+        if conn:
+            conn.close()
         if queue:
             queue.put("scan_complete")
 
+def prune_missing_tracks(directory_path):
+    """
+    Elimina de la biblioteca las pistas de un directorio cuyo archivo ya no existe.
+
+    Returns:
+        int: Número de pistas eliminadas.
+    """
+    file_paths = get_track_paths_under(os.path.abspath(directory_path))
+    if file_paths is None:
+        return 0 # Sin la lista de pistas no se borra nada
+    missing = [file_path for file_path in file_paths if not os.path.exists(file_path)]
+    delete_tracks(missing)
+    if missing:
+        print(f"Eliminadas {len(missing)} pistas cuyo archivo ya no existe.")
+    return len(missing)
+
 # Para pruebas directas
 if __name__ == '__main__':
     # ATENCIÓN: Cambia esta ruta a una carpeta con música en tu sistema para probar.
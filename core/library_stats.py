@@ -0,0 +1,192 @@
+"""
+Estadísticas de la biblioteca y exportación en streaming.
+
+Las distribuciones se leen de la tabla resumen 'library_summary', que SQLite
+mantiene al día con triggers, de modo que no hace falta cargar la biblioteca
+en Python. Las exportaciones CSV/JSON leen las filas de un cursor por lotes y
+las escriben según llegan, con memoria constante.
+"""
+
+import csv
+import json
+import os
+import sqlite3
+from contextlib import contextmanager
+
+from core.database import create_connection, iter_tracks
+
+# Condiciones SQL para las pistas sin BPM o sin tonalidad. El lector de
+# metadatos guarda 'N/A' como texto cuando el tag no existe.
+MISSING_BPM_SQL = "NOT (typeof(bpm) IN ('integer', 'real') AND bpm > 0)"
+MISSING_KEY_SQL = "COALESCE(NULLIF(TRIM(key), ''), 'N/A') = 'N/A'"
+
+# Columnas que se exportan por defecto
+EXPORT_COLUMNS = [
+    "file_path", "title", "artist", "album", "genre", "year", "track_number",
+    "duration", "bpm", "key", "comment", "file_type", "date_added",
+]
+
+
+def get_library_overview():
+    """
+    Devuelve los totales de la biblioteca.
+
+    Returns:
+        dict: 'total_tracks', 'total_duration' (segundos), 'missing_bpm' y 'missing_key'.
+    """
+    overview = {"total_tracks": 0, "total_duration": 0.0, "missing_bpm": 0, "missing_key": 0}
+    conn = create_connection()
+    if not conn:
+        return overview
+
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT dimension, track_count, total_duration FROM library_summary
+            WHERE (dimension = 'all')
+               OR (dimension IN ('bpm', 'key') AND value = 'N/A')
+        """)
+        for dimension, track_count, total_duration in cursor.fetchall():
+            if dimension == "all":
+                overview["total_tracks"] = track_count
+                overview["total_duration"] = total_duration
+            elif dimension == "bpm":
+                overview["missing_bpm"] = track_count
+            elif dimension == "key":
+                overview["missing_key"] = track_count
+    except sqlite3.Error as e:
+        print(f"Error al obtener el resumen de la biblioteca: {e}")
+    finally:
+        conn.close()
+    return overview
+
+
+def get_distribution(dimension, limit=None):
+    """
+    Devuelve la distribución de pistas por una dimensión.
+
+    Args:
+        dimension (str): 'genre', 'key', 'bpm' (tramos de 5 BPM) o 'file_type'.
+        limit (int): Número máximo de filas (las más numerosas primero).
+
+    Returns:
+        list: Tuplas (valor, número de pistas, duración total en segundos).
+              Para 'bpm' se ordenan por tempo y el valor es el inicio del tramo.
+    """
+    if dimension not in ("genre", "key", "bpm", "file_type"):
+        print(f"Error: Dimensión desconocida '{dimension}'.")
+        return []
+
+    if dimension == "bpm":
+        order = "CASE WHEN value = 'N/A' THEN 1 ELSE 0 END, CAST(value AS INTEGER)"
+    else:
+        order = "track_count DESC, value"
+    sql = f"""
+        SELECT value, track_count, total_duration FROM library_summary
+        WHERE dimension = ? ORDER BY {order}
+    """
+    params = [dimension]
+    if limit:
+        sql += " LIMIT ?"
+        params.append(limit)
+
+    conn = create_connection()
+    if not conn:
+        return []
+
+    try:
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+    except sqlite3.Error as e:
+        print(f"Error al obtener la distribución por {dimension}: {e}")
+        return []
+    finally:
+        conn.close()
+
+
+def iter_tracks_missing(field, columns=None):
+    """
+    Recorre (en streaming) las pistas a las que les falta 'bpm' o 'key'.
+
+    Yields:
+        tuple: Una fila por pista con las columnas pedidas (por defecto id, ruta, artista y título).
+    """
+    conditions = {"bpm": MISSING_BPM_SQL, "key": MISSING_KEY_SQL}
+    if field not in conditions:
+        print(f"Error: Campo '{field}' no soportado.")
+        return iter(())
+    columns = columns or ["id", "file_path", "artist", "title"]
+    return iter_tracks(columns, where=conditions[field], order_by="file_path")
+
+
+@contextmanager
+def _open_for_export(output_path, **kwargs):
+    """
+    Abre un temporal junto a output_path y lo renombra al terminar. Si la
+    exportación falla, se borra el temporal y el archivo anterior queda intacto.
+    """
+    temp_path = output_path + ".tmp"
+    try:
+        with open(temp_path, "w", encoding="utf-8", **kwargs) as f:
+            yield f
+        os.replace(temp_path, output_path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+def export_tracks_csv(output_path, columns=None, where=None, params=()):
+    """
+    Exporta las pistas a CSV leyendo del cursor por lotes (memoria constante).
+
+    Returns:
+        int: Número de pistas exportadas.
+    """
+    columns = columns or EXPORT_COLUMNS
+    count = 0
+    with _open_for_export(output_path, newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for row in iter_tracks(columns, where=where, params=params, order_by="id"):
+            writer.writerow(row)
+            count += 1
+    print(f"Exportadas {count} pistas a {output_path}")
+    return count
+
+
+def export_tracks_json(output_path, columns=None, where=None, params=()):
+    """
+    Exporta las pistas a un array JSON escribiendo cada objeto según se lee
+    del cursor, sin construir la lista completa en memoria.
+
+    Returns:
+        int: Número de pistas exportadas.
+    """
+    columns = columns or EXPORT_COLUMNS
+    count = 0
+    with _open_for_export(output_path) as f:
+        f.write("[")
+        for row in iter_tracks(columns, where=where, params=params, order_by="id"):
+            f.write(",\n" if count else "\n")
+            f.write(json.dumps(dict(zip(columns, row)), ensure_ascii=False))
+            count += 1
+        f.write("\n]\n")
+    print(f"Exportadas {count} pistas a {output_path}")
+    return count
+
+
+def export_stats_json(output_path):
+    """Exporta el resumen y todas las distribuciones de la biblioteca a JSON."""
+    stats = {"overview": get_library_overview()}
+    for dimension in ("genre", "key", "bpm", "file_type"):
+        stats[dimension] = [
+            {"value": value, "tracks": track_count, "duration": total_duration}
+            for value, track_count, total_duration in get_distribution(dimension)
+        ]
+    with _open_for_export(output_path) as f:
+        json.dump(stats, f, ensure_ascii=False, indent=2)
+    return stats
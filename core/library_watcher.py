@@ -0,0 +1,423 @@
+"""
+Vigilancia de las carpetas de la biblioteca para mantenerla sincronizada en vivo.
+
+Usa inotify cuando está disponible (Linux) y, en otro caso, un sondeo periódico
+sobre un índice de `stat` de los archivos. Los eventos se agrupan (debounce) y
+se aplican por lotes sobre el escáner y la base de datos, de forma que solo se
+procesan los archivos afectados.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import threading
+import time
+from collections import namedtuple
+from queue import Queue
+
+from core.database import delete_tracks, delete_tracks_under, move_tracks
+from core.library_scanner import is_supported_file, process_file, scan_directory, prune_missing_tracks
+
+# kind: "created", "modified", "deleted", "moved", "moved_away" (movido a un
+# destino desconocido) o "rescan".
+FileEvent = namedtuple("FileEvent", ["kind", "path", "dest_path", "is_dir"])
+
+# Constantes de <sys/inotify.h>
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+WATCH_MASK = (IN_CLOSE_WRITE | IN_ATTRIB | IN_MOVED_FROM | IN_MOVED_TO |
+              IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+
+_EVENT_HEADER = struct.Struct("iIII")
+
+# Segundos que se espera la pareja IN_MOVED_TO de un IN_MOVED_FROM. Las dos mitades
+# de un movimiento pueden llegar en lecturas distintas del descriptor.
+MOVE_PAIR_WINDOW = 0.5
+
+
+class InotifyBackend:
+    """Fuente de eventos basada en inotify (solo Linux)."""
+
+    def __init__(self):
+        libc_name = ctypes.util.find_library("c") or "libc.so.6"
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 falló")
+        self._wd_to_path = {}
+        self._path_to_wd = {}
+        self._moved_from = {}  # cookie -> (ruta, es_directorio, instante)
+
+    @staticmethod
+    def is_available():
+        """Indica si el sistema ofrece inotify."""
+        if not hasattr(os, "O_CLOEXEC"):
+            return False
+        libc_name = ctypes.util.find_library("c") or "libc.so.6"
+        try:
+            libc = ctypes.CDLL(libc_name)
+            return hasattr(libc, "inotify_init1")
+        except OSError:
+            return False
+
+    def add_root(self, root_path):
+        """Añade un watch sobre la carpeta y todas sus subcarpetas."""
+        self._watch_tree(root_path)
+
+    def _watch_tree(self, directory_path, emit_files=False):
+        """
+        Registra watches de forma recursiva. Si emit_files es True, devuelve
+        eventos "created" para los archivos ya presentes (carpetas recién creadas
+        o movidas desde fuera de la biblioteca).
+        """
+        events = []
+        for root, dirs, files in os.walk(directory_path):
+            self._add_watch(root)
+            if emit_files:
+                for file in files:
+                    file_path = os.path.join(root, file)
+                    if is_supported_file(file_path):
+                        events.append(FileEvent("created", file_path, None, False))
+        return events
+
+    def _add_watch(self, directory_path):
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory_path), WATCH_MASK)
+        if wd < 0:
+            print(f"No se pudo vigilar {directory_path}: {os.strerror(ctypes.get_errno())}")
+            return
+        self._wd_to_path[wd] = directory_path
+        self._path_to_wd[directory_path] = wd
+
+    def _rename_watches(self, old_path, new_path):
+        """Actualiza las rutas de los watches tras mover una carpeta vigilada."""
+        old_prefix = old_path + os.sep
+        for wd, path in list(self._wd_to_path.items()):
+            if path == old_path or path.startswith(old_prefix):
+                updated = new_path + path[len(old_path):]
+                self._wd_to_path[wd] = updated
+                self._path_to_wd.pop(path, None)
+                self._path_to_wd[updated] = wd
+
+    def _forget_watches(self, directory_path):
+        prefix = directory_path + os.sep
+        for path in list(self._path_to_wd):
+            if path == directory_path or path.startswith(prefix):
+                wd = self._path_to_wd.pop(path)
+                self._wd_to_path.pop(wd, None)
+
+    def read_events(self, timeout):
+        """Espera hasta 'timeout' segundos y devuelve los eventos recibidos."""
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        buffer = b""
+        if readable:
+            try:
+                buffer = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                pass
+        return self._parse_events(buffer, time.monotonic())
+
+    def _parse_events(self, buffer, now):
+        """Convierte un bloque de eventos inotify en FileEvent."""
+        events = []
+        offset = 0
+        while offset < len(buffer):
+            wd, mask, cookie, length = _EVENT_HEADER.unpack_from(buffer, offset)
+            offset += _EVENT_HEADER.size
+            name = os.fsdecode(buffer[offset:offset + length].rstrip(b"\0"))
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                events.append(FileEvent("rescan", None, None, True))
+                continue
+            if mask & IN_IGNORED:
+                directory_path = self._wd_to_path.pop(wd, None)
+                if directory_path:
+                    self._path_to_wd.pop(directory_path, None)
+                continue
+
+            directory_path = self._wd_to_path.get(wd)
+            if directory_path is None or not name:
+                continue
+            path = os.path.join(directory_path, name)
+            is_dir = bool(mask & IN_ISDIR)
+
+            if mask & IN_MOVED_FROM:
+                self._moved_from[cookie] = (path, is_dir, now)
+            elif mask & IN_MOVED_TO:
+                source = self._moved_from.pop(cookie, None)
+                if source:
+                    if is_dir:
+                        self._rename_watches(source[0], path)
+                    events.append(FileEvent("moved", source[0], path, is_dir))
+                elif is_dir:
+                    # Carpeta traída desde fuera de la biblioteca
+                    events.extend(self._watch_tree(path, emit_files=True))
+                else:
+                    events.append(FileEvent("created", path, None, False))
+            elif mask & IN_CREATE:
+                # Los archivos se procesan al cerrarse tras la escritura (IN_CLOSE_WRITE),
+                # así no se leen a medio copiar. Las carpetas nuevas se vigilan ya.
+                if is_dir:
+                    events.extend(self._watch_tree(path, emit_files=True))
+            elif mask & (IN_CLOSE_WRITE | IN_ATTRIB):
+                if not is_dir:
+                    events.append(FileEvent("modified", path, None, False))
+            elif mask & IN_DELETE:
+                if is_dir:
+                    self._forget_watches(path)
+                events.append(FileEvent("deleted", path, None, is_dir))
+
+        # Los IN_MOVED_FROM que siguen sin pareja pasado el plazo son archivos sacados
+        # de la biblioteca, o movidos a una carpeta aún sin vigilar (recién creada):
+        # el watcher los empareja con los "created" de esa carpeta por nombre.
+        for cookie, (path, is_dir, received) in list(self._moved_from.items()):
+            if now - received >= MOVE_PAIR_WINDOW:
+                del self._moved_from[cookie]
+                if is_dir:
+                    self._forget_watches(path)
+                events.append(FileEvent("moved_away", path, None, is_dir))
+        return events
+
+    def close(self):
+        os.close(self._fd)
+
+
+class PollingBackend:
+    """Fuente de eventos por sondeo: compara un índice de stat entre pasadas."""
+
+    def __init__(self, poll_interval=5.0):
+        self.poll_interval = poll_interval
+        self._roots = []
+        self._index = {}  # ruta -> (mtime_ns, tamaño, (dispositivo, inodo))
+        self._next_poll = 0
+
+    def add_root(self, root_path):
+        self._roots.append(root_path)
+        self._index.update(self._build_index(root_path))
+
+    def _build_index(self, root_path):
+        index = {}
+        pending = [root_path]
+        while pending:
+            directory_path = pending.pop()
+            try:
+                with os.scandir(directory_path) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            pending.append(entry.path)
+                        elif is_supported_file(entry.path):
+                            stat = entry.stat()
+                            index[entry.path] = (stat.st_mtime_ns, stat.st_size, (stat.st_dev, stat.st_ino))
+            except OSError:
+                continue
+        return index
+
+    def read_events(self, timeout):
+        """Espera hasta la próxima pasada (como mucho 'timeout') y devuelve las diferencias."""
+        wait = self._next_poll - time.monotonic()
+        if wait > 0:
+            time.sleep(min(wait, timeout))
+            if time.monotonic() < self._next_poll:
+                return []
+        self._next_poll = time.monotonic() + self.poll_interval
+
+        new_index = {}
+        for root_path in self._roots:
+            new_index.update(self._build_index(root_path))
+
+        removed = {path: self._index[path] for path in self._index.keys() - new_index.keys()}
+        added = new_index.keys() - self._index.keys()
+        removed_by_inode = {info[2]: path for path, info in removed.items()}
+
+        events = []
+        for path in added:
+            old_path = removed_by_inode.pop(new_index[path][2], None)
+            if old_path:
+                removed.pop(old_path)
+                events.append(FileEvent("moved", old_path, path, False))
+            else:
+                events.append(FileEvent("created", path, None, False))
+        for path in removed:
+            events.append(FileEvent("deleted", path, None, False))
+        for path in new_index.keys() & self._index.keys():
+            if new_index[path][:2] != self._index[path][:2]:
+                events.append(FileEvent("modified", path, None, False))
+
+        self._index = new_index
+        return events
+
+    def close(self):
+        self._index.clear()
+
+
+class LibraryWatcher:
+    """
+    Vigila las carpetas raíz de la biblioteca en un hilo propio y aplica los
+    cambios por lotes. Si se proporciona una cola (queue), envía
+    "library_changed" cada vez que un lote modifica la base de datos.
+    """
+
+    def __init__(self, roots=None, queue=None, debounce=1.0, max_batch_delay=10.0, poll_interval=5.0):
+        self.queue = queue
+        self.debounce = debounce
+        self.max_batch_delay = max_batch_delay
+        self.poll_interval = poll_interval
+        self._roots = []
+        self._new_roots = Queue()
+        self._stop_event = threading.Event()
+        self._thread = None
+        for root_path in roots or []:
+            self.add_root(root_path)
+
+    def add_root(self, root_path):
+        """Añade una carpeta a vigilar (se puede llamar con el watcher en marcha)."""
+        root_path = os.path.abspath(root_path)
+        if root_path in self._roots:
+            return
+        self._roots.append(root_path)
+        self._new_roots.put(root_path)
+
+    def start(self):
+        """Arranca el hilo de vigilancia."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Detiene el hilo de vigilancia y espera a que termine."""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join()
+
+    def _create_backend(self):
+        if InotifyBackend.is_available():
+            try:
+                print("Watcher de biblioteca: usando inotify.")
+                return InotifyBackend()
+            except OSError as e:
+                print(f"inotify no disponible ({e}), usando sondeo.")
+        print("Watcher de biblioteca: usando sondeo periódico.")
+        return PollingBackend(self.poll_interval)
+
+    def _run(self):
+        backend = self._create_backend()
+        pending = []
+        first_event_time = last_event_time = None
+        try:
+            while not self._stop_event.is_set():
+                while not self._new_roots.empty():
+                    root_path = self._new_roots.get()
+                    if os.path.isdir(root_path):
+                        backend.add_root(root_path)
+
+                events = backend.read_events(timeout=min(self.debounce, 0.5))
+                now = time.monotonic()
+                if events:
+                    pending.extend(events)
+                    last_event_time = now
+                    if first_event_time is None:
+                        first_event_time = now
+
+                if pending and (now - last_event_time >= self.debounce or
+                                now - first_event_time >= self.max_batch_delay):
+                    self._apply_batch(pending)
+                    pending = []
+                    first_event_time = last_event_time = None
+        finally:
+            backend.close()
+
+    @staticmethod
+    def _pair_moves_away(events):
+        """
+        Convierte en movimientos los archivos sacados de una carpeta ("moved_away")
+        que reaparecen con el mismo nombre como "created" en el mismo lote: ocurre
+        al mover archivos a una carpeta recién creada, antes de que se vigile.
+        """
+        created_by_name = {}
+        for event in events:
+            if event.kind == "created":
+                created_by_name.setdefault(os.path.basename(event.path), []).append(event)
+
+        paired = set()  # ids de los "created" ya emparejados
+        result = []
+        for event in events:
+            if event.kind == "moved_away" and not event.is_dir:
+                candidates = [e for e in created_by_name.get(os.path.basename(event.path), []) if id(e) not in paired]
+                if candidates:
+                    paired.add(id(candidates[0]))
+                    result.append(FileEvent("moved", event.path, candidates[0].path, False))
+                    continue
+            result.append(event)
+        return [event for event in result if event.kind != "created" or id(event) not in paired]
+
+    def _apply_batch(self, events):
+        """Reduce una ráfaga de eventos a operaciones mínimas y las aplica."""
+        changed = {}  # ruta -> None (dict para mantener el orden de llegada)
+        deleted_files = set()
+        deleted_dirs = set()
+        moves = []
+        rescan = False
+
+        events = self._pair_moves_away(events)
+        for event in events:
+            if event.kind == "rescan":
+                rescan = True
+            elif event.kind in ("created", "modified"):
+                changed[event.path] = None
+                deleted_files.discard(event.path)
+            elif event.kind in ("deleted", "moved_away"):
+                changed.pop(event.path, None)
+                if event.is_dir:
+                    deleted_dirs.add(event.path)
+                else:
+                    deleted_files.add(event.path)
+            elif event.kind == "moved":
+                deleted_files.discard(event.dest_path)
+                if event.path in changed:
+                    # Creado y movido dentro del mismo lote: basta con procesar el destino
+                    changed.pop(event.path)
+                    changed[event.dest_path] = None
+                else:
+                    moves.append((event.path, event.dest_path, event.is_dir))
+                    if not event.is_dir:
+                        if not is_supported_file(event.dest_path):
+                            deleted_files.add(event.dest_path)
+                        elif not is_supported_file(event.path):
+                            # p. ej. una descarga "cancion.mp3.part" renombrada al terminar
+                            changed[event.dest_path] = None
+
+        print(f"Watcher: {len(changed)} cambiados, {len(moves)} movidos, "
+              f"{len(deleted_files) + len(deleted_dirs)} eliminados.")
+
+        move_tracks(moves)
+        delete_tracks(sorted(deleted_files))
+        for directory_path in deleted_dirs:
+            delete_tracks_under(directory_path)
+        for file_path in changed:
+            if os.path.isfile(file_path) and is_supported_file(file_path):
+                process_file(file_path, update_existing=True)
+
+        if rescan:
+            # Se desbordó la cola del kernel: no sabemos qué se perdió, así que se
+            # listan todas las carpetas y se quitan las pistas cuyo archivo ya no existe.
+            for root_path in self._roots:
+                scan_directory(root_path, full_rescan=True)
+                prune_missing_tracks(root_path)
+
+        if self.queue:
+            self.queue.put("library_changed")
@@ -3,10 +3,18 @@ from mutagen.flac import FLAC
 from mutagen.wave import WAVE
 from mutagen.mp4 import MP4
 import os
+from core.artwork_cache import extract_artwork
 
-def read_metadata(file_path):
+def read_metadata(file_path, include_artwork=False):
     """
     Lee los metadatos de un archivo de audio (MP3, FLAC, WAV, M4A).
+
+    Args:
+        file_path (str): Ruta del archivo.
+        include_artwork (bool): Añadir en 'artwork' los bytes de la carátula
+                                incrustada. Solo lo piden quienes la guardan en
+                                la caché de miniaturas; las imágenes pueden pesar
+                                varios MB.
     """
     try:
         _, extension = os.path.splitext(file_path)
@@ -96,6 +104,10 @@ def read_metadata(file_path):
             elif value is not None and not isinstance(value, (str, int, float)):
                  metadata[key] = str(value)
 
+        # Carátula incrustada (bytes sin procesar); el escáner la guarda en la caché.
+        if audio and include_artwork:
+            metadata["artwork"] = extract_artwork(audio)
+
         return metadata
 
     except Exception as e:
@@ -0,0 +1,682 @@
+"""
+Lógica de playlists: sugerencias armónicas de "qué pinchar después" y
+ordenación automática de sets.
+
+Las pistas se agrupan en un índice en memoria por tonalidad Camelot y, dentro
+de cada tonalidad, en arrays de BPM ordenados. Una consulta solo recorre las
+tonalidades compatibles y, en cada una, el rango de BPM que cae dentro de la
+ventana (búsqueda binaria), por lo que responde en milisegundos incluso con
+bibliotecas de 100k pistas.
+
+La ordenación de sets se trata como un problema de camino mínimo sobre una
+matriz de costes de transición calculada de forma vectorizada con NumPy.
+"""
+
+import heapq
+import re
+import sqlite3
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+
+import numpy as np
+
+from core.database import create_connection
+
+# Clases de altura (pitch class) de cada nota, con sus enarmónicos habituales.
+NOTE_PITCH_CLASSES = {
+    "C": 0, "B#": 0, "C#": 1, "DB": 1, "D": 2, "D#": 3, "EB": 3, "E": 4, "FB": 4,
+    "F": 5, "E#": 5, "F#": 6, "GB": 6, "G": 7, "G#": 8, "AB": 8, "A": 9,
+    "A#": 10, "BB": 10, "B": 11, "CB": 11,
+}
+
+# Nombre preferido por los DJs para cada clase de altura.
+PITCH_CLASS_NAMES = ["C", "Db", "D", "Eb", "E", "F", "F#", "G", "Ab", "A", "Bb", "B"]
+
+# Relaciones armónicas aceptadas: (desplazamiento en la rueda, cambia de letra) -> peso.
+KEY_COMPATIBILITY = {
+    (0, False): 1.0,    # Misma tonalidad
+    (1, False): 0.9,    # Una quinta arriba
+    (-1, False): 0.9,   # Una quinta abajo
+    (0, True): 0.85,    # Relativa mayor/menor
+    (2, False): 0.6,    # "Energy boost" (+2)
+}
+
+# Penalización por mezclar a mitad o al doble de tempo.
+HALF_DOUBLE_PENALTY = 0.1
+
+_CAMELOT_RE = re.compile(r"^0?([1-9]|1[0-2])\s*([AB])$")
+_OPEN_KEY_RE = re.compile(r"^0?([1-9]|1[0-2])\s*([MD])$")
+_KEY_NAME_RE = re.compile(r"^([A-G])\s*([#B♯♭]?)\s*(M|MIN|MINOR|MAJ|MAJOR|MAY|MENOR|MAYOR)?$")
+
+
+def parse_camelot(key_text):
+    """
+    Convierte una tonalidad a notación Camelot.
+
+    Acepta Camelot ("8A"), Open Key ("1m") y notación musical ("Am",
+    "A minor", "C#m", "Dbmaj").
+
+    Returns:
+        tuple: (número 1-12, letra 'A' o 'B'), o None si no se reconoce.
+    """
+    if not key_text:
+        return None
+    text = str(key_text).strip().upper()
+    if not text or text == "N/A":
+        return None
+
+    match = _CAMELOT_RE.match(text)
+    if match:
+        return int(match.group(1)), match.group(2)
+
+    match = _OPEN_KEY_RE.match(text)
+    if match:
+        number = (int(match.group(1)) + 6) % 12 + 1
+        return number, "A" if match.group(2) == "M" else "B"
+
+    match = _KEY_NAME_RE.match(text.replace("-", " ").replace("  ", " "))
+    if match:
+        note, accidental, mode = match.groups()
+        accidental = accidental.replace("♯", "#").replace("♭", "B")
+        pitch_class = NOTE_PITCH_CLASSES.get(note + accidental)
+        if pitch_class is None:
+            return None
+        is_minor = mode in ("M", "MIN", "MINOR", "MENOR")
+        return pitch_class_to_camelot(pitch_class, is_minor)
+    return None
+
+
+def pitch_class_to_camelot(pitch_class, is_minor):
+    """Convierte una clase de altura (0 = Do) y modo a (número, letra) Camelot."""
+    offset = 5 if is_minor else 8
+    number = (pitch_class * 7 + offset) % 12 or 12
+    return number, "A" if is_minor else "B"
+
+
+def camelot_to_key_name(camelot):
+    """Convierte (número, letra) Camelot a notación musical, p. ej. (8, 'A') -> 'Am'."""
+    number, letter = camelot
+    is_minor = letter == "A"
+    offset = 5 if is_minor else 8
+    # Inverso de pitch_class_to_camelot: 7 es su propio inverso módulo 12.
+    pitch_class = ((number - offset) * 7) % 12
+    return PITCH_CLASS_NAMES[pitch_class] + ("m" if is_minor else "")
+
+
+def format_camelot(camelot):
+    """Devuelve la cadena Camelot, p. ej. (8, 'A') -> '8A'."""
+    return f"{camelot[0]}{camelot[1]}"
+
+
+def parse_bpm(value):
+    """Convierte el valor de BPM guardado (número o texto como '128', 'N/A') a float."""
+    if value is None:
+        return None
+    try:
+        bpm = float(str(value).strip().replace(",", "."))
+    except ValueError:
+        return None
+    return bpm if bpm > 0 else None
+
+
+def compatible_keys(camelot):
+    """Devuelve las tonalidades compatibles con la dada y el peso de cada una."""
+    number, letter = camelot
+    other_letter = "B" if letter == "A" else "A"
+    result = {}
+    for (shift, switch_letter), weight in KEY_COMPATIBILITY.items():
+        target = ((number - 1 + shift) % 12 + 1, other_letter if switch_letter else letter)
+        result[target] = max(weight, result.get(target, 0))
+    return result
+
+
+class CompatibilityIndex:
+    """
+    Índice en memoria de pistas por tonalidad Camelot y BPM.
+
+    Cada tonalidad guarda un array de BPM ordenado y, en paralelo, la lista de
+    ids de pista. Las actualizaciones son incrementales (inserción ordenada),
+    así que no hace falta reconstruirlo cuando cambia una pista.
+    """
+
+    def __init__(self):
+        self._buckets = {}  # (número, letra) -> (array de BPM, lista de ids)
+        self._tracks = {}   # id -> ((número, letra), bpm)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_database(cls):
+        """Construye el índice a partir de la tabla 'tracks'."""
+        index = cls()
+        conn = create_connection()
+        if not conn:
+            return index
+
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT id, key, bpm FROM tracks")
+            rows = []
+            for track_id, key, bpm in cursor:
+                camelot = parse_camelot(key)
+                bpm = parse_bpm(bpm)
+                if camelot and bpm:
+                    rows.append((camelot, bpm, track_id))
+        except sqlite3.Error as e:
+            print(f"Error al construir el índice de compatibilidad: {e}")
+            return index
+        finally:
+            conn.close()
+
+        # Construcción en bloque: ordenar una vez es mucho más rápido que insertar una a una.
+        rows.sort()
+        for camelot, bpm, track_id in rows:
+            bpms, ids = index._buckets.setdefault(camelot, (array("d"), []))
+            bpms.append(bpm)
+            ids.append(track_id)
+            index._tracks[track_id] = (camelot, bpm)
+        return index
+
+    @classmethod
+    def from_store(cls, store):
+        """
+        Construye el índice a partir de un TrackStore ya cargado (sin volver a
+        leer la base de datos). Cada tonalidad distinta se interpreta una sola vez.
+        """
+        index = cls()
+        codes, values = store.categories("key")
+        camelots = [parse_camelot(value) for value in values]
+        bpms = store.column("bpm")
+        rows = sorted(
+            (camelots[code], float(bpm), int(track_id))
+            for track_id, code, bpm in zip(store.ids, codes, bpms)
+            if camelots[code] and bpm > 0
+        )
+        for camelot, bpm, track_id in rows:
+            bucket_bpms, ids = index._buckets.setdefault(camelot, (array("d"), []))
+            bucket_bpms.append(bpm)
+            ids.append(track_id)
+            index._tracks[track_id] = (camelot, bpm)
+        return index
+
+    def __len__(self):
+        return len(self._tracks)
+
+    def __contains__(self, track_id):
+        return track_id in self._tracks
+
+    def add_or_update_track(self, track_id, key, bpm):
+        """Añade o actualiza una pista. Si no tiene tonalidad o BPM válidos, se retira del índice."""
+        camelot = parse_camelot(key)
+        bpm = parse_bpm(bpm)
+        with self._lock:
+            self._remove(track_id)
+            if not camelot or not bpm:
+                return
+            bpms, ids = self._buckets.setdefault(camelot, (array("d"), []))
+            position = bisect_right(bpms, bpm)
+            bpms.insert(position, bpm)
+            ids.insert(position, track_id)
+            self._tracks[track_id] = (camelot, bpm)
+
+    def remove_track(self, track_id):
+        """Retira una pista del índice."""
+        with self._lock:
+            self._remove(track_id)
+
+    def _remove(self, track_id):
+        entry = self._tracks.pop(track_id, None)
+        if entry is None:
+            return
+        camelot, bpm = entry
+        bpms, ids = self._buckets[camelot]
+        position = bisect_left(bpms, bpm)
+        while position < len(ids) and ids[position] != track_id:
+            position += 1
+        if position < len(ids):
+            del bpms[position]
+            del ids[position]
+
+    @staticmethod
+    def _nearest_positions(bpms, target_bpm, start, end, count, ids, excluded):
+        """Genera las posiciones de [start, end) más cercanas a target_bpm, de la más cercana a la más lejana."""
+        right = bisect_left(bpms, target_bpm, start, end)
+        left = right - 1
+        found = 0
+        while found < count and (left >= start or right < end):
+            if right >= end or (left >= start and target_bpm - bpms[left] <= bpms[right] - target_bpm):
+                position = left
+                left -= 1
+            else:
+                position = right
+                right += 1
+            if ids[position] in excluded:
+                continue
+            found += 1
+            yield position
+
+    def update_from_database(self, track_ids):
+        """Vuelve a leer de la base de datos las pistas indicadas (p. ej. tras un escaneo)."""
+        track_ids = list(track_ids)
+        if not track_ids:
+            return
+        conn = create_connection()
+        if not conn:
+            return
+
+        try:
+            cursor = conn.cursor()
+            found = set()
+            for start in range(0, len(track_ids), 500):
+                chunk = track_ids[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                cursor.execute(f"SELECT id, key, bpm FROM tracks WHERE id IN ({placeholders})", chunk)
+                for track_id, key, bpm in cursor.fetchall():
+                    found.add(track_id)
+                    self.add_or_update_track(track_id, key, bpm)
+            # Las que ya no existen en la base de datos se retiran
+            for track_id in set(track_ids) - found:
+                self.remove_track(track_id)
+        except sqlite3.Error as e:
+            print(f"Error al actualizar el índice de compatibilidad: {e}")
+        finally:
+            conn.close()
+
+    def recommend(self, track_id=None, key=None, bpm=None, limit=20,
+                  bpm_tolerance=0.06, allow_half_double=True, exclude=()):
+        """
+        Devuelve las pistas que mejor mezclan con la actual.
+
+        Args:
+            track_id (int): Pista que está sonando. Si se indica, se usan su tonalidad y BPM.
+            key (str): Tonalidad a usar si no se da track_id (cualquier notación).
+            bpm (float): BPM a usar si no se da track_id.
+            limit (int): Número máximo de sugerencias.
+            bpm_tolerance (float): Ventana de BPM relativa (0.06 = ±6%). Con 0 solo se
+                                   sugieren pistas con el mismo BPM exacto.
+            allow_half_double (bool): Considerar también pistas a mitad o al doble de tempo.
+            exclude (iterable): Ids a omitir (p. ej. las ya pinchadas en la sesión).
+
+        Returns:
+            list: Diccionarios {'id', 'key', 'bpm', 'score', 'tempo_ratio'} ordenados
+                  de mejor a peor.
+        """
+        if track_id is not None:
+            entry = self._tracks.get(track_id)
+            if entry is None:
+                return []
+            camelot, bpm = entry
+        else:
+            camelot, bpm = parse_camelot(key), parse_bpm(bpm)
+            if not camelot or not bpm:
+                return []
+
+        excluded = set(exclude)
+        if track_id is not None:
+            excluded.add(track_id)
+
+        tempo_ratios = (1.0, 0.5, 2.0) if allow_half_double else (1.0,)
+        best = {}  # id -> (score, tonalidad, bpm, tempo_ratio)
+
+        with self._lock:
+            for target_key, key_weight in compatible_keys(camelot).items():
+                bucket = self._buckets.get(target_key)
+                if not bucket:
+                    continue
+                bpms, ids = bucket
+                for ratio in tempo_ratios:
+                    target_bpm = bpm * ratio
+                    window = target_bpm * max(bpm_tolerance, 0.0)
+                    start = bisect_left(bpms, target_bpm - window)
+                    end = bisect_right(bpms, target_bpm + window)
+                    base_score = key_weight - (HALF_DOUBLE_PENALTY if ratio != 1.0 else 0.0)
+                    # Dentro de una tonalidad la puntuación solo depende de la distancia
+                    # al BPM objetivo: basta con expandirse desde el centro hasta reunir
+                    # 'limit' candidatas en vez de puntuar toda la ventana.
+                    for position in self._nearest_positions(bpms, target_bpm, start, end, limit, ids, excluded):
+                        candidate_id = ids[position]
+                        candidate_bpm = bpms[position]
+                        # Penaliza hasta 0.5 puntos según lo lejos que esté del centro de la ventana
+                        score = base_score
+                        if window > 0:
+                            score -= 0.5 * abs(candidate_bpm - target_bpm) / window
+                        previous = best.get(candidate_id)
+                        if previous is None or score > previous[0]:
+                            best[candidate_id] = (score, target_key, candidate_bpm, ratio)
+
+        top = heapq.nlargest(limit, best.items(), key=lambda item: item[1][0])
+        return [
+            {
+                "id": candidate_id,
+                "key": format_camelot(candidate_key),
+                "bpm": candidate_bpm,
+                "score": round(score, 4),
+                "tempo_ratio": ratio,
+            }
+            for candidate_id, (score, candidate_key, candidate_bpm, ratio) in top
+        ]
+
+
+# --- Ordenación automática de sets ---------------------------------------------
+
+# Curvas de energía objetivo: reciben la posición relativa en el set (0.0 a 1.0)
+# y devuelven la energía deseada (0.0 a 1.0).
+ENERGY_CURVES = {
+    "flat": lambda t: np.full_like(t, 0.5),
+    "rising": lambda t: 0.2 + 0.8 * t,
+    # Calentamiento, pico hacia el 75% del set y bajada final
+    "peak": lambda t: np.where(t < 0.75, 0.2 + 0.8 * t / 0.75, 1.0 - 1.2 * (t - 0.75)),
+}
+
+# Coste de cada transición cuando no hay datos (tonalidad o BPM desconocidos).
+UNKNOWN_TRANSITION_COST = 0.5
+
+
+def _key_cost_table():
+    """Tabla de costes (desplazamiento 0-11, cambia de letra 0/1) derivada de KEY_COMPATIBILITY."""
+    table = np.empty((12, 2), dtype=np.float32)
+    for shift in range(12):
+        distance = min(shift, 12 - shift)
+        for switch_letter in (0, 1):
+            # Choque armónico: crece con la distancia en la rueda
+            table[shift, switch_letter] = 1.0 + distance / 6.0 + 0.25 * switch_letter
+    for (shift, switch_letter), weight in KEY_COMPATIBILITY.items():
+        table[shift % 12, int(switch_letter)] = 1.0 - weight
+    return table
+
+
+def build_transition_costs(camelots, bpms, key_weight=1.0, bpm_weight=1.0, bpm_tolerance=0.06):
+    """
+    Calcula la matriz simétrica de costes de transición entre todas las pistas.
+
+    Args:
+        camelots (list): (número, letra) Camelot de cada pista, o None.
+        bpms (list): BPM de cada pista, o None.
+        key_weight (float): Peso del choque armónico.
+        bpm_weight (float): Peso del salto de BPM.
+        bpm_tolerance (float): Salto relativo de BPM que cuesta 1.0 (0.06 = 6%).
+
+    Returns:
+        numpy.ndarray: Matriz n×n (float32) con el coste de pasar de i a j.
+    """
+    count = len(camelots)
+    numbers = np.array([c[0] - 1 if c else 0 for c in camelots], dtype=np.int16)
+    letters = np.array([1 if c and c[1] == "B" else 0 for c in camelots], dtype=np.int16)
+    has_key = np.array([c is not None for c in camelots])
+
+    shifts = (numbers[None, :] - numbers[:, None]) % 12
+    switches = letters[None, :] != letters[:, None]
+    key_costs = _key_cost_table()[shifts, switches.astype(np.int16)]
+    # El "energy boost" solo es compatible hacia arriba; se simetriza para que
+    # invertir un tramo del set no cambie su coste (lo exige el 2-opt).
+    key_costs = np.minimum(key_costs, key_costs.T)
+    key_costs[~(has_key[:, None] & has_key[None, :])] = UNKNOWN_TRANSITION_COST
+
+    bpm_values = np.array([b if b else np.nan for b in bpms], dtype=np.float64)
+    log_bpms = np.log2(bpm_values)
+    log_ratio = np.abs(log_bpms[None, :] - log_bpms[:, None])
+    # Mezclar a mitad/doble tempo es posible, pero se penaliza ligeramente
+    half_double = np.abs(log_ratio - 1.0) + np.log2(1.0 + bpm_tolerance)
+    log_ratio = np.minimum(log_ratio, half_double)
+    bpm_costs = np.minimum(log_ratio / np.log2(1.0 + bpm_tolerance), 3.0)
+    bpm_costs[np.isnan(bpm_costs)] = UNKNOWN_TRANSITION_COST
+
+    costs = (key_weight * key_costs + bpm_weight * bpm_costs).astype(np.float32)
+    np.fill_diagonal(costs, 0.0)
+    return costs
+
+
+def _energy_ranks(energies):
+    """Normaliza las energías a su rango relativo (0.0 a 1.0) dentro del crate."""
+    values = np.asarray(energies, dtype=np.float64)
+    known = ~np.isnan(values)
+    ranks = np.full(len(values), 0.5)
+    if known.sum() > 1:
+        order = np.argsort(values[known], kind="stable")
+        known_ranks = np.empty(len(order))
+        known_ranks[order] = np.linspace(0.0, 1.0, len(order))
+        ranks[known] = known_ranks
+    return ranks
+
+
+class SetOrderOptimizer:
+    """
+    Ordena un crate como un problema de camino mínimo: minimiza choques de
+    tonalidad y saltos de BPM entre pistas consecutivas y sigue una curva de
+    energía a lo largo del set.
+
+    Parte de una solución del vecino más cercano y la mejora con 2-opt y
+    Or-opt hasta agotar el tiempo. Es "anytime": 'best_order' contiene siempre
+    la mejor ordenación encontrada hasta el momento, incluso mientras
+    optimiza en segundo plano (start()).
+    """
+
+    def __init__(self, costs, energies=None, energy_curve="peak", energy_weight=2.0):
+        self.costs = np.asarray(costs, dtype=np.float32)
+        self.count = len(self.costs)
+        curve = ENERGY_CURVES[energy_curve] if isinstance(energy_curve, str) else energy_curve
+        positions = np.linspace(0.0, 1.0, self.count) if self.count > 1 else np.zeros(1)
+        self._targets = np.asarray(curve(positions), dtype=np.float64)
+        self._energies = _energy_ranks(energies) if energies is not None else np.full(self.count, 0.5)
+        self.energy_weight = energy_weight if energies is not None else 0.0
+
+        self.best_order = list(range(self.count))
+        self.best_cost = self.order_cost(self.best_order) if self.count else 0.0
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def order_cost(self, order):
+        """Coste total de una ordenación (transiciones + desvío de la curva de energía)."""
+        order = np.asarray(order)
+        transitions = float(self.costs[order[:-1], order[1:]].sum()) if len(order) > 1 else 0.0
+        return transitions + self._position_cost(order, 0, len(order))
+
+    def _position_cost(self, order, start, end):
+        if not self.energy_weight:
+            return 0.0
+        deviation = np.abs(self._energies[order[start:end]] - self._targets[start:end])
+        return self.energy_weight * float(deviation.sum())
+
+    def _publish(self, order, cost):
+        with self._lock:
+            if cost < self.best_cost - 1e-9:
+                self.best_order = order.tolist()
+                self.best_cost = cost
+                return True
+        return False
+
+    def run(self, time_limit=3.0, callback=None):
+        """
+        Optimiza de forma bloqueante durante como mucho 'time_limit' segundos.
+
+        Args:
+            time_limit (float): Tiempo máximo en segundos.
+            callback (callable): Se llama con (orden, coste) cada vez que mejora.
+
+        Returns:
+            list: La mejor ordenación encontrada (índices de pista).
+        """
+        if self.count < 3:
+            return list(self.best_order)
+
+        deadline = time.monotonic() + time_limit
+        self._stop_event.clear()
+
+        order = self._nearest_neighbour()
+        if self._publish(order, self.order_cost(order)) and callback:
+            callback(self.best_order, self.best_cost)
+
+        improved = True
+        while improved and not self._should_stop(deadline):
+            improved = self._two_opt_pass(order, deadline)
+            improved = self._or_opt_pass(order, deadline) or improved
+            if self._publish(order, self.order_cost(order)) and callback:
+                callback(self.best_order, self.best_cost)
+        return list(self.best_order)
+
+    def start(self, time_limit=3.0, callback=None):
+        """Optimiza en un hilo en segundo plano; consulta 'best_order' en cualquier momento."""
+        self._thread = threading.Thread(target=self.run, args=(time_limit, callback), daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Pide detener la optimización; 'best_order' conserva lo mejor encontrado."""
+        self._stop_event.set()
+        self.wait()
+
+    def wait(self):
+        """Espera a que termine la optimización en segundo plano."""
+        if self._thread:
+            self._thread.join()
+
+    def _should_stop(self, deadline):
+        return self._stop_event.is_set() or time.monotonic() >= deadline
+
+    def _nearest_neighbour(self):
+        """Construcción voraz: en cada posición elige la transición más barata hacia la energía objetivo."""
+        energy_costs = self.energy_weight * np.abs(self._energies[None, :] - self._targets[:, None])
+        visited = np.zeros(self.count, dtype=bool)
+        order = np.empty(self.count, dtype=np.int64)
+
+        current = int(np.argmin(energy_costs[0] + self.costs.mean(axis=1)))
+        order[0] = current
+        visited[current] = True
+        for position in range(1, self.count):
+            step_costs = self.costs[current] + energy_costs[position]
+            step_costs[visited] = np.inf
+            current = int(np.argmin(step_costs))
+            order[position] = current
+            visited[current] = True
+        return order
+
+    def _two_opt_pass(self, order, deadline, candidates=5):
+        """
+        Una pasada de 2-opt: invierte tramos order[i+1..j] cuando abarata el set.
+        Con i = -1 el tramo empieza en la primera pista (el set es un camino
+        abierto, así que invertir un extremo solo cambia una transición).
+        """
+        improved = False
+        count = self.count
+        for i in range(-1, count - 2):
+            if i % 64 == 0 and self._should_stop(deadline):
+                break
+            b = order[i + 1]
+            c = order[i + 2:]
+            d = np.append(order[i + 3:], -1)
+            delta = np.zeros(len(c), dtype=np.float64)
+            if i >= 0:
+                a = order[i]
+                delta += self.costs[a, c] - self.costs[a, b]
+            inner = d >= 0
+            delta[inner] += self.costs[b, d[inner]] - self.costs[c[inner], d[inner]]
+
+            best = np.argsort(delta)[:candidates] if len(delta) > candidates else np.argsort(delta)
+            for offset in best:
+                if delta[offset] >= -1e-6:
+                    break
+                j = i + 2 + int(offset)
+                position_delta = 0.0
+                if self.energy_weight:
+                    position_delta = self._segment_shift_delta(order, i + 1, j + 1, order[i + 1:j + 1][::-1])
+                if delta[offset] + position_delta < -1e-6:
+                    order[i + 1:j + 1] = order[i + 1:j + 1][::-1]
+                    improved = True
+                    break
+        return improved
+
+    def _segment_shift_delta(self, order, start, end, new_segment):
+        """Variación del coste de energía si order[start:end] pasa a ser new_segment."""
+        targets = self._targets[start:end]
+        old = np.abs(self._energies[order[start:end]] - targets).sum()
+        new = np.abs(self._energies[new_segment] - targets).sum()
+        return self.energy_weight * float(new - old)
+
+    def _or_opt_pass(self, order, deadline, max_segment=3):
+        """Una pasada de Or-opt: recoloca tramos de 1 a 3 pistas en su mejor hueco."""
+        improved = False
+        count = self.count
+        costs = self.costs
+        i = 0
+        while i < count:
+            if i % 64 == 0 and self._should_stop(deadline):
+                break
+            moved = False
+            for length in range(1, max_segment + 1):
+                if i + length > count or length >= count - 1:
+                    break
+                first, last = order[i], order[i + length - 1]
+                prev = order[i - 1] if i > 0 else -1
+                nxt = order[i + length] if i + length < count else -1
+
+                removal_gain = 0.0
+                if prev >= 0:
+                    removal_gain += costs[prev, first]
+                if nxt >= 0:
+                    removal_gain += costs[last, nxt]
+                if prev >= 0 and nxt >= 0:
+                    removal_gain -= costs[prev, nxt]
+
+                rest = np.concatenate((order[:i], order[i + length:]))
+                # Hueco k: entre rest[k-1] y rest[k] (k = 0 al principio, k = len(rest) al final)
+                left = np.concatenate(([-1], rest))
+                right = np.concatenate((rest, [-1]))
+                has_left, has_right = left >= 0, right >= 0
+                insert_cost = np.zeros(len(left), dtype=np.float64)
+                insert_cost[has_left] += costs[left[has_left], first]
+                insert_cost[has_right] += costs[last, right[has_right]]
+                both = has_left & has_right
+                insert_cost[both] -= costs[left[both], right[both]]
+                insert_cost[i] = np.inf  # Volver al mismo sitio no es un movimiento
+
+                k = int(np.argmin(insert_cost))
+                delta = insert_cost[k] - removal_gain
+                if delta >= -1e-6:
+                    continue
+
+                segment = order[i:i + length].copy()
+                candidate = np.concatenate((rest[:k], segment, rest[k:]))
+                start, end = min(i, k), max(i + length, k + length)
+                position_delta = self._segment_shift_delta(order, start, end, candidate[start:end]) \
+                    if self.energy_weight else 0.0
+                if delta + position_delta < -1e-6:
+                    order[:] = candidate
+                    improved = moved = True
+                    break
+            if not moved:
+                i += 1
+        return improved
+
+
+def order_set(tracks, time_limit=3.0, energy_curve="peak", key_weight=1.0, bpm_weight=1.0,
+              energy_weight=2.0, callback=None):
+    """
+    Ordena un crate de pistas para pincharlo como set.
+
+    Args:
+        tracks (list): Diccionarios de pista (como los de get_all_tracks) con 'key' y 'bpm'
+                       y, opcionalmente, 'energy'. Si no hay energía, se usa el BPM como
+                       aproximación.
+        time_limit (float): Tiempo máximo de optimización en segundos.
+        energy_curve (str | callable): "peak", "rising", "flat" o una función t -> energía.
+        key_weight, bpm_weight, energy_weight (float): Pesos de cada criterio.
+        callback (callable): Se llama con (orden, coste) en cada mejora.
+
+    Returns:
+        list: Las mismas pistas, reordenadas.
+    """
+    if len(tracks) < 3:
+        return list(tracks)
+
+    camelots = [parse_camelot(track.get("key")) for track in tracks]
+    bpms = [parse_bpm(track.get("bpm")) for track in tracks]
+    energies = [
+        track.get("energy") if track.get("energy") is not None else (bpm if bpm else np.nan)
+        for track, bpm in zip(tracks, bpms)
+    ]
+
+    costs = build_transition_costs(camelots, bpms, key_weight, bpm_weight)
+    optimizer = SetOrderOptimizer(costs, energies, energy_curve, energy_weight)
+    order = optimizer.run(time_limit, callback)
+    return [tracks[index] for index in order]
@@ -0,0 +1,280 @@
+"""
+Búsqueda de pistas que suenan parecido.
+
+Cada pista analizada tiene un vector de timbre (ver audio_analysis.timbre_features)
+guardado como float32 en track_analysis.features. El índice estandariza esos
+vectores (cada dimensión tiene su propia escala), los normaliza y los guarda en
+una matriz .npy que se abre mapeada en memoria: la similitud coseno con todas
+las pistas es un único producto matriz-vector.
+
+Para bibliotecas muy grandes el índice puede construirse además como índice
+aproximado por particiones (IVF): los vectores se agrupan con k-means y se
+guardan ordenados por grupo, de modo que una consulta solo recorre los grupos
+más cercanos, que ocupan tramos contiguos del archivo.
+"""
+
+import glob
+import os
+import sqlite3
+import time
+
+import numpy as np
+
+from core.database import create_connection, get_db_path
+from core.audio_analysis import FEATURE_SIZE
+
+SIMILARITY_DIR = "similarity"
+# Cada construcción escribe los vectores en un archivo nuevo (vectors-<n>.npy) cuyo
+# nombre se guarda en index.npz. En Windows no se puede sustituir ni borrar un archivo
+# que otro proceso (o un índice aún abierto) tiene mapeado en memoria.
+VECTORS_PATTERN = "vectors-{}.npy"
+VECTORS_FILE = "vectors.npy"  # Índices construidos antes de los nombres versionados
+INDEX_FILE = "index.npz"
+
+DEFAULT_RESULTS = 50
+
+# Por debajo de este número de pistas la búsqueda exacta ya es suficientemente rápida
+APPROXIMATE_MIN_TRACKS = 250000
+DEFAULT_PROBES = 8
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE_SIZE = 50000
+
+
+def get_index_dir():
+    """Carpeta del índice de similitud (junto a library.db)."""
+    path = os.path.join(os.path.dirname(get_db_path()), SIMILARITY_DIR)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _library_stamp(conn):
+    """Número de vectores y fecha del último análisis: si cambian, el índice está obsoleto."""
+    count, last_date = conn.execute(
+        "SELECT COUNT(*), MAX(analyzed_date) FROM track_analysis WHERE length(features) > 0"
+    ).fetchone()
+    return np.array([count, last_date or 0.0], dtype=np.float64)
+
+
+def _read_features(conn):
+    """ids de pista y matriz de vectores (pistas x FEATURE_SIZE) de las pistas analizadas."""
+    vector_bytes = FEATURE_SIZE * 4
+    ids = []
+    blobs = []
+    cursor = conn.execute("SELECT track_id, features FROM track_analysis WHERE length(features) > 0 ORDER BY track_id")
+    for track_id, features in cursor:
+        if len(features) == vector_bytes:
+            ids.append(track_id)
+            blobs.append(features)
+    vectors = np.frombuffer(b"".join(blobs), dtype=np.float32).reshape(len(ids), FEATURE_SIZE)
+    return np.array(ids, dtype=np.int64), vectors
+
+
+def _normalize_rows(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _kmeans(vectors, clusters, iterations=KMEANS_ITERATIONS):
+    """k-means esférico (por similitud coseno) sobre una muestra de los vectores. Devuelve los centroides."""
+    rng = np.random.default_rng(0)
+    if len(vectors) > KMEANS_SAMPLE_SIZE:
+        vectors = vectors[rng.choice(len(vectors), KMEANS_SAMPLE_SIZE, replace=False)]
+    centroids = vectors[rng.choice(len(vectors), clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, vectors)
+        empty = ~sums.any(axis=1)
+        sums[empty] = centroids[empty]  # Un grupo vacío conserva su centroide
+        centroids = _normalize_rows(sums)
+    return centroids.astype(np.float32)
+
+
+def _assign_clusters(vectors, centroids, block_size=65536):
+    """Grupo más cercano de cada vector, por bloques para acotar la memoria."""
+    return np.concatenate([
+        np.argmax(vectors[start:start + block_size] @ centroids.T, axis=1)
+        for start in range(0, len(vectors), block_size)
+    ]) if len(vectors) else np.zeros(0, dtype=np.int64)
+
+
+class SimilarityIndex:
+    """
+    Vectores normalizados de la biblioteca (matriz mapeada en memoria) y, si el
+    índice es aproximado, los centroides de los grupos y el tramo de filas de cada uno.
+    """
+
+    def __init__(self, ids, vectors, centroids=None, offsets=None, stamp=None):
+        self.ids = ids
+        self.vectors = vectors
+        self.centroids = centroids if centroids is not None and len(centroids) else None
+        self.offsets = offsets
+        self.stamp = stamp
+        # Búsqueda de la fila de un id: las filas pueden estar ordenadas por grupo
+        self._id_order = np.argsort(ids, kind="stable")
+        self._sorted_ids = ids[self._id_order]
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def approximate(self):
+        return self.centroids is not None
+
+    @classmethod
+    def load(cls):
+        """Abre el índice guardado, o devuelve None si no existe o está incompleto."""
+        index_dir = get_index_dir()
+        if not os.path.exists(os.path.join(index_dir, INDEX_FILE)):
+            return None
+        try:
+            with np.load(os.path.join(index_dir, INDEX_FILE)) as data:
+                ids, centroids, offsets, stamp = data["ids"], data["centroids"], data["offsets"], data["stamp"]
+                vectors_file = str(data["vectors_file"]) if "vectors_file" in data else VECTORS_FILE
+            vectors = np.load(os.path.join(index_dir, vectors_file), mmap_mode="r")
+        except (OSError, KeyError, ValueError) as e:
+            print(f"No se pudo abrir el índice de similitud: {e}")
+            return None
+        if vectors.shape != (len(ids), FEATURE_SIZE):
+            return None
+        return cls(ids, vectors, centroids, offsets, stamp)
+
+    @classmethod
+    def open(cls, approximate=None):
+        """
+        Abre el índice guardado y lo reconstruye si falta o si la biblioteca ha
+        cambiado desde que se construyó.
+        """
+        conn = create_connection()
+        if not conn:
+            return None
+        try:
+            stamp = _library_stamp(conn)
+        except sqlite3.Error as e:
+            print(f"Error al consultar el análisis de la biblioteca: {e}")
+            return None
+        finally:
+            conn.close()
+
+        index = cls.load()
+        if index is not None and np.array_equal(index.stamp, stamp):
+            return index
+        return build_index(approximate)
+
+    def row_of(self, track_id):
+        """Fila de una pista en la matriz, o None si no está en el índice."""
+        position = np.searchsorted(self._sorted_ids, track_id)
+        if position < len(self._sorted_ids) and self._sorted_ids[position] == track_id:
+            return int(self._id_order[position])
+        return None
+
+    def similar(self, track_id, count=DEFAULT_RESULTS, probes=DEFAULT_PROBES):
+        """
+        Pistas más parecidas a una dada, de mayor a menor similitud.
+
+        Args:
+            track_id (int): Pista de referencia.
+            count (int): Número de resultados.
+            probes (int): En un índice aproximado, grupos que se recorren. Más grupos,
+                          resultados más exactos y consulta más lenta.
+
+        Returns:
+            list: Tuplas (id de pista, similitud coseno entre -1 y 1). Vacía si la
+                  pista no tiene vector de timbre.
+        """
+        row = self.row_of(track_id)
+        if row is None:
+            return []
+        query = np.array(self.vectors[row])
+
+        if self.approximate and probes < len(self.centroids):
+            clusters = np.argpartition(self.centroids @ query, -probes)[-probes:]
+            rows = np.concatenate([np.arange(self.offsets[c], self.offsets[c + 1]) for c in clusters])
+            scores = np.concatenate([self.vectors[self.offsets[c]:self.offsets[c + 1]] @ query for c in clusters])
+        else:
+            rows = None
+            scores = self.vectors @ query
+
+        scores[(rows == row) if rows is not None else row] = -np.inf
+        count = min(count, len(scores) - 1)
+        if count <= 0:
+            return []
+        best = np.argpartition(scores, -count)[-count:]
+        best = best[np.argsort(scores[best])[::-1]]
+        best_rows = rows[best] if rows is not None else best
+        return [(int(self.ids[r]), float(s)) for r, s in zip(best_rows, scores[best])]
+
+
+def _remove_old_vectors(index_dir, current_file):
+    """Borra los archivos de vectores de construcciones anteriores que ya no estén abiertos."""
+    old_files = glob.glob(os.path.join(index_dir, VECTORS_PATTERN.format("*"))) + [os.path.join(index_dir, VECTORS_FILE)]
+    for path in old_files:
+        if os.path.basename(path) == current_file:
+            continue
+        try:
+            os.remove(path)
+        except OSError:
+            pass  # Aún mapeado (Windows) o ya borrado: se intentará en la próxima construcción
+
+
+def build_index(approximate=None):
+    """
+    Construye el índice a partir de los vectores de timbre de la base de datos
+    y lo guarda en disco.
+
+    Args:
+        approximate (bool): Construir además el índice aproximado por grupos. Por
+                            defecto, solo a partir de APPROXIMATE_MIN_TRACKS pistas.
+
+    Returns:
+        SimilarityIndex: El índice ya abierto, o None si hubo un error.
+    """
+    conn = create_connection()
+    if not conn:
+        return None
+    try:
+        stamp = _library_stamp(conn)
+        ids, vectors = _read_features(conn)
+    except sqlite3.Error as e:
+        print(f"Error al leer los vectores de timbre: {e}")
+        return None
+    finally:
+        conn.close()
+
+    # Estandarizar cada dimensión para que ninguna domine la similitud
+    if len(vectors):
+        mean = vectors.mean(axis=0)
+        std = vectors.std(axis=0)
+        std[std == 0] = 1.0
+        vectors = _normalize_rows((vectors - mean) / std).astype(np.float32)
+
+    if approximate is None:
+        approximate = len(ids) >= APPROXIMATE_MIN_TRACKS
+    centroids = np.zeros((0, FEATURE_SIZE), dtype=np.float32)
+    offsets = np.zeros(0, dtype=np.int64)
+    if approximate and len(ids) > 1:
+        clusters = max(1, int(np.sqrt(len(ids))))
+        centroids = _kmeans(vectors, clusters)
+        assignment = _assign_clusters(vectors, centroids)
+        order = np.argsort(assignment, kind="stable")
+        ids, vectors = ids[order], vectors[order]
+        offsets = np.searchsorted(assignment[order], np.arange(clusters + 1))
+
+    index_dir = get_index_dir()
+    vectors_file = VECTORS_PATTERN.format(time.time_ns())
+    index_path = os.path.join(index_dir, INDEX_FILE)
+    try:
+        # Los vectores van a un archivo nuevo y solo index.npz (que no se mapea) se
+        # sustituye: un índice abierto sigue leyendo su archivo anterior.
+        np.save(os.path.join(index_dir, vectors_file), vectors)
+        np.savez(index_path + ".tmp.npz", ids=ids, centroids=centroids, offsets=offsets, stamp=stamp,
+                 vectors_file=vectors_file)
+        os.replace(index_path + ".tmp.npz", index_path)
+    except OSError as e:
+        print(f"Error al guardar el índice de similitud: {e}")
+        return SimilarityIndex(ids, vectors, centroids, offsets, stamp)
+    _remove_old_vectors(index_dir, vectors_file)
+
+    print(f"Índice de similitud construido: {len(ids)} pistas" + (f", {len(centroids)} grupos." if approximate else "."))
+    return SimilarityIndex.load()
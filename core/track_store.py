@@ -0,0 +1,451 @@
+"""
+Almacén de pistas en memoria organizado por columnas.
+
+En lugar de un diccionario por pista, cada columna es un array:
+
+- Las numéricas son arrays de NumPy (NaN si no hay dato).
+- Las de texto que se repiten (artista, álbum, género, tonalidad...) se
+  codifican como diccionario: un array de códigos int32 y la lista de valores
+  distintos, internados, de modo que cada cadena existe una sola vez.
+- Las de texto casi únicas (títulos) se empaquetan en un único bloque UTF-8
+  con un array de desplazamientos, sin un objeto str por fila.
+- Las rutas se separan en carpeta (codificada como diccionario: las pistas de
+  un disco comparten carpeta) y nombre de archivo (empaquetado).
+
+Ordenar y filtrar son operaciones vectorizadas sobre estos arrays.
+"""
+
+import sys
+from array import array
+from bisect import bisect_right
+
+import numpy as np
+
+from core.database import iter_tracks
+from core.playlist_logic import parse_bpm, parse_camelot
+
+# Columnas que se cargan por defecto (las que usan la lista de pistas y las playlists)
+DEFAULT_COLUMNS = ["id", "file_path", "title", "artist", "album", "genre", "year",
+                   "track_number", "duration", "bpm", "key", "file_type"]
+
+NUMERIC_COLUMNS = {"duration", "bpm", "file_size", "last_modified_date", "last_scanned_date"}
+
+# Columnas de texto que deben ordenarse por su valor numérico ("2" antes que "10")
+_NUMERIC_TEXT_COLUMNS = {"year", "track_number"}
+
+# Una columna de texto se empaqueta si tiene más de este número de valores
+# distintos y más de la mitad de sus filas son distintas.
+_PACK_MIN_VALUES = 1000
+
+_LOAD_BATCH_SIZE = 5000
+
+_MISSING_TEXT = ("", "N/A")
+
+
+def _to_number(column, value):
+    if column == "bpm":
+        return parse_bpm(value) or np.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _to_text(value):
+    # El carácter nulo separa los valores empaquetados
+    return "" if value is None else str(value).replace("\0", "")
+
+
+def _leading_int(text):
+    digits = ""
+    for char in text.strip():
+        if not char.isdigit():
+            break
+        digits += char
+    return int(digits) if digits else None
+
+
+def _category_sort_key(column):
+    """Clave de ordenación de los valores de una columna de texto."""
+    if column == "key":
+        def key(value):
+            camelot = parse_camelot(value)
+            return (0, camelot[0], camelot[1], "") if camelot else (1, 0, "", value.casefold())
+        return key
+    if column in _NUMERIC_TEXT_COLUMNS:
+        def key(value):
+            number = _leading_int(value)
+            return (0, number, "") if number is not None else (1, 0, value.casefold())
+        return key
+    return lambda value: (value in _MISSING_TEXT, value.casefold())
+
+
+def _ranks(values, column):
+    """Posición de cada valor de la lista en el orden de la columna."""
+    sort_key = _category_sort_key(column)
+    order = sorted(range(len(values)), key=lambda index: sort_key(values[index]))
+    ranks = np.empty(len(values), dtype=np.int32)
+    ranks[order] = np.arange(len(values), dtype=np.int32)
+    return ranks
+
+
+class _CodeTable(dict):
+    """
+    Valor original -> código. Los aciertos se resuelven en C (dict.__getitem__);
+    solo los valores nuevos pasan por Python.
+    """
+
+    __slots__ = ("column",)
+
+    def __init__(self, column):
+        super().__init__()
+        self.column = column
+
+    def __missing__(self, value):
+        text = _to_text(value)
+        code = self.get(text)
+        if code is None:
+            code = self.column.add_value(text)
+            self[text] = code
+        self[value] = code
+        return code
+
+
+class _DictionaryColumn:
+    """Columna de texto codificada como diccionario (códigos por fila + valores distintos)."""
+
+    __slots__ = ("codes", "values", "_lookup", "_ranks", "_folded", "_missing")
+
+    def __init__(self):
+        self.codes = array("i")
+        self.values = []
+        self._lookup = _CodeTable(self)
+        self._ranks = self._folded = self._missing = None
+
+    def extend(self, values):
+        self.codes.extend(map(self._lookup.__getitem__, values))
+
+    def add_value(self, text):
+        """Registra un valor distinto nuevo y devuelve su código."""
+        self.values.append(sys.intern(text))
+        self._ranks = self._folded = self._missing = None
+        return len(self.values) - 1
+
+    def _code(self, value):
+        if self._lookup is None:
+            self._lookup = _CodeTable(self)
+            self._lookup.update((text, code) for code, text in enumerate(self.values))
+        return self._lookup[value]
+
+    def freeze(self):
+        """
+        Termina la carga: pasa los códigos a NumPy y libera el diccionario. Si casi
+        todos los valores son distintos, devuelve en su lugar una columna empaquetada.
+        """
+        self._lookup = None  # También rompe el ciclo tabla <-> columna
+        if len(self.values) > _PACK_MIN_VALUES and len(self.values) * 2 > len(self.codes):
+            values = self.values
+            return _PackedColumn([values[code] for code in self.codes])
+        self.codes = np.array(self.codes, dtype=np.int32)
+        return self
+
+    def value(self, row):
+        return self.values[self.codes[row]]
+
+    def set(self, row, value):
+        self.codes[row] = self._code(value)
+
+    def sort_keys(self, column):
+        if self._ranks is None:
+            self._ranks = _ranks(self.values, column)
+        return self._ranks[self.codes]
+
+    def missing(self, rows):
+        if self._missing is None:
+            self._missing = np.array([value in _MISSING_TEXT for value in self.values], dtype=bool)
+        return self._missing[self.codes[rows]]
+
+    def matches(self, needle):
+        if self._folded is None:
+            self._folded = [value.casefold() for value in self.values]
+        hits = np.fromiter((needle in value for value in self._folded), dtype=bool, count=len(self._folded))
+        return hits[self.codes]
+
+    def categories(self):
+        return self.codes, self.values
+
+
+class _PackedColumn:
+    """Columna de texto con valores casi únicos, empaquetados en un único bloque UTF-8."""
+
+    __slots__ = ("_data", "_offsets", "_edits", "_sort_keys", "_missing", "_folded", "_folded_offsets")
+
+    def __init__(self, values):
+        encoded = [_to_text(value).encode("utf-8") for value in values]
+        self._data = b"\0".join(encoded)
+        # El valor i ocupa _data[_offsets[i]:_offsets[i + 1] - 1]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum(np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded)) + 1, out=offsets[1:])
+        self._offsets = offsets.astype(np.uint32) if len(self._data) < 2 ** 32 else offsets
+        self._edits = {}  # Filas editadas después de la carga
+        self._clear_caches()
+
+    def _clear_caches(self):
+        self._sort_keys = self._missing = self._folded = self._folded_offsets = None
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def value(self, row):
+        if row in self._edits:
+            return self._edits[row]
+        return self._data[int(self._offsets[row]):int(self._offsets[row + 1]) - 1].decode("utf-8")
+
+    def all_values(self):
+        """Lista temporal con todos los valores (una sola decodificación)."""
+        values = self._data.decode("utf-8").split("\0") if len(self) else []
+        for row, value in self._edits.items():
+            values[row] = value
+        return values
+
+    def set(self, row, value):
+        self._edits[row] = _to_text(value)
+        self._clear_caches()
+
+    def sort_keys(self, column):
+        if self._sort_keys is None:
+            self._sort_keys = _ranks(self.all_values(), column)
+        return self._sort_keys
+
+    def missing(self, rows):
+        if self._missing is None:
+            self._missing = np.array([value in _MISSING_TEXT for value in self.all_values()], dtype=bool)
+        return self._missing[rows]
+
+    def matches(self, needle):
+        """Busca en el texto completo (en minúsculas) y traduce cada aparición a su fila."""
+        if self._folded is None:
+            folded = [value.casefold() for value in self.all_values()]
+            self._folded_offsets = array("q", [0])
+            position = 0
+            for value in folded:
+                position += len(value) + 1
+                self._folded_offsets.append(position)
+            self._folded = "\0".join(folded)
+
+        mask = np.zeros(len(self), dtype=bool)
+        offsets = self._folded_offsets
+        start = self._folded.find(needle)
+        while start >= 0:
+            row = bisect_right(offsets, start) - 1
+            mask[row] = True
+            # Basta una aparición por fila: se salta al principio de la siguiente
+            start = self._folded.find(needle, offsets[row + 1])
+        return mask
+
+    def categories(self):
+        return np.arange(len(self), dtype=np.int32), self.all_values()
+
+
+class _PathColumn:
+    """Rutas separadas en carpeta (diccionario) y nombre de archivo (empaquetado)."""
+
+    __slots__ = ("directories", "names", "_pending_names", "_sort_keys")
+
+    def __init__(self):
+        self.directories = _DictionaryColumn()
+        self.names = None
+        self._pending_names = []
+        self._sort_keys = None
+
+    @staticmethod
+    def _split(path):
+        path = _to_text(path)
+        cut = max(path.rfind("/"), path.rfind("\\")) + 1
+        return path[:cut], path[cut:]
+
+    def extend(self, paths):
+        directories = []
+        for path in paths:
+            directory, name = self._split(path)
+            directories.append(directory)
+            self._pending_names.append(name)
+        self.directories.extend(directories)
+
+    def freeze(self):
+        self.directories = self.directories.freeze()
+        self.names = _PackedColumn(self._pending_names)
+        self._pending_names = None
+        return self
+
+    def value(self, row):
+        return self.directories.value(row) + self.names.value(row)
+
+    def set(self, row, value):
+        directory, name = self._split(value)
+        self.directories.set(row, directory)
+        self.names.set(row, name)
+        self._sort_keys = None
+
+    def all_values(self):
+        return [self.directories.value(row) + name for row, name in enumerate(self.names.all_values())]
+
+    def sort_keys(self, column):
+        if self._sort_keys is None:
+            self._sort_keys = _ranks(self.all_values(), column)
+        return self._sort_keys
+
+    def missing(self, rows):
+        return np.zeros(len(rows), dtype=bool)
+
+    def matches(self, needle):
+        return self.directories.matches(needle) | self.names.matches(needle)
+
+    def categories(self):
+        values = self.all_values()
+        return np.arange(len(values), dtype=np.int32), values
+
+
+class TrackStore:
+    """
+    Pistas de la biblioteca en memoria, por columnas.
+
+    Las filas se identifican por su posición (0..n-1), en orden de id. Los
+    métodos de ordenación y filtrado devuelven arrays de posiciones.
+    """
+
+    def __init__(self, columns=None):
+        self.columns = list(columns or DEFAULT_COLUMNS)
+        if "id" not in self.columns:
+            self.columns.insert(0, "id")
+        self.ids = np.zeros(0, dtype=np.int64)
+        self._numeric = {}
+        self._text = {}
+
+    @classmethod
+    def from_database(cls, columns=None, where=None, params=()):
+        """Carga las pistas desde la base de datos, por lotes y columna a columna."""
+        store = cls(columns)
+        ids = array("q")
+        numeric = {column: array("d") for column in store.columns if column in NUMERIC_COLUMNS}
+        text = {column: _PathColumn() if column == "file_path" else _DictionaryColumn()
+                for column in store.columns if column != "id" and column not in NUMERIC_COLUMNS}
+
+        def append_batch(batch):
+            for column, values in zip(store.columns, zip(*batch)):
+                if column == "id":
+                    ids.extend(values)
+                elif column in numeric:
+                    numeric[column].extend(_to_number(column, value) for value in values)
+                else:
+                    text[column].extend(values)
+
+        batch = []
+        for row in iter_tracks(store.columns, where=where, params=params, order_by="id"):
+            batch.append(row)
+            if len(batch) >= _LOAD_BATCH_SIZE:
+                append_batch(batch)
+                batch = []
+        if batch:
+            append_batch(batch)
+
+        store.ids = np.array(ids, dtype=np.int64)
+        store._numeric = {column: np.array(values, dtype=np.float64) for column, values in numeric.items()}
+        store._text = {column: builder.freeze() for column, builder in text.items()}
+        return store
+
+    def __len__(self):
+        return len(self.ids)
+
+    def row_of(self, track_id):
+        """Posición de la pista con ese id, o None si no está."""
+        position = int(np.searchsorted(self.ids, track_id))
+        if position < len(self.ids) and self.ids[position] == track_id:
+            return position
+        return None
+
+    def value(self, row, column):
+        """Valor de una celda (float o NaN en las numéricas, str en las de texto)."""
+        if column == "id":
+            return int(self.ids[row])
+        if column in self._numeric:
+            return float(self._numeric[column][row])
+        return self._text[column].value(row)
+
+    def row(self, row):
+        """Diccionario con los valores de una fila (solo para filas sueltas)."""
+        return {column: self.value(row, column) for column in self.columns}
+
+    def column(self, column):
+        """Array NumPy de una columna numérica (o de los ids)."""
+        if column == "id":
+            return self.ids
+        return self._numeric[column]
+
+    def categories(self, column):
+        """
+        Codificación de una columna de texto: (códigos por fila, valores). Permite
+        procesar cada valor distinto una sola vez.
+        """
+        return self._text[column].categories()
+
+    def set_value(self, row, column, value):
+        """Actualiza una celda (p. ej. tras editar un tag desde la UI)."""
+        if column in self._numeric:
+            self._numeric[column][row] = _to_number(column, value)
+        elif column in self._text:
+            self._text[column].set(row, value)
+
+    def _sort_keys(self, column):
+        if column == "id":
+            return self.ids
+        if column in self._numeric:
+            return self._numeric[column]
+        return self._text[column].sort_keys(column)
+
+    def argsort(self, columns, descending=False, rows=None):
+        """
+        Posiciones de las filas ordenadas por una o varias columnas. Los valores
+        que faltan (NaN, vacío, 'N/A') quedan al final en ambos sentidos.
+
+        Args:
+            columns (str | list): Columna o columnas, de la más a la menos significativa.
+            descending (bool): Orden descendente.
+            rows (array): Limitar la ordenación a estas posiciones (p. ej. un filtro).
+        """
+        if isinstance(columns, str):
+            columns = [columns]
+        rows = np.arange(len(self.ids)) if rows is None else np.asarray(rows)
+
+        keys = []
+        for column in columns:
+            values = self._sort_keys(column)[rows]
+            if values.dtype.kind == "f":
+                missing = np.isnan(values)
+                values = np.where(missing, 0.0, -values if descending else values)
+            else:
+                if column in self._text:
+                    missing = self._text[column].missing(rows)
+                else:
+                    missing = np.zeros(len(values), dtype=bool)
+                values = -values.astype(np.int64) if descending else values
+            keys.extend((missing, values))
+
+        # np.lexsort ordena por la última clave primero
+        order = np.lexsort(keys[::-1]) if keys else np.arange(len(rows))
+        return rows[order]
+
+    def filter(self, text, columns=("title", "artist", "album", "genre")):
+        """Posiciones de las filas cuyo texto contiene 'text' en alguna de las columnas."""
+        needle = text.strip().casefold()
+        if not needle:
+            return np.arange(len(self.ids))
+        mask = np.zeros(len(self.ids), dtype=bool)
+        for column in columns:
+            if column in self._text:
+                mask |= self._text[column].matches(needle)
+        return np.flatnonzero(mask)
+
+    def records(self, rows, columns=("id", "key", "bpm")):
+        """Diccionarios de las filas indicadas (para la lógica de playlists)."""
+        return [{column: self.value(row, column) for column in columns} for row in rows]
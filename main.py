@@ -1,15 +1,20 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, Menu, messagebox
+import os
 import threading
 import queue
 import platform
 
 from core.metadata_reader import read_metadata
-from core.database import init_db
-from core.library_scanner import scan_directory
+from core.database import init_db, get_library_roots
+from core.library_scanner import scan_directory, prune_missing_tracks
+from core.library_watcher import LibraryWatcher
 from ui.tracklist import Tracklist
 from ui.waveform_display import WaveformDisplay
+from ui.artwork_display import ArtworkDisplay
 from ui.theme_manager import theme_manager
+from ui.stats_export import StatsExportWindow
+from ui.import_dialog import ImportDialog
 
 class App(tk.Tk):
     def __init__(self):
@@ -25,6 +30,10 @@ class App(tk.Tk):
 
         self.process_scan_queue()
 
+        # Mantener la biblioteca sincronizada con los cambios en disco
+        self.library_watcher = LibraryWatcher(get_library_roots(), queue=self.scan_queue)
+        self.library_watcher.start()
+
     def create_menu(self):
         """Crea la barra de menú superior de la aplicación."""
         menubar = Menu(self)
@@ -32,6 +41,9 @@ class App(tk.Tk):
 
         file_menu = Menu(menubar, tearoff=0)
         file_menu.add_command(label="Escanear Biblioteca...", command=self.scan_library)
+        file_menu.add_command(label="Re-escanear biblioteca completa", command=self.rescan_library)
+        file_menu.add_command(label="Importar colección...", command=lambda: ImportDialog(self, self.scan_queue))
+        file_menu.add_command(label="Estadísticas y exportación...", command=lambda: StatsExportWindow(self))
         file_menu.add_separator()
         file_menu.add_command(label="Salir", command=self.quit)
         menubar.add_cascade(label="Archivo", menu=file_menu)
@@ -46,6 +58,14 @@ class App(tk.Tk):
         tracklist_frame = ttk.Frame(main_pane, height=600)
         main_pane.add(tracklist_frame, weight=3)
 
+        # Búsqueda sobre el título, artista, álbum y género (filtra en memoria)
+        search_frame = ttk.Frame(tracklist_frame)
+        search_frame.pack(side="top", fill="x", pady=(0, 5))
+        ttk.Label(search_frame, text="Buscar:").pack(side="left")
+        self.search_var = tk.StringVar()
+        self.search_var.trace_add("write", lambda *args: self.tracklist.apply_filter(self.search_var.get()))
+        ttk.Entry(search_frame, textvariable=self.search_var).pack(side="left", fill="x", expand=True, padx=5)
+
         self.tracklist = Tracklist(tracklist_frame, self.update_waveform) # Pasamos la referencia a la función de callback
         self.tracklist.pack(side="left", fill="both", expand=True)
 
@@ -57,8 +77,11 @@ class App(tk.Tk):
         waveform_frame = ttk.Frame(main_pane, height=200)
         main_pane.add(waveform_frame, weight=1)
 
+        self.artwork_display = ArtworkDisplay(waveform_frame)
+        self.artwork_display.pack(side="left", anchor="n")
+
         self.waveform_display = WaveformDisplay(waveform_frame)
-        self.waveform_display.pack(fill="both", expand=True)
+        self.waveform_display.pack(side="left", fill="both", expand=True)
 
         # Cargar datos al inicio
         self.tracklist.load_data()
@@ -67,9 +90,14 @@ class App(tk.Tk):
         """Callback que se llama al seleccionar una pista para actualizar la forma de onda."""
         # Esto debería correr en un hilo para no bloquear la UI al generar la forma de onda
         from core.waveform_generator import generate_waveform_data
+        from core.audio_analysis import get_cached_waveform
+
+        # La carátula sale de la caché de miniaturas: no hace falta abrir el archivo
+        self.artwork_display.show_track(file_path)
         
         def generator_thread():
-            data = generate_waveform_data(file_path)
+            # Si la pista ya se analizó (p. ej. con 'cli.py analyze') no se decodifica de nuevo
+            data = get_cached_waveform(file_path) or generate_waveform_data(file_path)
             # Pasamos los datos al widget de forma segura para la UI de Tkinter
             self.waveform_display.set_data(data)
 
@@ -92,6 +120,7 @@ class App(tk.Tk):
             return
         
         self.status_var.set(f"Escaneando: {directory_path}...")
+        self.library_watcher.add_root(directory_path)
         
         # Ejecutar el escaneo en un hilo separado para no bloquear la UI
         scan_thread = threading.Thread(
@@ -100,6 +129,32 @@ class App(tk.Tk):
         )
         scan_thread.start()
 
+    def rescan_library(self):
+        """
+        Vuelve a escanear todas las carpetas registradas sin usar la caché de
+        carpetas, y elimina las pistas cuyo archivo ya no existe.
+        """
+        roots = get_library_roots()
+        if not roots:
+            self.status_var.set("No hay carpetas registradas en la biblioteca.")
+            return
+
+        self.status_var.set("Re-escaneando la biblioteca completa...")
+
+        def rescan_thread():
+            try:
+                for root in roots:
+                    if not os.path.isdir(root):
+                        # Disco desconectado: no se borran sus pistas
+                        print(f"El directorio no existe: {root}")
+                        continue
+                    scan_directory(root, full_rescan=True)
+                    prune_missing_tracks(root)
+            finally:
+                self.scan_queue.put("scan_complete")
+
+        threading.Thread(target=rescan_thread, daemon=True).start()
+
     def process_scan_queue(self):
         """Procesa los mensajes de la cola del escáner y actualiza la UI."""
         try:
@@ -108,6 +163,8 @@ class App(tk.Tk):
                 self.status_var.set("Escaneo completado. Actualizando lista...")
                 self.tracklist.load_data()
                 self.status_var.set("Listo.")
+            elif message == "library_changed":
+                self.tracklist.load_data()
         except queue.Empty:
             pass
         finally:
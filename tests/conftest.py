@@ -0,0 +1,25 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core import database
+
+
+@pytest.fixture
+def library_db(tmp_path, monkeypatch):
+    """Base de datos vacía en una carpeta temporal, en lugar de config/library.db."""
+    db_path = str(tmp_path / "library.db")
+    monkeypatch.setattr(database, "get_db_path", lambda: db_path)
+    database.init_db()
+    return db_path
+
+
+def make_track(file_path, **fields):
+    """Diccionario de pista con los campos mínimos para database.add_track/upsert_track."""
+    track = dict(file_path=file_path, title=os.path.basename(file_path), artist="N/A", album="N/A",
+                 genre="N/A", duration=180.0, file_type="MP3", file_size=1000, last_modified_date=1.0)
+    track.update(fields)
+    return track
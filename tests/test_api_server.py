@@ -0,0 +1,115 @@
+import asyncio
+import http.client
+import json
+import socket
+import threading
+
+import pytest
+
+from core import api_server
+from core.api_server import LibraryApiServer, etag_matches
+from core.database import upsert_tracks
+
+from tests.conftest import make_track
+
+
+@pytest.fixture
+def server(library_db, monkeypatch):
+    """Servidor en un puerto libre, con su propio bucle de eventos en otro hilo."""
+    monkeypatch.setattr(api_server, "get_db_path", lambda: library_db)
+    upsert_tracks([make_track(f"/m/{i:02d}.mp3", genre="House" if i % 2 else "Techno", bpm=120.0 + i)
+                   for i in range(25)])
+
+    loop = asyncio.new_event_loop()
+    api = LibraryApiServer(port=0, db_workers=1)
+    loop.run_until_complete(api.start())
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    yield api
+    asyncio.run_coroutine_threadsafe(api.close(), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.close()
+
+
+def _get(server, path, headers=None):
+    conn = http.client.HTTPConnection(server.host, server.port, timeout=5)
+    try:
+        conn.request("GET", path, headers=headers or {})
+        response = conn.getresponse()
+        body = response.read()
+        return response.status, dict(response.getheaders()), json.loads(body) if body else None
+    finally:
+        conn.close()
+
+
+@pytest.mark.parametrize("header, expected", [
+    ('"lib-3"', True),
+    ('W/"lib-3"', True),
+    ('"lib-1", W/"lib-3"', True),
+    ('*', True),
+    ('"lib-1", "lib-2"', False),
+    ('lib-3', False),
+    (None, False),
+])
+def test_etag_matches(header, expected):
+    assert etag_matches(header, '"lib-3"') is expected
+
+
+def test_paging_follows_next_after(server):
+    ids = []
+    after = 0
+    while after is not None:
+        status, _, page = _get(server, f"/api/tracks?limit=10&after={after}&fields=file_path")
+        assert status == 200
+        assert len(page["tracks"]) <= 10
+        ids.extend(track["id"] for track in page["tracks"])
+        after = page["next_after"]
+
+    assert ids == sorted(ids) and len(ids) == 25
+
+
+def test_filters_and_unlimited_listing(server):
+    _, _, page = _get(server, "/api/tracks?limit=0&genre=house&bpm_min=130")
+
+    assert [track["file_path"] for track in page["tracks"]] == ["/m/11.mp3", "/m/13.mp3", "/m/15.mp3", "/m/17.mp3",
+                                                                  "/m/19.mp3", "/m/21.mp3", "/m/23.mp3"]
+    assert page["next_after"] is None
+
+
+def test_if_none_match_returns_not_modified(server):
+    status, headers, page = _get(server, "/api/tracks")
+    etag = headers["ETag"]
+
+    assert _get(server, "/api/tracks", {"If-None-Match": etag})[0] == 304
+    assert _get(server, "/api/tracks", {"If-None-Match": f'"other", W/{etag}'})[0] == 304
+    assert _get(server, f"/api/tracks/{page['tracks'][0]['id']}", {"If-None-Match": "*"})[0] == 304
+    assert _get(server, "/api/tracks/9999", {"If-None-Match": "*"})[0] == 404
+
+    # Un cambio en la biblioteca invalida el ETag
+    upsert_tracks([make_track("/m/new.mp3")])
+    status, headers, _ = _get(server, "/api/tracks", {"If-None-Match": etag})
+    assert status == 200 and headers["ETag"] != etag
+
+
+def test_invalid_parameters(server):
+    assert _get(server, "/api/tracks?limit=abc")[0] == 400
+    assert _get(server, "/api/tracks?fields=title,nope")[0] == 400
+    assert _get(server, "/api/search")[0] == 400
+
+
+def test_http10_listing_is_sent_without_chunks(server):
+    with socket.create_connection((server.host, server.port), timeout=5) as sock:
+        sock.sendall(b"GET /api/tracks?limit=3 HTTP/1.0\r\nConnection: keep-alive\r\n\r\n")
+        response = b""
+        while True:  # El servidor cierra la conexión al terminar el cuerpo
+            data = sock.recv(65536)
+            if not data:
+                break
+            response += data
+
+    head, _, body = response.partition(b"\r\n\r\n")
+    head_lines = head.decode("latin-1").lower().split("\r\n")
+    assert "connection: close" in head_lines
+    assert not any(line.startswith("transfer-encoding") for line in head_lines)
+    assert len(json.loads(body)["tracks"]) == 3
@@ -0,0 +1,37 @@
+import queue
+import threading
+from types import SimpleNamespace
+
+from ui import artwork_display
+from ui.artwork_display import ArtworkDisplay
+
+
+def test_loader_serves_requests_from_one_thread(monkeypatch):
+    threads = set()
+    started, release = threading.Event(), threading.Event()
+
+    def artwork_hash(file_path):
+        threads.add(threading.get_ident())
+        started.set()
+        release.wait(5)  # La primera petición tarda: las siguientes se acumulan
+        return f"hash-{file_path}"
+
+    def thumbnail(artwork_hash):
+        threads.add(threading.get_ident())
+        return artwork_hash.encode()
+
+    monkeypatch.setattr(artwork_display, "get_track_artwork_hash", artwork_hash)
+    monkeypatch.setattr(artwork_display, "get_thumbnail", thumbnail)
+    display = SimpleNamespace(request_queue=queue.Queue(), result_queue=queue.Queue())
+    threading.Thread(target=ArtworkDisplay._loader, args=(display,), daemon=True).start()
+
+    display.request_queue.put(("a.mp3", frozenset()))
+    started.wait(5)
+    display.request_queue.put(("b.mp3", frozenset()))
+    display.request_queue.put(("c.mp3", frozenset({"hash-c.mp3"})))
+    release.set()
+
+    results = [display.result_queue.get(timeout=5) for _ in range(2)]
+    # Las peticiones intermedias se descartan y las miniaturas ya decodificadas no se leen
+    assert results == [("a.mp3", "hash-a.mp3", b"hash-a.mp3", False), ("c.mp3", "hash-c.mp3", None, True)]
+    assert len(threads) == 1 and threading.get_ident() not in threads
@@ -0,0 +1,12 @@
+from core.audio_analysis import analyze_library
+from core.database import upsert_tracks
+
+from tests.conftest import make_track
+
+
+def test_failed_analysis_stays_pending(library_db, tmp_path):
+    upsert_tracks([make_track(str(tmp_path / "missing.mp3"))])
+
+    assert analyze_library(workers=1) == {"analyzed": 0, "failed": 1, "total": 1}
+    # No queda registrada como analizada: el siguiente análisis la reintenta
+    assert analyze_library(workers=1)["total"] == 1
@@ -0,0 +1,130 @@
+import os
+import sqlite3
+
+import pytest
+
+from core import collection_exporter, database
+from core.collection_exporter import export_all_playlists_m3u8, export_m3u8, export_rekordbox_xml
+from core.collection_importer import import_rekordbox_xml
+from core.database import upsert_tracks
+
+from tests.conftest import make_track
+
+
+def _query(db_path, sql, params=()):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute(sql, params).fetchall()
+    finally:
+        conn.close()
+
+
+@pytest.fixture
+def music(tmp_path):
+    """Carpeta con los archivos de la biblioteca (el importador omite los que no existen)."""
+    music_dir = tmp_path / "music"
+    music_dir.mkdir()
+    for name in ("a & b.mp3", "c.mp3"):
+        (music_dir / name).write_bytes(b"")
+    return str(music_dir)
+
+
+@pytest.fixture
+def library(library_db, music):
+    path_ab, path_c = os.path.join(music, "a & b.mp3"), os.path.join(music, "c.mp3")
+    upsert_tracks([
+        make_track(path_ab, title="Sunrise", artist="Artist A", bpm=124.0, key="8A", duration=300.0),
+        make_track(path_c, title="Night", artist="N/A", bpm="N/A", key="Dbm", duration=200.5),
+    ])
+    conn = sqlite3.connect(library_db)
+    try:
+        ids = dict(conn.execute("SELECT file_path, id FROM tracks"))
+        conn.execute("INSERT INTO cue_points(track_id, name, type, start, end, hotcue) VALUES(?, 'Drop', 'cue', 64.5, NULL, 0)",
+                     (ids[path_ab],))
+        conn.execute("INSERT INTO cue_points(track_id, name, type, start, end, hotcue) VALUES(?, NULL, 'loop', 96.0, 104.0, NULL)",
+                     (ids[path_ab],))
+        conn.execute("INSERT INTO playlists(id, name, date_added) VALUES(1, 'Friday', '2024-01-01')")
+        conn.executemany("INSERT INTO playlist_tracks(playlist_id, position, track_id) VALUES(1, ?, ?)",
+                         [(0, ids[path_c]), (1, ids[path_ab])])
+        conn.commit()
+    finally:
+        conn.close()
+    return library_db
+
+
+def test_rekordbox_round_trip(library, music, tmp_path, monkeypatch):
+    xml_path = tmp_path / "rekordbox.xml"
+    assert export_rekordbox_xml(str(xml_path)) == 2
+
+    # Se importa el XML en una biblioteca nueva
+    other_db = str(tmp_path / "other.db")
+    monkeypatch.setattr(database, "get_db_path", lambda: other_db)
+    database.init_db()
+    stats = import_rekordbox_xml(str(xml_path))
+
+    assert stats["tracks"] == 2 and stats["cues"] == 2 and stats["playlists"] == 1
+    assert _query(other_db, "SELECT file_path, title, bpm, key, duration FROM tracks ORDER BY file_path") == [
+        (os.path.join(music, "a & b.mp3"), "Sunrise", 124.0, "Am", 300.0),
+        (os.path.join(music, "c.mp3"), "Night", None, "Dbm", 200.0),  # Ya en notación musical
+    ]
+    assert _query(other_db, "SELECT name, type, start, end, hotcue FROM cue_points ORDER BY start") == [
+        ("Drop", "cue", 64.5, None, 0), (None, "loop", 96.0, 104.0, None)]
+    assert _query(other_db, """
+        SELECT p.name, t.file_path FROM playlist_tracks pt
+        JOIN playlists p ON p.id = pt.playlist_id JOIN tracks t ON t.id = pt.track_id ORDER BY pt.position
+    """) == [("Friday", os.path.join(music, "c.mp3")), ("Friday", os.path.join(music, "a & b.mp3"))]
+
+
+def test_camelot_keys_are_written_in_musical_notation(library, tmp_path):
+    xml_path = tmp_path / "rekordbox.xml"
+    export_rekordbox_xml(str(xml_path))
+
+    text = xml_path.read_text(encoding="utf-8")
+    assert 'Tonality="Am"' in text and 'Tonality="8A"' not in text
+
+
+def test_m3u8_export(library, music, tmp_path):
+    output_dir = tmp_path / "Playlists"
+    written = export_all_playlists_m3u8(str(output_dir), path_mapper=lambda path: "/usb/" + os.path.relpath(path, music))
+
+    assert written == [str(output_dir / "Friday.m3u8")]
+    assert (output_dir / "Friday.m3u8").read_text(encoding="utf-8").splitlines() == [
+        "#EXTM3U",
+        "#EXTINF:200,Night",
+        "/usb/c.mp3",
+        "#EXTINF:300,Artist A - Sunrise",
+        "/usb/a & b.mp3",
+    ]
+
+
+def test_database_error_fails_the_export(library, tmp_path, monkeypatch):
+    output_path = tmp_path / "set.m3u8"
+    output_path.write_text("#EXTM3U\nold.mp3\n", encoding="utf-8")
+    (tmp_path / "rekordbox.xml").write_text("<DJ_PLAYLISTS/>\n", encoding="utf-8")
+    monkeypatch.setattr(database, "get_db_path", lambda: str(tmp_path / "missing" / "library.db"))
+
+    with pytest.raises(sqlite3.Error):
+        export_m3u8(str(output_path), playlist_id=1)
+    with pytest.raises(sqlite3.Error):
+        export_rekordbox_xml(str(tmp_path / "rekordbox.xml"))
+
+    # Las exportaciones anteriores quedan intactas y no quedan temporales
+    assert output_path.read_text(encoding="utf-8") == "#EXTM3U\nold.mp3\n"
+    assert (tmp_path / "rekordbox.xml").read_text(encoding="utf-8") == "<DJ_PLAYLISTS/>\n"
+    assert sorted(os.listdir(tmp_path)) == ["library.db", "music", "rekordbox.xml", "set.m3u8"]
+
+
+def test_collection_count_matches_the_exported_tracks(library, tmp_path, monkeypatch):
+    # Un escaneo que añade una pista entre el recuento y la lectura de las pistas
+    real_iter_tracks = collection_exporter.iter_tracks
+
+    def iter_tracks_after_scan(*args, **kwargs):
+        upsert_tracks([make_track("/music/new.mp3")])
+        return real_iter_tracks(*args, **kwargs)
+
+    monkeypatch.setattr(collection_exporter, "iter_tracks", iter_tracks_after_scan)
+    xml_path = tmp_path / "rekordbox.xml"
+    count = export_rekordbox_xml(str(xml_path))
+
+    text = xml_path.read_text(encoding="utf-8")
+    assert count == 2 and f'<COLLECTION Entries="{count}">' in text and text.count("<TRACK TrackID=") == 2
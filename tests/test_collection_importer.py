@@ -0,0 +1,196 @@
+import os
+import sqlite3
+import wave
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from core.collection_importer import import_collection, import_m3u, import_rekordbox_xml, import_traktor_nml
+
+
+def _query(db_path, sql, params=()):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute(sql, params).fetchall()
+    finally:
+        conn.close()
+
+
+def _write_wav(path, seconds=0.1):
+    with wave.open(str(path), "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(8000)
+        f.writeframes(b"\0\0" * int(8000 * seconds))
+
+
+REKORDBOX_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<DJ_PLAYLISTS Version="1.0.0">
+  <COLLECTION Entries="2">
+    <TRACK TrackID="1" Name="{title}" Artist="Artist A" Album="Album" Genre="House" TotalTime="300"
+           AverageBpm="{bpm}" Tonality="Am" Location="file://localhost{path_a}">
+      <TEMPO Inizio="0.025" Bpm="124.00" Metro="4/4" Battito="1"/>
+      <POSITION_MARK Name="Drop" Type="0" Start="64.5" Num="0"/>
+      <POSITION_MARK Name="" Type="4" Start="96.0" End="104.0" Num="-1"/>
+    </TRACK>
+    <TRACK TrackID="2" Name="Second" Artist="Artist B" AverageBpm="0.00" Tonality=""
+           Location="file://localhost/music/missing%20file.mp3"/>
+  </COLLECTION>
+  <PLAYLISTS>
+    <NODE Type="0" Name="ROOT" Count="1">
+      <NODE Name="Sets" Type="0" Count="1">
+        <NODE Name="Friday" Type="1" KeyType="0" Entries="2">
+          <TRACK Key="2"/>
+          <TRACK Key="1"/>
+        </NODE>
+      </NODE>
+    </NODE>
+  </PLAYLISTS>
+</DJ_PLAYLISTS>
+"""
+
+
+def _write_rekordbox(path, path_a, title="First", bpm="124.00"):
+    path.write_text(REKORDBOX_XML.format(path_a=path_a, title=title, bpm=bpm), encoding="utf-8")
+
+
+def test_rekordbox_import(library_db, tmp_path):
+    audio_path = tmp_path / "a.wav"
+    _write_wav(audio_path)
+    xml_path = tmp_path / "rekordbox.xml"
+    _write_rekordbox(xml_path, str(audio_path))
+
+    stats = import_rekordbox_xml(str(xml_path))
+
+    # La pista cuyo archivo no existe no se importa (ni entra en la playlist)
+    assert stats["tracks"] == 1 and stats["missing"] == 1
+    assert stats["cues"] == 2 and stats["playlists"] == 1 and stats["entries"] == 1
+    tracks = _query(library_db, "SELECT id, file_path, title, bpm, key FROM tracks")
+    assert [row[1:] for row in tracks] == [(str(audio_path), "First", 124.0, "Am")]
+    assert _query(library_db, "SELECT name FROM playlists") == [("Sets/Friday",)]
+    assert _query(library_db, "SELECT track_id FROM playlist_tracks ORDER BY position") == [(tracks[0][0],)]
+    assert _query(library_db, "SELECT name, type, start, end, hotcue FROM cue_points ORDER BY start") == [
+        ("Drop", "cue", 64.5, None, 0), (None, "loop", 96.0, 104.0, None)]
+
+
+def test_unsupported_files_are_skipped(library_db, tmp_path):
+    cover = tmp_path / "cover.jpg"
+    cover.write_bytes(b"")
+    playlist_path = tmp_path / "set.m3u8"
+    playlist_path.write_text("#EXTM3U\ncover.jpg\n", encoding="utf-8")
+
+    stats = import_m3u(str(playlist_path))
+
+    assert stats["tracks"] == 0 and stats["unsupported"] == 1
+    assert _query(library_db, "SELECT COUNT(*) FROM tracks") == [(0,)]
+
+
+def test_parse_error_rolls_back_the_import(library_db, tmp_path):
+    audio_path = tmp_path / "a.wav"
+    _write_wav(audio_path)
+    xml_path = tmp_path / "rekordbox.xml"
+    _write_rekordbox(xml_path, str(audio_path))
+    # Archivo cortado a mitad de las playlists
+    text = xml_path.read_text(encoding="utf-8")
+    xml_path.write_text(text[:text.index("<TRACK Key=\"1\"")], encoding="utf-8")
+
+    with pytest.raises(ET.ParseError):
+        import_rekordbox_xml(str(xml_path), batch_size=1)
+
+    assert _query(library_db, "SELECT COUNT(*) FROM tracks") == [(0,)]
+    assert _query(library_db, "SELECT COUNT(*) FROM playlists") == [(0,)]
+
+
+def test_reimport_of_unchanged_file_applies_collection_metadata(library_db, tmp_path):
+    audio_path = tmp_path / "a.wav"
+    _write_wav(audio_path)
+    xml_path = tmp_path / "rekordbox.xml"
+
+    _write_rekordbox(xml_path, str(audio_path), title="First", bpm="124.00")
+    import_rekordbox_xml(str(xml_path))
+    _write_rekordbox(xml_path, str(audio_path), title="Edited In Rekordbox", bpm="125.00")
+    stats = import_rekordbox_xml(str(xml_path))
+
+    assert stats["unchanged"] == 1
+    assert _query(library_db, "SELECT title, bpm, genre FROM tracks WHERE file_path = ?", (str(audio_path),)) == [
+        ("Edited In Rekordbox", 125.0, "House")]
+    # Los cues no se duplican al reimportar
+    assert len(_query(library_db, "SELECT id FROM cue_points")) == 2
+
+
+def test_m3u_encoding_retry_does_not_queue_tracks_twice(library_db, tmp_path):
+    # Más de un búfer de lectura en UTF-8 válido y después un nombre en Latin-1
+    lines = ["#EXTM3U"] + [f"track_{i:04d}_with_a_reasonably_long_name.mp3" for i in range(300)]
+    for name in lines[1:] + ["canción.mp3"]:
+        (tmp_path / name).write_bytes(b"")
+    content = "\n".join(lines).encode("utf-8") + "\ncanción.mp3\n".encode("latin-1")
+    playlist_path = tmp_path / "set.m3u"
+    playlist_path.write_bytes(content)
+
+    stats = import_m3u(str(playlist_path), batch_size=50)
+
+    assert stats["tracks"] == 301
+    assert stats["entries"] == 301
+    assert _query(library_db, "SELECT COUNT(*) FROM tracks") == [(301,)]
+    assert _query(library_db, "SELECT COUNT(*) FROM tracks WHERE file_path = ?",
+                  (str(tmp_path / "canción.mp3"),)) == [(1,)]
+
+
+def test_m3u_extinf_fills_missing_files(library_db, tmp_path):
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "sub" / "x.mp3").write_bytes(b"")  # Sin tags legibles
+    playlist_path = tmp_path / "set.m3u8"
+    playlist_path.write_text("#EXTM3U\n#EXTINF:215,Artist X - Title Y\nsub/x.mp3\n", encoding="utf-8")
+
+    import_collection(str(playlist_path))
+
+    assert _query(library_db, "SELECT file_path, artist, title, duration FROM tracks") == [
+        (os.path.normpath(str(tmp_path / "sub" / "x.mp3")), "Artist X", "Title Y", 215.0)]
+
+
+TRAKTOR_NML = """<?xml version="1.0" encoding="UTF-8" standalone="no" ?>
+<NML VERSION="19">
+  <COLLECTION ENTRIES="1">
+    <ENTRY TITLE="Traktor Song" ARTIST="DJ T">
+      <LOCATION DIR="{dir}" FILE="t.mp3" VOLUME="" />
+      <ALBUM TITLE="LP" TRACK="3" />
+      <INFO GENRE="Techno" PLAYTIME="400" />
+      <TEMPO BPM="128.000061" />
+      <MUSICAL_KEY VALUE="21" />
+      <CUE_V2 NAME="AutoGrid" TYPE="4" START="10.0" LEN="0" HOTCUE="0" />
+      <CUE_V2 NAME="Intro" TYPE="0" START="1500.0" LEN="0" HOTCUE="1" />
+    </ENTRY>
+  </COLLECTION>
+  <PLAYLISTS>
+    <NODE TYPE="FOLDER" NAME="$ROOT">
+      <SUBNODES COUNT="1">
+        <NODE TYPE="PLAYLIST" NAME="Peak">
+          <PLAYLIST ENTRIES="1" TYPE="LIST">
+            <ENTRY><PRIMARYKEY TYPE="TRACK" KEY="{dir}t.mp3" /></ENTRY>
+          </PLAYLIST>
+        </NODE>
+      </SUBNODES>
+    </NODE>
+  </PLAYLISTS>
+</NML>
+"""
+
+
+def test_traktor_import(library_db, tmp_path):
+    music_dir = tmp_path / "music" / "house"
+    music_dir.mkdir(parents=True)
+    (music_dir / "t.mp3").write_bytes(b"")
+    nml_path = tmp_path / "collection.nml"
+    nml_path.write_text(TRAKTOR_NML.format(dir=str(music_dir).replace("/", "/:") + "/:"), encoding="utf-8")
+
+    stats = import_traktor_nml(str(nml_path))
+
+    assert stats["tracks"] == 1 and stats["cues"] == 1 and stats["entries"] == 1
+    # MUSICAL_KEY 21 = La menor (9 + 12) = 8A
+    assert _query(library_db, "SELECT file_path, title, album, genre, key FROM tracks") == [
+        (str(music_dir / "t.mp3"), "Traktor Song", "LP", "Techno", "8A")]
+    assert _query(library_db, "SELECT name, start, hotcue FROM cue_points") == [("Intro", 1.5, 1)]
+
+
+def test_unsupported_format(library_db, tmp_path):
+    assert import_collection(str(tmp_path / "library.txt")) is None
@@ -0,0 +1,163 @@
+import os
+import sqlite3
+
+import pytest
+
+from core import database, file_manager
+from core.database import delete_tracks, upsert_tracks
+from core.file_manager import CONTENTS_DIR, PLAYLISTS_DIR, _copy_file, sync_to_target
+
+from tests.conftest import make_track
+
+
+def _add_tracks(db_path, music_dir, names_by_artist):
+    """Crea los archivos y las pistas; devuelve {nombre: id}."""
+    tracks = []
+    for artist, names in names_by_artist.items():
+        for name in names:
+            path = music_dir / name
+            path.write_bytes(name.encode() * 100)
+            tracks.append(make_track(str(path), artist=artist))
+    upsert_tracks(tracks)
+    conn = sqlite3.connect(db_path)
+    try:
+        return {os.path.basename(path): track_id for track_id, path in conn.execute("SELECT id, file_path FROM tracks")}
+    finally:
+        conn.close()
+
+
+def _add_playlist(db_path, playlist_id, name, track_ids):
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute("INSERT INTO playlists(id, name, date_added) VALUES(?, ?, '2024-01-01')", (playlist_id, name))
+        conn.executemany("INSERT INTO playlist_tracks(playlist_id, position, track_id) VALUES(?, ?, ?)",
+                         [(playlist_id, position, track_id) for position, track_id in enumerate(track_ids)])
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def test_failed_copy_removes_partial_file(tmp_path, monkeypatch):
+    source = tmp_path / "a.mp3"
+    source.write_bytes(b"audio")
+    dest = tmp_path / "usb" / "a.mp3"
+
+    def fail_replace(src, dst):
+        raise OSError("No space left on device")
+
+    monkeypatch.setattr(file_manager.os, "replace", fail_replace)
+    with pytest.raises(OSError):
+        _copy_file(str(source), str(dest))
+
+    assert os.listdir(tmp_path / "usb") == []
+
+
+def test_copy_ignores_unsupported_timestamps(tmp_path, monkeypatch):
+    source = tmp_path / "a.mp3"
+    source.write_bytes(b"audio")
+    dest = tmp_path / "usb" / "a.mp3"
+
+    def fail_utime(*args, **kwargs):
+        raise PermissionError("Operation not permitted")
+
+    monkeypatch.setattr(file_manager.os, "utime", fail_utime)
+    _copy_file(str(source), str(dest))
+
+    assert dest.read_bytes() == b"audio"
+
+
+def test_resync_deletes_stale_files_and_empty_folders(library_db, tmp_path):
+    music = tmp_path / "music"
+    music.mkdir()
+    _add_tracks(library_db, music, {"Artist A": ["a.mp3"], "Artist B": ["b.mp3"]})
+    target = tmp_path / "usb"
+
+    summary = sync_to_target(str(target), write_playlists=False)
+    assert summary["copied"] == 2
+    assert sorted(os.listdir(target / CONTENTS_DIR)) == ["Artist A", "Artist B"]
+
+    delete_tracks([str(music / "b.mp3")])
+    summary = sync_to_target(str(target), write_playlists=False)
+
+    assert summary["skipped"] == 1 and summary["deleted"] == 1
+    assert os.listdir(target / CONTENTS_DIR) == ["Artist A"]
+
+
+def test_database_failure_leaves_target_intact(library_db, tmp_path, monkeypatch):
+    music = tmp_path / "music"
+    music.mkdir()
+    _add_tracks(library_db, music, {"Artist A": ["a.mp3"], "Artist B": ["b.mp3"]})
+    target = tmp_path / "usb"
+    sync_to_target(str(target))
+    before = sorted(os.path.relpath(os.path.join(root, name), target)
+                    for root, _, names in os.walk(target) for name in names)
+
+    monkeypatch.setattr(database, "get_db_path", lambda: str(tmp_path / "missing" / "library.db"))
+    summary = sync_to_target(str(target))
+
+    assert summary["errors"] == 1 and summary["deleted"] == 0
+    after = sorted(os.path.relpath(os.path.join(root, name), target)
+                   for root, _, names in os.walk(target) for name in names)
+    assert after == before
+
+
+def test_playlist_sync_keeps_copies_of_other_playlists(library_db, tmp_path):
+    music = tmp_path / "music"
+    music.mkdir()
+    ids = _add_tracks(library_db, music, {"Artist A": ["a.mp3", "b.mp3"], "Artist B": ["c.mp3"]})
+    _add_playlist(library_db, 1, "Warmup", [ids["a.mp3"], ids["b.mp3"]])
+    _add_playlist(library_db, 2, "Peak", [ids["b.mp3"], ids["c.mp3"]])
+    target = tmp_path / "usb"
+
+    sync_to_target(str(target), playlist_ids=[1])
+    summary = sync_to_target(str(target), playlist_ids=[2])
+
+    assert summary["deleted"] == 0
+    assert sorted(os.listdir(target / PLAYLISTS_DIR)) == ["Peak.m3u8", "Warmup.m3u8"]
+    assert sorted(os.listdir(target / CONTENTS_DIR / "Artist A")) == ["a.mp3", "b.mp3"]
+
+    # Al quitar una pista de Peak se borra solo si ninguna otra playlist sincronizada la usa
+    conn = sqlite3.connect(library_db)
+    conn.execute("DELETE FROM playlist_tracks WHERE playlist_id = 2")
+    conn.commit()
+    conn.close()
+    summary = sync_to_target(str(target), playlist_ids=[2])
+
+    assert summary["deleted"] == 1
+    assert not (target / CONTENTS_DIR / "Artist B").exists()
+    assert sorted(os.listdir(target / CONTENTS_DIR / "Artist A")) == ["a.mp3", "b.mp3"]
+
+
+def test_full_sync_removes_playlists_deleted_from_the_library(library_db, tmp_path):
+    music = tmp_path / "music"
+    music.mkdir()
+    ids = _add_tracks(library_db, music, {"Artist A": ["a.mp3"]})
+    _add_playlist(library_db, 1, "Warmup", [ids["a.mp3"]])
+    _add_playlist(library_db, 2, "Peak", [ids["a.mp3"]])
+    target = tmp_path / "usb"
+    sync_to_target(str(target))
+
+    conn = sqlite3.connect(library_db)
+    conn.execute("DELETE FROM playlist_tracks WHERE playlist_id = 2")
+    conn.execute("DELETE FROM playlists WHERE id = 2")
+    conn.commit()
+    conn.close()
+    sync_to_target(str(target))
+
+    assert os.listdir(target / PLAYLISTS_DIR) == ["Warmup.m3u8"]
+
+
+def test_track_sync_writes_only_playlists_with_those_tracks(library_db, tmp_path):
+    music = tmp_path / "music"
+    music.mkdir()
+    ids = _add_tracks(library_db, music, {"Artist A": ["a.mp3", "b.mp3"], "Artist B": ["c.mp3"]})
+    _add_playlist(library_db, 1, "Warmup", [ids["a.mp3"], ids["c.mp3"]])
+    _add_playlist(library_db, 2, "Peak", [ids["b.mp3"]])
+    target = tmp_path / "usb"
+
+    sync_to_target(str(target), track_ids=[ids["a.mp3"]])
+
+    assert os.listdir(target / PLAYLISTS_DIR) == ["Warmup.m3u8"]
+    lines = (target / PLAYLISTS_DIR / "Warmup.m3u8").read_text(encoding="utf-8").splitlines()
+    assert lines[2] == os.path.join("..", CONTENTS_DIR, "Artist A", "a.mp3")
+    assert len(lines) == 3
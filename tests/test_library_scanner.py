@@ -0,0 +1,70 @@
+import wave
+
+from core import database, file_discovery, library_scanner
+from core.database import iter_tracks
+from core.library_scanner import scan_directory
+
+
+def _write_wav(path, seconds=0.1):
+    with wave.open(str(path), "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(8000)
+        f.writeframes(b"\0\0" * int(8000 * seconds))
+
+
+def _music_dir(tmp_path, count):
+    music = tmp_path / "music"
+    for i in range(count):
+        folder = music / f"album_{i % 3}"
+        folder.mkdir(parents=True, exist_ok=True)
+        _write_wav(folder / f"track_{i}.wav")
+    return music
+
+
+def test_scan_reuses_one_connection_and_reports_progress(library_db, tmp_path, monkeypatch):
+    music = _music_dir(tmp_path, 12)
+    real_connection = database.create_connection
+    opened = []
+
+    def counting_connection():
+        opened.append(1)
+        return real_connection()
+
+    for module in (database, file_discovery, library_scanner):
+        monkeypatch.setattr(module, "create_connection", counting_connection)
+    calls = []
+
+    processed = scan_directory(str(music), progress=lambda done, total, path: calls.append((done, total)))
+
+    # Registro de la raíz, caché de carpetas (cargar y guardar) y el propio escaneo
+    assert len(opened) == 4
+    assert processed == 12
+    assert len(list(iter_tracks(["id"]))) == 12
+    assert [done for done, _ in calls] == list(range(1, 13)) + [12]
+    assert calls[-1] == (12, 12) and all(total is None for _, total in calls[:-1])
+
+
+def test_rescan_skips_unchanged_files(library_db, tmp_path):
+    music = _music_dir(tmp_path, 4)
+    assert scan_directory(str(music)) == 4
+    assert scan_directory(str(music), full_rescan=True) == 0
+
+
+def test_failed_files_are_not_counted_and_their_folder_is_retried(library_db, tmp_path, monkeypatch):
+    music = _music_dir(tmp_path, 6)
+    broken = music / "album_0" / "broken.wav"
+    broken.write_bytes(b"not a wav file")
+    monkeypatch.setattr(file_discovery, "_RECENT_CHANGE_WINDOW", 0.0)  # Carpetas recién creadas
+
+    assert scan_directory(str(music)) == 6
+    assert len(list(iter_tracks(["id"]))) == 6
+
+    # Las carpetas sin errores quedan en caché; la del archivo roto se vuelve a listar
+    listed = []
+    real_scandir = file_discovery.os.scandir
+    monkeypatch.setattr(file_discovery.os, "scandir", lambda path: listed.append(path) or real_scandir(path))
+    scan_directory(str(music))
+
+    assert str(music / "album_0") in listed
+    assert str(music / "album_1") not in listed
@@ -0,0 +1,97 @@
+import csv
+import json
+import os
+import sqlite3
+
+import pytest
+
+from core import database
+from core.database import iter_tracks, upsert_track
+from core.library_stats import (
+    export_tracks_csv, export_tracks_json, get_distribution, get_library_overview, iter_tracks_missing,
+)
+
+from tests.conftest import make_track
+
+
+@pytest.fixture
+def library(library_db):
+    for track in [
+        make_track("/m/a.mp3", genre="House", bpm=124.0, key="8A", duration=300.0),
+        make_track("/m/b.mp3", genre="House", bpm=126.0, key="N/A", duration=200.0),
+        make_track("/m/c.mp3", genre="Techno", bpm="N/A", key="9A", duration=100.0),
+    ]:
+        upsert_track(track)
+    return library_db
+
+
+class _FailingCursor:
+    """Cursor que falla al pedir el segundo lote, como un error de disco a mitad de lectura."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self._batches = 0
+
+    def execute(self, *args):
+        self._cursor.execute(*args)
+        return self
+
+    def fetchmany(self, size):
+        self._batches += 1
+        if self._batches > 1:
+            raise sqlite3.OperationalError("disk I/O error")
+        return self._cursor.fetchmany(size)
+
+
+class _FailingConnection:
+    def __init__(self, conn):
+        self._conn = conn
+
+    def cursor(self):
+        return _FailingCursor(self._conn.cursor())
+
+    def close(self):
+        self._conn.close()
+
+
+def test_overview_and_distribution(library):
+    overview = get_library_overview()
+    assert overview == {"total_tracks": 3, "total_duration": 600.0, "missing_bpm": 1, "missing_key": 1}
+    assert sorted(get_distribution("genre")) == [("House", 2, 500.0), ("Techno", 1, 100.0)]
+    assert [row[1] for row in iter_tracks_missing("bpm")] == ["/m/c.mp3"]
+
+
+def test_export_csv_and_json(library, tmp_path):
+    csv_path = tmp_path / "tracks.csv"
+    json_path = tmp_path / "tracks.json"
+
+    assert export_tracks_csv(str(csv_path), columns=["file_path", "genre"]) == 3
+    assert export_tracks_json(str(json_path), columns=["file_path", "genre"]) == 3
+
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        assert list(csv.reader(f)) == [["file_path", "genre"], ["/m/a.mp3", "House"],
+                                       ["/m/b.mp3", "House"], ["/m/c.mp3", "Techno"]]
+    with open(json_path, encoding="utf-8") as f:
+        assert json.load(f)[2] == {"file_path": "/m/c.mp3", "genre": "Techno"}
+
+
+def test_iter_tracks_rejects_unknown_columns(library):
+    with pytest.raises(ValueError):
+        list(iter_tracks(["file_path", "no_such_column"]))
+
+
+def test_database_error_during_export_propagates(library, tmp_path, monkeypatch):
+    for i in range(1500):
+        upsert_track(make_track(f"/m/bulk/{i}.mp3"))
+    real_connection = database.create_connection
+    monkeypatch.setattr(database, "create_connection", lambda: _FailingConnection(real_connection()))
+
+    output_path = tmp_path / "tracks.csv"
+    output_path.write_text("exportación anterior\n", encoding="utf-8")
+
+    with pytest.raises(sqlite3.Error):
+        export_tracks_csv(str(output_path))
+
+    # El archivo anterior queda intacto y no quedan temporales
+    assert output_path.read_text(encoding="utf-8") == "exportación anterior\n"
+    assert sorted(os.listdir(tmp_path)) == ["library.db", "tracks.csv"]
@@ -0,0 +1,152 @@
+import os
+import sqlite3
+import struct
+
+from core import library_watcher
+from core.database import add_track, move_tracks
+from core.library_scanner import prune_missing_tracks
+from core.library_watcher import (
+    FileEvent, InotifyBackend, LibraryWatcher, MOVE_PAIR_WINDOW,
+    IN_CLOSE_WRITE, IN_DELETE, IN_MOVED_FROM, IN_MOVED_TO, IN_Q_OVERFLOW,
+)
+
+from tests.conftest import make_track
+
+
+def _backend(watches):
+    """InotifyBackend sin descriptor real, para alimentarlo con bloques de eventos."""
+    backend = InotifyBackend.__new__(InotifyBackend)
+    backend._wd_to_path = dict(watches)
+    backend._path_to_wd = {path: wd for wd, path in watches.items()}
+    backend._moved_from = {}
+    return backend
+
+
+def _event(wd, mask, name, cookie=0):
+    raw_name = name.encode() + b"\0" * (16 - len(name.encode()) % 16)
+    return struct.pack("iIII", wd, mask, cookie, len(raw_name)) + raw_name
+
+
+def test_move_split_across_reads_is_paired():
+    backend = _backend({1: "/music/a", 2: "/music/b"})
+
+    assert backend._parse_events(_event(1, IN_MOVED_FROM, "song.mp3", cookie=7), now=100.0) == []
+    events = backend._parse_events(_event(2, IN_MOVED_TO, "song.mp3", cookie=7), now=100.1)
+
+    assert events == [FileEvent("moved", "/music/a/song.mp3", "/music/b/song.mp3", False)]
+
+
+def test_unpaired_move_expires_after_window():
+    backend = _backend({1: "/music/a"})
+
+    backend._parse_events(_event(1, IN_MOVED_FROM, "song.mp3", cookie=3), now=10.0)
+    assert backend._parse_events(b"", now=10.0 + MOVE_PAIR_WINDOW / 2) == []
+    events = backend._parse_events(b"", now=10.0 + MOVE_PAIR_WINDOW)
+
+    assert events == [FileEvent("moved_away", "/music/a/song.mp3", None, False)]
+
+
+def test_overflow_and_plain_events():
+    backend = _backend({1: "/music"})
+    buffer = (_event(-1, IN_Q_OVERFLOW, "") + _event(1, IN_CLOSE_WRITE, "x.mp3")
+              + _event(1, IN_DELETE, "y.mp3"))
+
+    assert backend._parse_events(buffer, now=0.0) == [
+        FileEvent("rescan", None, None, True),
+        FileEvent("modified", "/music/x.mp3", None, False),
+        FileEvent("deleted", "/music/y.mp3", None, False),
+    ]
+
+
+def _track_paths(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return sorted(path for (path,) in conn.execute("SELECT file_path FROM tracks"))
+    finally:
+        conn.close()
+
+
+class _Recorder:
+    """Sustituye las operaciones de base de datos del watcher y anota las llamadas."""
+
+    def __init__(self, monkeypatch):
+        self.moves, self.deleted, self.processed, self.scanned, self.pruned = [], [], [], [], []
+        monkeypatch.setattr(library_watcher, "move_tracks", lambda moves: self.moves.extend(moves))
+        monkeypatch.setattr(library_watcher, "delete_tracks", lambda paths: self.deleted.extend(paths))
+        monkeypatch.setattr(library_watcher, "delete_tracks_under", lambda path: self.deleted.append(path))
+        monkeypatch.setattr(library_watcher, "process_file",
+                            lambda path, update_existing=False: self.processed.append(path))
+        monkeypatch.setattr(library_watcher, "scan_directory",
+                            lambda path, full_rescan=False: self.scanned.append((path, full_rescan)))
+        monkeypatch.setattr(library_watcher, "prune_missing_tracks", lambda path: self.pruned.append(path))
+        monkeypatch.setattr(os.path, "isfile", lambda path: True)
+
+
+def test_batch_coalesces_events(monkeypatch):
+    calls = _Recorder(monkeypatch)
+    watcher = LibraryWatcher()
+    watcher._apply_batch([
+        FileEvent("created", "/m/new.mp3", None, False),
+        FileEvent("modified", "/m/new.mp3", None, False),
+        FileEvent("created", "/m/temp.mp3", None, False),
+        FileEvent("deleted", "/m/temp.mp3", None, False),
+        FileEvent("moved", "/m/old.mp3", "/m/renamed.mp3", False),
+    ])
+
+    assert calls.processed == ["/m/new.mp3"]
+    assert calls.deleted == ["/m/temp.mp3"]
+    assert calls.moves == [("/m/old.mp3", "/m/renamed.mp3", False)]
+
+
+def test_move_into_new_directory_keeps_track(monkeypatch):
+    calls = _Recorder(monkeypatch)
+    watcher = LibraryWatcher()
+    watcher._apply_batch([
+        FileEvent("created", "/m/new_dir/song.mp3", None, False),
+        FileEvent("moved_away", "/m/song.mp3", None, False),
+    ])
+
+    assert calls.moves == [("/m/song.mp3", "/m/new_dir/song.mp3", False)]
+    assert calls.deleted == []
+    assert calls.processed == []
+
+
+def test_overflow_rescans_and_prunes(monkeypatch):
+    calls = _Recorder(monkeypatch)
+    watcher = LibraryWatcher(roots=["/m"])
+    watcher._apply_batch([FileEvent("rescan", None, None, True)])
+
+    assert calls.scanned == [(os.path.abspath("/m"), True)]
+    assert calls.pruned == [os.path.abspath("/m")]
+
+
+def test_prune_missing_tracks(library_db, tmp_path):
+    existing = tmp_path / "music" / "kept.mp3"
+    existing.parent.mkdir()
+    existing.write_bytes(b"")
+    add_track(make_track(str(existing)))
+    add_track(make_track(str(tmp_path / "music" / "gone.mp3")))
+    add_track(make_track(str(tmp_path / "other" / "gone.mp3")))
+
+    assert prune_missing_tracks(str(tmp_path / "music")) == 1
+    assert _track_paths(library_db) == sorted([str(existing), str(tmp_path / "other" / "gone.mp3")])
+
+
+def test_move_tracks_applies_each_move_independently(library_db):
+    for path in ["/m/a.mp3", "/m/b.mp3", "/m/dir/c.mp3", "/m/dir/d.mp3", "/m/other/d.mp3", "/m/dir.mp3", "/m/e.mp3"]:
+        add_track(make_track(path))
+    conn = sqlite3.connect(library_db)
+    conn.execute("""
+        CREATE TRIGGER reject_move BEFORE UPDATE OF file_path ON tracks WHEN NEW.file_path = '/m/bad.mp3'
+        BEGIN SELECT RAISE(ABORT, 'rechazado'); END
+    """)
+    conn.commit()
+    conn.close()
+
+    move_tracks([
+        ("/m/a.mp3", "/m/b.mp3", False),    # Sobrescribe b.mp3
+        ("/m/e.mp3", "/m/bad.mp3", False),  # Falla: solo se deshace este movimiento
+        ("/m/dir", "/m/other", True),       # Fusiona con una carpeta existente
+    ])
+
+    assert _track_paths(library_db) == ["/m/b.mp3", "/m/dir.mp3", "/m/e.mp3", "/m/other/c.mp3", "/m/other/d.mp3"]
@@ -0,0 +1,26 @@
+import wave
+
+from mutagen.id3 import APIC
+from mutagen.wave import WAVE
+
+from core.metadata_reader import read_metadata
+
+
+def _write_wav_with_cover(path, image_data):
+    with wave.open(str(path), "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(8000)
+        f.writeframes(b"\0\0" * 800)
+    audio = WAVE(str(path))
+    audio.add_tags()
+    audio.tags.add(APIC(encoding=3, mime="image/jpeg", type=3, desc="", data=image_data))
+    audio.save()
+
+
+def test_artwork_is_only_read_on_request(tmp_path):
+    path = tmp_path / "cover.wav"
+    _write_wav_with_cover(path, b"\xff\xd8jpeg")
+
+    assert "artwork" not in read_metadata(str(path))
+    assert read_metadata(str(path), include_artwork=True)["artwork"] == b"\xff\xd8jpeg"
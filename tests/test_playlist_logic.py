@@ -0,0 +1,165 @@
+import numpy as np
+import pytest
+
+from core.playlist_logic import (
+    CompatibilityIndex, SetOrderOptimizer, build_transition_costs, camelot_to_key_name, compatible_keys,
+    format_camelot, order_set, parse_bpm, parse_camelot,
+)
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("8A", (8, "A")),
+    ("08b", (8, "B")),
+    ("12 A", (12, "A")),
+    ("1m", (8, "A")),     # Open Key: 1m = Am = 8A
+    ("1d", (8, "B")),     # 1d = C = 8B
+    ("6d", (1, "B")),     # 6d = B = 1B
+    ("Am", (8, "A")),
+    ("A minor", (8, "A")),
+    ("C", (8, "B")),
+    ("C#m", (12, "A")),
+    ("Dbmaj", (3, "B")),
+    ("F#", (2, "B")),
+    ("Ebm", (2, "A")),
+])
+def test_parse_camelot(text, expected):
+    assert parse_camelot(text) == expected
+
+
+@pytest.mark.parametrize("text", [None, "", "N/A", "13A", "H", "8C"])
+def test_parse_camelot_rejects_invalid(text):
+    assert parse_camelot(text) is None
+
+
+def test_camelot_to_key_name_round_trip():
+    for number in range(1, 13):
+        for letter in "AB":
+            name = camelot_to_key_name((number, letter))
+            assert parse_camelot(name) == (number, letter), name
+    assert camelot_to_key_name((8, "A")) == "Am"
+    assert format_camelot((8, "A")) == "8A"
+
+
+def test_parse_bpm():
+    assert parse_bpm("128") == 128.0
+    assert parse_bpm("127,5") == 127.5
+    assert parse_bpm("N/A") is None
+    assert parse_bpm(0) is None
+
+
+def test_compatible_keys_wrap_around_the_wheel():
+    assert compatible_keys((12, "A")) == {(12, "A"): 1.0, (1, "A"): 0.9, (11, "A"): 0.9,
+                                          (12, "B"): 0.85, (2, "A"): 0.6}
+
+
+def _index(tracks):
+    index = CompatibilityIndex()
+    for track_id, key, bpm in tracks:
+        index.add_or_update_track(track_id, key, bpm)
+    return index
+
+
+def test_recommend_prefers_same_key_and_close_bpm():
+    index = _index([
+        (1, "8A", 128), (2, "8A", 128.5), (3, "9A", 128), (4, "8A", 135),
+        (5, "3B", 128), (6, "8A", 64), (7, "8A", 160),
+    ])
+    results = index.recommend(1, limit=10)
+    ids = [result["id"] for result in results]
+
+    assert ids[0] == 2
+    assert set(ids) == {2, 3, 4, 6}  # 3B no es compatible y 160 queda fuera de la ventana
+    assert next(r for r in results if r["id"] == 6)["tempo_ratio"] == 0.5
+
+
+def test_recommend_with_zero_tolerance_matches_exact_bpm():
+    index = _index([(1, "8A", 128), (2, "8A", 128), (3, "8A", 128.1)])
+
+    results = index.recommend(1, bpm_tolerance=0, allow_half_double=False)
+
+    assert [result["id"] for result in results] == [2]
+    assert results[0]["score"] == 1.0
+
+
+def test_incremental_updates():
+    index = _index([(1, "8A", 128), (2, "8A", 128)])
+    index.add_or_update_track(2, "3B", 128)
+    assert index.recommend(1) == []
+    index.add_or_update_track(2, "8A", 127)
+    assert [result["id"] for result in index.recommend(1)] == [2]
+    index.remove_track(2)
+    assert len(index) == 1 and 2 not in index
+
+
+# --- Ordenación de sets --------------------------------------------------------
+
+def _line_costs(positions):
+    positions = np.asarray(positions, dtype=np.float64)
+    return np.abs(positions[:, None] - positions[None, :]).astype(np.float32)
+
+
+def test_transition_costs_are_symmetric():
+    camelots = [parse_camelot(k) for k in ("8A", "9A", "10A", "8B", None, "3B")]
+    bpms = [128, 126, 140, None, 120, 64]
+    costs = build_transition_costs(camelots, bpms)
+
+    assert np.allclose(costs, costs.T)
+    assert np.all(np.diag(costs) == 0)
+
+
+def test_transition_costs_weighting():
+    camelots = [(8, "A"), (8, "A"), (3, "B")]
+    bpms = [128, 140, 128]
+
+    key_only = build_transition_costs(camelots, bpms, key_weight=1.0, bpm_weight=0.0)
+    bpm_only = build_transition_costs(camelots, bpms, key_weight=0.0, bpm_weight=1.0)
+    both = build_transition_costs(camelots, bpms, key_weight=2.0, bpm_weight=3.0)
+
+    assert key_only[0, 1] == 0.0 and key_only[0, 2] > 0.5           # misma tonalidad / choque
+    assert bpm_only[0, 2] == 0.0 and bpm_only[0, 1] > 1.0           # mismo BPM / salto del 9%
+    assert np.allclose(both, 2.0 * key_only + 3.0 * bpm_only)
+
+
+def test_half_double_tempo_is_cheaper_than_a_big_jump():
+    costs = build_transition_costs([(8, "A")] * 3, [128, 64, 96], key_weight=0.0)
+    assert costs[0, 1] < costs[0, 2]
+
+
+def test_two_opt_reverses_a_segment_at_the_start():
+    optimizer = SetOrderOptimizer(_line_costs([0, 1, 2, 3]))
+    order = np.array([1, 0, 2, 3])
+
+    assert optimizer._two_opt_pass(order, deadline=float("inf"))
+    assert optimizer.order_cost(order) == 3.0
+
+
+def test_or_opt_moves_a_misplaced_track():
+    optimizer = SetOrderOptimizer(_line_costs([0, 1, 2, 3, 4]))
+    order = np.array([0, 3, 1, 2, 4])
+
+    assert optimizer._or_opt_pass(order, deadline=float("inf"))
+    assert optimizer.order_cost(order) == 4.0
+
+
+def test_local_search_improves_nearest_neighbour():
+    rng = np.random.default_rng(3)
+    points = rng.random((80, 2))
+    costs = np.linalg.norm(points[:, None] - points[None, :], axis=2).astype(np.float32)
+    optimizer = SetOrderOptimizer(costs)
+
+    greedy_cost = optimizer.order_cost(optimizer._nearest_neighbour())
+    order = optimizer.run(time_limit=5.0)
+
+    assert sorted(order) == list(range(80))
+    assert optimizer.best_cost < greedy_cost - 1e-3
+
+
+def test_order_set_keeps_every_track():
+    tracks = [{"id": i, "key": key, "bpm": bpm} for i, (key, bpm) in
+              enumerate([("8A", 128), ("3B", 90), ("9A", 127), ("8A", 126), ("4B", 92), ("8B", 125)])]
+    ordered = order_set(tracks, time_limit=1.0, energy_weight=0.0)
+
+    assert sorted(track["id"] for track in ordered) == list(range(6))
+    # Las dos pistas cerca de 90 BPM acaban juntas
+    positions = {track["id"]: position for position, track in enumerate(ordered)}
+    assert abs(positions[1] - positions[4]) == 1
@@ -0,0 +1,78 @@
+import os
+import sqlite3
+
+import numpy as np
+import pytest
+
+from core import similarity_index
+from core.audio_analysis import FEATURE_SIZE, _pending_tracks
+from core.database import upsert_tracks
+from core.similarity_index import SimilarityIndex, build_index
+
+from tests.conftest import make_track
+
+
+@pytest.fixture
+def analyzed_library(library_db, monkeypatch):
+    """Biblioteca con cinco pistas analizadas: 0-2 parecidas entre sí, 3-4 distintas."""
+    monkeypatch.setattr(similarity_index, "get_db_path", lambda: library_db)
+    upsert_tracks([make_track(f"/m/{i}.mp3") for i in range(6)])
+    rng = np.random.default_rng(1)
+    base = rng.normal(size=(2, FEATURE_SIZE))
+    vectors = [base[0] + rng.normal(scale=0.05, size=FEATURE_SIZE) for _ in range(3)]
+    vectors += [base[1] + rng.normal(scale=0.05, size=FEATURE_SIZE) for _ in range(2)]
+
+    conn = sqlite3.connect(library_db)
+    try:
+        ids = [track_id for (track_id,) in conn.execute("SELECT id FROM tracks ORDER BY id")]
+        conn.executemany(
+            "INSERT INTO track_analysis(track_id, waveform, source_mtime, analyzed_date, features) VALUES(?, ?, 1.0, 1.0, ?)",
+            [(track_id, b"w", vector.astype(np.float32).tobytes()) for track_id, vector in zip(ids, vectors)]
+            # Pista demasiado corta: analizada, sin vector
+            + [(ids[5], b"", b"")]
+        )
+        conn.commit()
+    finally:
+        conn.close()
+    return library_db, ids
+
+
+def test_similar_tracks(analyzed_library):
+    _, ids = analyzed_library
+    index = build_index()
+
+    assert len(index) == 5
+    assert {track_id for track_id, _ in index.similar(ids[0], count=2)} == {ids[1], ids[2]}
+    assert index.similar(ids[5]) == []
+
+
+def test_rebuild_writes_a_new_vectors_file(analyzed_library):
+    _, ids = analyzed_library
+    first = build_index()
+    index_dir = similarity_index.get_index_dir()
+    first_files = os.listdir(index_dir)
+
+    second = build_index()
+
+    # El índice anterior sigue siendo utilizable y el archivo viejo se ha limpiado
+    assert first.similar(ids[3], count=1)[0][0] == ids[4]
+    files = os.listdir(index_dir)
+    assert len([name for name in files if name.endswith(".npy")]) == 1
+    assert set(files) != set(first_files)
+    assert SimilarityIndex.load().similar(ids[3], count=1) == second.similar(ids[3], count=1)
+
+
+def test_pending_tracks_skip_analysed_tracks_without_features(analyzed_library):
+    db_path, ids = analyzed_library
+    conn = sqlite3.connect(db_path)
+    try:
+        # Analizada antes de que existiera el vector de timbre
+        conn.execute("UPDATE track_analysis SET features = NULL WHERE track_id = ?", (ids[0],))
+        # Análisis fallido: se registra sin forma de onda ni vector
+        conn.execute("UPDATE track_analysis SET waveform = NULL, features = NULL WHERE track_id = ?", (ids[1],))
+        conn.commit()
+        pending = [track_id for track_id, _, _ in _pending_tracks(conn)]
+    finally:
+        conn.close()
+
+    assert pending == [ids[0]]
@@ -0,0 +1,58 @@
+import pytest
+
+from core.database import upsert_tracks
+from core.track_store import TrackStore
+
+from tests.conftest import make_track
+
+
+@pytest.fixture
+def store(library_db):
+    upsert_tracks([
+        make_track("/m/house/a.mp3", title="Sunrise", artist="Bravo", album="One", track_number="10", bpm=124.0),
+        make_track("/m/house/b.mp3", title="Night Drive", artist="alpha", album="One", track_number="2", bpm="N/A"),
+        make_track("/m/techno/c.mp3", title="Warehouse", artist="N/A", genre="Techno", track_number="1", bpm=132.0),
+        make_track("/m/techno/d.mp3", title="Ñandú", artist="Charlie", album="Two", bpm=90.0),
+    ])
+    return TrackStore.from_database()
+
+
+def _paths(store, rows):
+    return [store.value(row, "file_path").rsplit("/", 1)[1] for row in rows]
+
+
+def test_values_and_lookup(store):
+    assert len(store) == 4
+    row = store.row_of(int(store.ids[2]))
+    assert store.value(row, "title") == "Warehouse"
+    assert store.value(row, "bpm") == 132.0
+    assert store.row_of(9999) is None
+
+
+def test_filter_is_case_insensitive(store):
+    assert _paths(store, store.filter("HOUSE")) == ["c.mp3"]   # "Warehouse"; la carpeta no cuenta
+    assert _paths(store, store.filter("techno")) == ["c.mp3"]
+    assert _paths(store, store.filter("ñandú")) == ["d.mp3"]
+    assert _paths(store, store.filter("  ")) == ["a.mp3", "b.mp3", "c.mp3", "d.mp3"]
+
+
+def test_sort_puts_missing_values_last_in_both_directions(store):
+    assert _paths(store, store.argsort("bpm")) == ["d.mp3", "a.mp3", "c.mp3", "b.mp3"]
+    assert _paths(store, store.argsort("bpm", descending=True)) == ["c.mp3", "a.mp3", "d.mp3", "b.mp3"]
+    assert _paths(store, store.argsort("artist"))[-1] == "c.mp3"
+    assert _paths(store, store.argsort("artist", descending=True))[-1] == "c.mp3"
+
+
+def test_sort_by_several_columns_and_numeric_text(store):
+    assert _paths(store, store.argsort(["album", "track_number"])) == ["b.mp3", "a.mp3", "d.mp3", "c.mp3"]
+
+
+def test_sort_within_a_filter(store):
+    rows = store.filter("one")  # Álbum "One"
+    assert _paths(store, store.argsort("track_number", rows=rows)) == ["b.mp3", "a.mp3"]
+
+
+def test_set_value_updates_sorting(store):
+    row = store.row_of(int(store.ids[3]))
+    store.set_value(row, "bpm", "150")
+    assert _paths(store, store.argsort("bpm"))[-2] == "d.mp3"
@@ -0,0 +1,91 @@
+import tkinter as tk
+from types import SimpleNamespace
+
+import pytest
+
+from core.database import delete_tracks, upsert_tracks
+from core.playlist_logic import CompatibilityIndex
+from core.track_store import TrackStore
+from ui.tracklist import Tracklist
+
+from tests.conftest import make_track
+
+
+@pytest.fixture
+def tracklist(library_db):
+    try:
+        root = tk.Tk()
+    except tk.TclError:
+        pytest.skip("Sin pantalla para Tk")
+    root.withdraw()
+    upsert_tracks([make_track(f"/m/{name}.mp3", title=name) for name in ("alpha", "beta", "gamma")])
+    widget = Tracklist(root, waveform_callback=None)
+    yield widget
+    root.destroy()
+
+
+def test_reload_after_filter_keeps_hidden_tracks(tracklist):
+    tracklist.apply_filter("beta")
+    assert len(tracklist.get_children()) == 1
+
+    tracklist.load_data()  # Antes fallaba con "Item ... already exists"
+
+    assert len(tracklist.get_children()) == 1
+    tracklist.apply_filter("")
+    assert len(tracklist.get_children()) == 3
+
+
+def test_reload_with_new_tracks_after_filter(tracklist):
+    tracklist.apply_filter("gamma")
+    upsert_tracks([make_track("/m/delta.mp3", title="delta")])
+
+    tracklist.load_data()
+    tracklist.apply_filter("")
+
+    assert sorted(tracklist.item(item, "values")[0] for item in tracklist.get_children()) == [
+        "alpha", "beta", "delta", "gamma"]
+
+
+def test_reload_after_related_view(tracklist):
+    alpha, beta, gamma = (int(item) for item in tracklist.get_children())
+    tracklist._show_related(alpha, [gamma])
+    assert len(tracklist.get_children()) == 2
+
+    tracklist.load_data()
+
+    assert len(tracklist.get_children()) == 3
+
+
+def test_similarity_index_from_before_a_reload_is_discarded(tracklist):
+    alpha = int(tracklist.get_children()[0])
+    stale_index = object()
+    tracklist.similar_queue.put((tracklist.load_generation, stale_index, alpha, []))
+    tracklist.load_data()
+
+    tracklist.process_similar_queue()
+
+    assert tracklist.similarity_index is None
+
+
+def test_reload_updates_compatibility_index_incrementally(library_db):
+    upsert_tracks([
+        make_track("/m/a.mp3", key="8A", bpm=124.0),
+        make_track("/m/b.mp3", key="8A", bpm=125.0),
+        make_track("/m/c.mp3", key="9A", bpm=126.0),
+    ])
+    widget = SimpleNamespace(compatibility_index=CompatibilityIndex())
+    old_store = TrackStore()
+    store = TrackStore.from_database()
+    Tracklist._update_compatibility_index(widget, old_store, store)
+    index = widget.compatibility_index
+    ids = {store.value(row, "file_path"): int(store.ids[row]) for row in range(len(store))}
+
+    delete_tracks(["/m/b.mp3"])
+    upsert_tracks([make_track("/m/c.mp3", key="N/A", bpm=126.0), make_track("/m/d.mp3", key="8A", bpm=123.0)])
+    old_store, store = store, TrackStore.from_database()
+    Tracklist._update_compatibility_index(widget, old_store, store)
+
+    assert widget.compatibility_index is index  # No se reconstruye
+    assert ids["/m/b.mp3"] not in index and ids["/m/c.mp3"] not in index
+    d_id = int(store.ids[-1])  # La última pista añadida
+    assert [result["id"] for result in index.recommend(ids["/m/a.mp3"])] == [d_id]
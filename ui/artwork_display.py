@@ -0,0 +1,84 @@
+import io
+import queue
+import threading
+import tkinter as tk
+from collections import OrderedDict
+
+from PIL import Image, ImageTk
+
+from core.artwork_cache import THUMBNAIL_SIZE, get_thumbnail
+from core.database import get_track_artwork_hash
+
+class ArtworkDisplay(tk.Canvas):
+    """Muestra la carátula en miniatura de la pista seleccionada."""
+
+    # Número de imágenes ya decodificadas que se conservan (navegar por un disco
+    # reutiliza siempre la misma)
+    CACHE_SIZE = 64
+
+    def __init__(self, master, **kwargs):
+        super().__init__(master, bg='#2B2B2B', width=THUMBNAIL_SIZE[0], height=THUMBNAIL_SIZE[1],
+                         highlightthickness=0, **kwargs)
+        self._photos = OrderedDict() # Solo se usa desde el hilo de Tk
+        self._current_path = None
+        # Un único hilo de carga atiende las peticiones en orden: así reutiliza su
+        # conexión a la caché de miniaturas. No puede tocar Tk: deja el resultado en
+        # result_queue.
+        self.request_queue = queue.Queue()
+        self.result_queue = queue.Queue()
+        threading.Thread(target=self._loader, daemon=True).start()
+        self.process_result_queue()
+
+    def show_track(self, file_path):
+        """Pide la carátula de la pista al hilo de carga; se muestra cuando está lista."""
+        self._current_path = file_path
+        # El hilo recibe una copia de los hashes ya decodificados para no leerlos otra vez
+        self.request_queue.put((file_path, frozenset(self._photos)))
+
+    def _loader(self):
+        """Hilo de carga: lee el hash y, si hace falta, la miniatura de cada petición."""
+        while True:
+            request = self.request_queue.get()
+            try:
+                # Si se han seleccionado varias pistas seguidas, solo importa la última
+                while True:
+                    request = self.request_queue.get_nowait()
+            except queue.Empty:
+                pass
+            file_path, cached_hashes = request
+            artwork_hash = get_track_artwork_hash(file_path)
+            if artwork_hash in cached_hashes:
+                self.result_queue.put((file_path, artwork_hash, None, True))
+            else:
+                self.result_queue.put((file_path, artwork_hash, get_thumbnail(artwork_hash), False))
+
+    def process_result_queue(self):
+        """Muestra las carátulas que ha terminado de cargar el hilo de carga."""
+        try:
+            while True:
+                self._show(*self.result_queue.get_nowait())
+        except queue.Empty:
+            pass
+        self.after(100, self.process_result_queue)
+
+    def _show(self, file_path, artwork_hash, image_data, cached):
+        """Actualiza la imagen (en el hilo de la UI)."""
+        if file_path != self._current_path:
+            return  # El usuario ya ha seleccionado otra pista
+
+        photo = self._photos.get(artwork_hash)
+        if photo is None and cached:
+            # Se descartó de la caché mientras se cargaba: se pide la miniatura
+            self.request_queue.put((file_path, frozenset()))
+            return
+        if photo is not None:
+            self._photos.move_to_end(artwork_hash)
+        elif image_data:
+            photo = ImageTk.PhotoImage(Image.open(io.BytesIO(image_data)))
+            self._photos[artwork_hash] = photo
+            if len(self._photos) > self.CACHE_SIZE:
+                self._photos.popitem(last=False)
+
+        self.delete("all")
+        if photo is not None:
+            self.create_image(THUMBNAIL_SIZE[0] // 2, THUMBNAIL_SIZE[1] // 2, image=photo)
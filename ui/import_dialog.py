@@ -0,0 +1,87 @@
+import tkinter as tk
+from tkinter import ttk, filedialog
+import threading
+import os
+import queue as queue_module
+
+from core.collection_importer import import_collection
+
+class ImportDialog(tk.Toplevel):
+    """Diálogo para importar colecciones de Rekordbox/Traktor y playlists M3U."""
+
+    FILE_TYPES = [
+        ("Colecciones y playlists", "*.xml *.nml *.m3u *.m3u8"),
+        ("Rekordbox XML", "*.xml"),
+        ("Traktor NML", "*.nml"),
+        ("Playlists M3U", "*.m3u *.m3u8"),
+    ]
+
+    def __init__(self, master, queue=None, **kwargs):
+        super().__init__(master, **kwargs)
+        self.title("Importar colección")
+        self.geometry("500x150")
+        self.queue = queue
+
+        ttk.Label(
+            self,
+            text="Importa pistas, BPM, tonalidad, puntos cue y playlists desde\n"
+                 "Rekordbox (XML), Traktor (NML) o playlists M3U/M3U8."
+        ).pack(fill="x", padx=10, pady=10)
+
+        self.import_button = ttk.Button(self, text="Seleccionar archivo...", command=self.choose_file)
+        self.import_button.pack(padx=10)
+
+        self.status_var = tk.StringVar()
+        ttk.Label(self, textvariable=self.status_var, anchor="w").pack(fill="x", padx=10, pady=10)
+
+        # Resultado del hilo de importación; solo el hilo de Tk toca los widgets
+        self.result_queue = queue_module.Queue()
+
+    def choose_file(self):
+        """Pide el archivo a importar y lanza la importación en un hilo."""
+        path = filedialog.askopenfilename(parent=self, title="Selecciona la colección", filetypes=self.FILE_TYPES)
+        if not path:
+            return
+
+        self.import_button.state(["disabled"])
+        self.status_var.set(f"Importando {os.path.basename(path)}...")
+
+        def import_thread():
+            try:
+                self.result_queue.put(("done", import_collection(path)))
+            except Exception as e:
+                print(f"Error al importar {path}: {e}")
+                self.result_queue.put(("error", str(e)))
+
+        threading.Thread(target=import_thread, daemon=True).start()
+        self.wait_for_import()
+
+    def wait_for_import(self):
+        """Comprueba desde el hilo de Tk si la importación ha terminado."""
+        if not self.winfo_exists():
+            return # Se cerró el diálogo: no se vuelve a programar la comprobación
+        try:
+            status, result = self.result_queue.get_nowait()
+        except queue_module.Empty:
+            self.after(100, self.wait_for_import)
+            return
+        if status == "error":
+            self.import_button.state(["!disabled"])
+            self.status_var.set(f"Error al importar: {result}")
+            return
+        self.on_import_complete(result)
+
+    def on_import_complete(self, stats):
+        """Muestra el resumen y avisa a la ventana principal para refrescar la lista."""
+        self.import_button.state(["!disabled"])
+        if stats is None:
+            self.status_var.set("Formato no soportado.")
+            return
+
+        self.status_var.set(
+            f"{stats['tracks']} pistas ({stats['unchanged']} sin cambios), "
+            f"{stats['cues']} cues, {stats['playlists']} playlists. "
+            f"Omitidas: {stats['missing']} no encontradas, {stats['unsupported']} no soportadas."
+        )
+        if self.queue:
+            self.queue.put("scan_complete")
@@ -0,0 +1,145 @@
+import tkinter as tk
+from tkinter import ttk, filedialog, messagebox
+import queue
+import sqlite3
+import threading
+
+from core.library_stats import (
+    get_library_overview, get_distribution,
+    export_tracks_csv, export_tracks_json, export_stats_json,
+)
+from core.collection_exporter import export_rekordbox_xml, export_m3u8
+
+class StatsExportWindow(tk.Toplevel):
+    """Ventana con las estadísticas de la biblioteca y opciones de exportación."""
+
+    DISTRIBUTIONS = {
+        "genre": "Géneros",
+        "key": "Tonalidades",
+        "bpm": "BPM",
+        "file_type": "Formatos",
+    }
+
+    def __init__(self, master, **kwargs):
+        super().__init__(master, **kwargs)
+        self.title("Estadísticas de la biblioteca")
+        self.geometry("600x500")
+
+        self.overview_var = tk.StringVar()
+        ttk.Label(self, textvariable=self.overview_var, justify="left").pack(fill="x", padx=10, pady=10)
+
+        notebook = ttk.Notebook(self)
+        notebook.pack(fill="both", expand=True, padx=10)
+        self.tables = {}
+        for dimension, label in self.DISTRIBUTIONS.items():
+            frame = ttk.Frame(notebook)
+            notebook.add(frame, text=label)
+            table = ttk.Treeview(frame, columns=("value", "tracks", "duration"), show="headings")
+            table.heading("value", text=label)
+            table.heading("tracks", text="Pistas")
+            table.heading("duration", text="Duración")
+            table.column("tracks", width=80, anchor="e")
+            table.column("duration", width=100, anchor="e")
+            table.pack(fill="both", expand=True)
+            self.tables[dimension] = table
+
+        buttons = ttk.Frame(self)
+        buttons.pack(fill="x", padx=10, pady=10)
+        ttk.Button(buttons, text="Exportar pistas CSV...", command=lambda: self.export("csv")).pack(side="left")
+        ttk.Button(buttons, text="Exportar pistas JSON...", command=lambda: self.export("json")).pack(side="left", padx=5)
+        ttk.Button(buttons, text="Exportar estadísticas...", command=lambda: self.export("stats")).pack(side="left")
+
+        collection_buttons = ttk.Frame(self)
+        collection_buttons.pack(fill="x", padx=10)
+        ttk.Button(collection_buttons, text="Exportar Rekordbox XML...", command=lambda: self.export("rekordbox")).pack(side="left")
+        ttk.Button(collection_buttons, text="Exportar M3U8...", command=lambda: self.export("m3u8")).pack(side="left", padx=5)
+
+        self.status_var = tk.StringVar()
+        ttk.Label(self, textvariable=self.status_var, anchor="w").pack(fill="x", padx=10, pady=(0, 10))
+
+        # Resultados de los hilos de exportación; solo el hilo de Tk toca los widgets
+        self.export_queue = queue.Queue()
+        self._poll_id = None
+        self.bind("<Destroy>", self._on_destroy)
+        self.process_export_queue()
+
+        self.load_stats()
+
+    @staticmethod
+    def _format_duration(seconds):
+        """Formatea segundos como H:MM:SS."""
+        hours, remainder = divmod(int(seconds or 0), 3600)
+        minutes, sec = divmod(remainder, 60)
+        return f"{hours}:{minutes:02d}:{sec:02d}"
+
+    def load_stats(self):
+        """Carga el resumen y las distribuciones (consultas agregadas en SQLite)."""
+        overview = get_library_overview()
+        self.overview_var.set(
+            f"Pistas: {overview['total_tracks']}    "
+            f"Duración total: {self._format_duration(overview['total_duration'])}\n"
+            f"Sin BPM: {overview['missing_bpm']}    Sin tonalidad: {overview['missing_key']}"
+        )
+
+        for dimension, table in self.tables.items():
+            for item in table.get_children():
+                table.delete(item)
+            for value, track_count, total_duration in get_distribution(dimension):
+                if dimension == "bpm" and value != "N/A":
+                    value = f"{value}–{int(value) + 4}"
+                table.insert("", "end", values=(value, track_count, self._format_duration(total_duration)))
+
+    def export(self, kind):
+        """Pide un archivo de destino y exporta en un hilo para no bloquear la UI."""
+        file_types = {
+            "csv": ("CSV", "*.csv"),
+            "json": ("JSON", "*.json"),
+            "stats": ("JSON", "*.json"),
+            "rekordbox": ("Rekordbox XML", "*.xml"),
+            "m3u8": ("M3U8", "*.m3u8"),
+        }
+        output_path = filedialog.asksaveasfilename(
+            parent=self, defaultextension=file_types[kind][1][1:], filetypes=[file_types[kind]]
+        )
+        if not output_path:
+            return
+
+        exporters = {
+            "csv": export_tracks_csv,
+            "json": export_tracks_json,
+            "stats": export_stats_json,
+            "rekordbox": export_rekordbox_xml,
+            "m3u8": export_m3u8,
+        }
+        self.status_var.set(f"Exportando a {output_path}...")
+
+        def export_thread():
+            try:
+                exporters[kind](output_path)
+                self.export_queue.put(("done", output_path))
+            except (OSError, sqlite3.Error) as e:
+                # Los exportadores escriben a un temporal: el archivo anterior queda intacto
+                self.export_queue.put(("error", str(e)))
+
+        threading.Thread(target=export_thread, daemon=True).start()
+
+    def process_export_queue(self):
+        """Muestra el resultado de las exportaciones terminadas."""
+        try:
+            while True:
+                status, detail = self.export_queue.get_nowait()
+                if status == "done":
+                    self.status_var.set(f"Exportación completada: {detail}")
+                else:
+                    self.status_var.set("")
+                    messagebox.showerror("Error al exportar", detail, parent=self)
+        except queue.Empty:
+            pass
+        self._poll_id = self.after(100, self.process_export_queue)
+
+    def _on_destroy(self, event):
+        """Deja de consultar la cola al cerrar la ventana."""
+        # <Destroy> también llega por cada widget hijo
+        if event.widget is self and self._poll_id is not None:
+            self.after_cancel(self._poll_id)
+            self._poll_id = None
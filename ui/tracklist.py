@@ -1,6 +1,14 @@
 import tkinter as tk
 from tkinter import ttk
-from core.database import get_all_tracks, update_track_field
+import math
+import queue
+import sqlite3
+import threading
+import numpy as np
+from core.database import update_track_field
+from core.track_store import TrackStore
+from core.similarity_index import SimilarityIndex
+from core.playlist_logic import CompatibilityIndex
 from core.metadata_writer import write_metadata_tag
 from core.metadata_reader import read_metadata
 
@@ -9,7 +17,17 @@ class Tracklist(ttk.Treeview):
         super().__init__(master, **kwargs)
         self.waveform_callback = waveform_callback
         
-        self.item_to_filepath = {} # Diccionario para mapear item_id a file_path
+        # Pistas en memoria por columnas; los item_id del Treeview son los ids de pista
+        self.store = TrackStore()
+        self.visible_rows = None # Filas mostradas (tras filtrar), en el orden actual
+        self.sort_column = None
+        self.sort_descending = False
+        self.filter_text = ""
+        self.related_rows = None # Resultado de "Sugerir pistas para mezclar"/"Buscar pistas similares", en su orden
+        self.similarity_index = None # Se abre (o reconstruye) la primera vez que se usa
+        self.compatibility_index = CompatibilityIndex() # Se actualiza con cada load_data y cada edición
+        self.similar_queue = queue.Queue() # Resultados del hilo de búsqueda de similares
+        self.load_generation = 0 # Cuenta las recargas, para descartar índices abiertos antes
         self.column_definitions = {
             "title": {"text": "Título", "width": 250},
             "artist": {"text": "Artista", "width": 150},
@@ -23,6 +41,7 @@ class Tracklist(ttk.Treeview):
 
         self.configure_columns()
         self.load_data()
+        self.process_similar_queue()
 
     def configure_columns(self):
         """Configura las columnas del Treeview."""
@@ -31,7 +50,7 @@ class Tracklist(ttk.Treeview):
         self["show"] = "headings"  # Ocultar la primera columna fantasma
 
         for col, props in self.column_definitions.items():
-            self.heading(col, text=props["text"])
+            self.heading(col, text=props["text"], command=lambda c=col: self.sort_by(c))
             self.column(col, width=props["width"], minwidth=50, stretch=tk.YES)
 
         self.bind("<Double-1>", self.on_double_click)
@@ -41,6 +60,9 @@ class Tracklist(ttk.Treeview):
 
         self.context_menu = tk.Menu(self, tearoff=0)
         self.context_menu.add_command(label="Re-escanear metadatos del archivo", command=self.rescan_selected_track)
+        self.context_menu.add_command(label="Sugerir pistas para mezclar", command=self.show_recommended_tracks)
+        self.context_menu.add_command(label="Buscar pistas similares", command=self.show_similar_tracks)
+        self.context_menu.add_command(label="Mostrar todas las pistas", command=self.clear_related_tracks)
 
     def show_context_menu(self, event):
         """Muestra el menú contextual en la posición del cursor."""
@@ -57,7 +79,7 @@ class Tracklist(ttk.Treeview):
         if not selected_item:
             return
 
-        file_path = self.item_to_filepath.get(selected_item)
+        file_path = self._file_path(selected_item)
         if file_path and self.waveform_callback:
             self.waveform_callback(file_path)
 
@@ -67,7 +89,7 @@ class Tracklist(ttk.Treeview):
         if not selected_item:
             return
 
-        file_path = self.item_to_filepath.get(selected_item)
+        file_path = self._file_path(selected_item)
         if not file_path:
             print(f"Error: No se encontró la ruta para el item {selected_item}")
             return
@@ -88,6 +110,75 @@ class Tracklist(ttk.Treeview):
         else:
             print("No se pudieron leer los nuevos metadatos.")
 
+    def show_recommended_tracks(self):
+        """Muestra solo las pistas que mezclan bien (tonalidad y BPM) con la seleccionada."""
+        selected_item = self.focus()
+        if not selected_item:
+            return
+        track_id = int(selected_item)
+        results = self.compatibility_index.recommend(track_id, limit=50)
+        if not results:
+            print("La pista no tiene tonalidad y BPM válidos, o no hay pistas compatibles.")
+            return
+        self._show_related(track_id, [result["id"] for result in results])
+
+    def show_similar_tracks(self):
+        """Muestra solo las pistas que suenan más parecido a la seleccionada, de más a menos."""
+        selected_item = self.focus()
+        if not selected_item:
+            return
+        track_id = int(selected_item)
+
+        index = self.similarity_index
+        generation = self.load_generation
+
+        def search_thread():
+            # Abrir el índice puede requerir reconstruirlo; las consultas son inmediatas.
+            # El índice abierto se devuelve por la cola: solo el hilo de la UI lo asigna.
+            opened = index
+            if opened is None or len(opened) == 0:
+                opened = SimilarityIndex.open()
+            results = opened.similar(track_id) if opened else []
+            self.similar_queue.put((generation, opened, track_id, [result_id for result_id, _ in results]))
+
+        threading.Thread(target=search_thread, daemon=True).start()
+
+    def process_similar_queue(self):
+        """Muestra en el hilo de la UI los resultados de las búsquedas de similares."""
+        try:
+            while True:
+                generation, index, track_id, result_ids = self.similar_queue.get_nowait()
+                if generation == self.load_generation:
+                    # Si la biblioteca se recargó durante la búsqueda, el índice puede estar desfasado
+                    self.similarity_index = index
+                self._show_similar(track_id, result_ids)
+        except queue.Empty:
+            pass
+        self.after(100, self.process_similar_queue)
+
+    def _show_similar(self, track_id, result_ids):
+        if not result_ids:
+            print("La pista no tiene vector de timbre todavía. Analiza la biblioteca (cli.py analyze).")
+            return
+        self._show_related(track_id, result_ids)
+
+    def _show_related(self, track_id, result_ids):
+        """Muestra la pista de referencia seguida de las indicadas, en ese orden."""
+        if self.store.row_of(track_id) is None:
+            return # La biblioteca se recargó mientras se buscaba y la pista ya no está
+        rows = [self.store.row_of(track_id)] + [self.store.row_of(result_id) for result_id in result_ids]
+        self.related_rows = np.array([row for row in rows if row is not None], dtype=np.int64)
+        self.sort_column = None
+        for col, props in self.column_definitions.items():
+            self.heading(col, text=props["text"])
+        self.refresh_order()
+        self.see(str(track_id))
+
+    def clear_related_tracks(self):
+        """Vuelve a mostrar la biblioteca completa tras una búsqueda de pistas relacionadas."""
+        self.related_rows = None
+        self.refresh_order()
+
     def _format_duration(self, seconds):
         """Formatea la duración de segundos a una cadena MM:SS."""
         try:
@@ -130,8 +221,8 @@ class Tracklist(ttk.Treeview):
         def save_edit(event):
             new_value = entry.get()
             
-            # Obtener la ruta del archivo desde nuestro mapeo
-            file_path = self.item_to_filepath.get(item_id)
+            # Obtener la ruta del archivo desde el almacén de pistas
+            file_path = self._file_path(item_id)
             if not file_path:
                 print("Error: No se pudo encontrar la ruta del archivo para este item.")
                 entry.destroy()
@@ -145,8 +236,13 @@ class Tracklist(ttk.Treeview):
             # 2. Si la escritura fue exitosa, actualizar la base de datos
             if success_write:
                 update_track_field(file_path, column_name, new_value)
-                # 3. Actualizar el valor en el Treeview
+                # 3. Actualizar el valor en memoria y en el Treeview
+                row = self.store.row_of(int(item_id))
+                self.store.set_value(row, column_name, new_value)
                 self.set(item_id, column_id, new_value)
+                if column_name in ("bpm", "key"):
+                    self.compatibility_index.add_or_update_track(
+                        int(item_id), self.store.value(row, "key"), self.store.value(row, "bpm"))
             
             entry.destroy()
 
@@ -154,21 +250,116 @@ class Tracklist(ttk.Treeview):
         entry.bind("<FocusOut>", lambda e: entry.destroy())
         entry.bind("<Escape>", lambda e: entry.destroy())
 
+    def _file_path(self, item_id):
+        """Ruta del archivo de un item del Treeview (su id es el id de la pista)."""
+        try:
+            row = self.store.row_of(int(item_id))
+        except ValueError:
+            return None
+        return self.store.value(row, "file_path") if row is not None else None
+
+    def _display_value(self, row, column):
+        """Texto de una celda tal como se muestra en la tabla."""
+        value = self.store.value(row, column)
+        if column == "duration":
+            return self._format_duration(value)
+        if isinstance(value, float):
+            return "N/A" if math.isnan(value) else f"{value:g}"
+        return value
+
+    def _clear_items(self):
+        """
+        Borra todos los items de la tabla, también los que el filtro o la vista de
+        pistas relacionadas tienen desenganchados: get_children() solo devuelve los visibles
+        y los demás harían fallar la siguiente inserción con el mismo iid.
+        """
+        # Cada pista del almacén tiene su item, visible o no
+        self.delete(*(str(track_id) for track_id in self.store.ids))
+
     def load_data(self):
         """Limpia la tabla y la recarga con datos de la base de datos."""
+        # Cargar nuevos datos en el almacén por columnas
+        try:
+            store = TrackStore.from_database()
+        except sqlite3.Error as e:
+            print(f"Error al cargar las pistas: {e}")
+            return # Se conserva la lista actual en lugar de mostrar una incompleta
+
         # Limpiar datos existentes
-        for i in self.get_children():
-            self.delete(i)
-        
-        self.item_to_filepath.clear() # Limpiar el mapeo
-            
-        # Cargar nuevos datos
-        tracks = get_all_tracks()
-        # Guardar las claves de las columnas en el orden correcto para referencia futura
+        self._clear_items()
+        old_store, self.store = self.store, store
+        # Se actualiza con cada recarga (escaneo, cambios del watcher) para no sugerir datos viejos
+        self._update_compatibility_index(old_store, store)
+        self.related_rows = None
+        self.similarity_index = None # Las pistas pueden haberse analizado desde la última carga
+        self.load_generation += 1
         self.column_definitions_keys = list(self.column_definitions.keys())
-        for track in tracks:
-            # Formatear la duración antes de mostrarla
-            track['duration'] = self._format_duration(track.get('duration'))
-            values = [track.get(col, "N/A") for col in self.column_definitions_keys]
-            item_id = self.insert("", "end", values=values)
-            self.item_to_filepath[item_id] = track.get('file_path') 
\ No newline at end of file
+        for row in range(len(self.store)):
+            values = [self._display_value(row, col) for col in self.column_definitions_keys]
+            self.insert("", "end", iid=str(self.store.ids[row]), values=values)
+
+        self.refresh_order()
+
+    def _update_compatibility_index(self, old_store, store):
+        """
+        Aplica al índice de compatibilidad solo las pistas borradas, nuevas o con
+        otra tonalidad o BPM, en lugar de reconstruirlo entero en cada recarga.
+        """
+        if len(old_store) == 0:
+            self.compatibility_index = CompatibilityIndex.from_store(store)
+            return
+
+        for track_id in np.setdiff1d(old_store.ids, store.ids):
+            self.compatibility_index.remove_track(int(track_id))
+
+        codes, values = store.categories("key")
+        keys = np.asarray(values, dtype=object)[codes]
+        bpms = store.column("bpm")
+        old_codes, old_values = old_store.categories("key")
+        old_keys = np.asarray(old_values, dtype=object)[old_codes]
+        old_bpms = old_store.column("bpm")
+
+        # Posición de cada pista en el almacén anterior (los ids están ordenados)
+        positions = np.minimum(np.searchsorted(old_store.ids, store.ids), len(old_store) - 1)
+        found = old_store.ids[positions] == store.ids
+        same_bpm = (old_bpms[positions] == bpms) | (np.isnan(old_bpms[positions]) & np.isnan(bpms))
+        changed = ~found | ~same_bpm | (old_keys[positions] != keys)
+        for row in np.flatnonzero(changed):
+            self.compatibility_index.add_or_update_track(int(store.ids[row]), keys[row], float(bpms[row]))
+
+    def sort_by(self, column):
+        """Ordena por una columna; un segundo clic invierte el sentido."""
+        if self.sort_column == column:
+            self.sort_descending = not self.sort_descending
+        else:
+            self.sort_column, self.sort_descending = column, False
+
+        for col, props in self.column_definitions.items():
+            arrow = (" ▼" if self.sort_descending else " ▲") if col == column else ""
+            self.heading(col, text=props["text"] + arrow)
+        self.refresh_order()
+
+    def apply_filter(self, text):
+        """Muestra solo las pistas cuyo título, artista, álbum o género contienen el texto."""
+        self.filter_text = text
+        self.related_rows = None
+        self.refresh_order()
+
+    def refresh_order(self):
+        """
+        Recoloca los items según el filtro y el orden actuales. El orden se
+        calcula sobre los arrays del almacén y se aplica al Treeview de una sola
+        vez, sin recorrer los items uno a uno.
+        """
+        if self.related_rows is not None:
+            rows = self.related_rows
+        else:
+            rows = self.store.filter(self.filter_text) if self.filter_text else None
+        if self.sort_column:
+            order = self.store.argsort(self.sort_column, self.sort_descending, rows=rows)
+        elif self.related_rows is not None:
+            order = rows # La pista de referencia y después las relacionadas, de mejor a peor
+        else:
+            order = self.store.argsort(["artist", "album", "track_number"], rows=rows)
+        self.visible_rows = order
+        self.set_children("", *(str(track_id) for track_id in self.store.ids[order]))